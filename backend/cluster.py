@@ -0,0 +1,160 @@
+"""
+Multi-process gateway: one supervisor process, N gateway workers on one port.
+
+    python cluster.py --workers 4 --port 8001
+
+This process owns the Node workers, exactly as a single gateway would
+(`NODE_PORT` / `NODE_SOCKET` / `NODE_WORKERS`), and starts the gateway
+workers. Each worker binds its own listening socket on the same port with
+SO_REUSEPORT, so the kernel spreads connections across them, and runs
+`server:app` with `NODE_EXTERNAL=1`: it inherits the Node addresses from
+this process's environment and only probes them instead of spawning Node
+itself. A worker that exits is restarted with backoff; SIGTERM / SIGINT
+stop the workers, then Node.
+
+State that must agree across workers (rate limit buckets, the callback
+queue, offloaded job results, response cache invalidations) lives in
+SQLite files; cached entries, coalescing, breakers and status polling stay
+per worker. Only worker 0 delivers queued callbacks. Workers probe Node
+themselves, so their `/api/gateway/node` shows readiness but no restarts;
+restarts are logged by this process.
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from gateway.env import env_bool, env_int, env_str
+from gateway.supervisor import node_supervisor_from_env
+
+
+def reuseport_socket(host, port, backlog=2048):
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
+
+
+def serve_worker(index, host, port, log_level):
+    """Entry point of one gateway worker process."""
+    os.environ["NODE_EXTERNAL"] = "1"
+    os.environ["GATEWAY_CALLBACK_DELIVERY"] = "1" if index == 0 else "0"
+
+    import uvicorn
+
+    sock = reuseport_socket(host, port)
+    config = uvicorn.Config("server:app", log_level=log_level, timeout_graceful_shutdown=10)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class GatewayWorker:
+    def __init__(self, index):
+        self.index = index
+        self.process = None
+        self.started_at = None
+        self.restarts = 0
+        self.backoff = 0.5
+
+
+class GatewayCluster:
+    """Starts the gateway workers and restarts any that exit."""
+
+    def __init__(self, workers, host, port, log_level="warning", backoff_max=30.0,
+                 stable_after=30.0):
+        self.context = multiprocessing.get_context("spawn")
+        self.workers = [GatewayWorker(index) for index in range(workers)]
+        self.host = host
+        self.port = port
+        self.log_level = log_level
+        self.backoff_max = backoff_max
+        self.stable_after = stable_after
+        self._stopping = threading.Event()
+
+    def _spawn(self, worker):
+        worker.process = self.context.Process(
+            target=serve_worker,
+            args=(worker.index, self.host, self.port, self.log_level),
+            name=f"gateway-{worker.index}",
+        )
+        worker.process.start()
+        worker.started_at = time.monotonic()
+
+    def run(self):
+        for worker in self.workers:
+            self._spawn(worker)
+        print(f"Gateway listening on {self.host}:{self.port} with {len(self.workers)} workers")
+        restart_at = {}
+        while not self._stopping.wait(0.5):
+            now = time.monotonic()
+            for worker in self.workers:
+                if worker.index in restart_at:
+                    if now >= restart_at[worker.index]:
+                        del restart_at[worker.index]
+                        worker.restarts += 1
+                        self._spawn(worker)
+                    continue
+                if worker.process.is_alive():
+                    continue
+                if now - worker.started_at >= self.stable_after:
+                    worker.backoff = 0.5
+                print(f"Gateway worker {worker.index} exited with code {worker.process.exitcode}, "
+                      f"restarting in {worker.backoff:.1f}s")
+                restart_at[worker.index] = now + worker.backoff
+                worker.backoff = min(worker.backoff * 2, self.backoff_max)
+
+    def request_stop(self):
+        self._stopping.set()
+
+    def stop(self, timeout=15.0):
+        self._stopping.set()
+        for worker in self.workers:
+            if worker.process is not None and worker.process.is_alive():
+                worker.process.terminate()
+        deadline = time.monotonic() + timeout
+        for worker in self.workers:
+            if worker.process is None:
+                continue
+            worker.process.join(max(0.0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the gateway as several worker processes")
+    parser.add_argument("--workers", type=int,
+                        default=env_int("GATEWAY_WORKERS", os.cpu_count() or 1))
+    parser.add_argument("--host", default=env_str("GATEWAY_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=env_int("GATEWAY_PORT", 8001))
+    parser.add_argument("--log-level", default="warning")
+    args = parser.parse_args()
+
+    # One Node supervisor for the whole cluster; NODE_EXTERNAL still means Node runs elsewhere.
+    node_supervisor = node_supervisor_from_env(
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "node-app"),
+        external=env_bool("NODE_EXTERNAL", False),
+    )
+    cluster = GatewayCluster(max(1, args.workers), args.host, args.port, args.log_level)
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: cluster.request_stop())
+    signal.signal(signal.SIGINT, lambda signum, frame: cluster.request_stop())
+
+    node_supervisor.start()
+    try:
+        cluster.run()
+    finally:
+        cluster.stop()
+        node_supervisor.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3 @@
+"""
+Building blocks for the Python API gateway in front of the Node.js backend.
+"""
@@ -0,0 +1,227 @@
+"""
+Priority-aware admission control in front of the Node upstream.
+
+Every upstream-bound request is classified by path prefix into a route
+class (payment callbacks, payments, booking, public reads, admin, AI). Each
+class has its own concurrency limit and a bounded FIFO wait queue, and all
+classes share a global limit of which a slice is reserved for classes
+marked `reserved` (the Capital Bank notify / return callbacks). When a
+class's queue is full, or a request waits longer than the queue timeout,
+it is shed with `503` and `Retry-After` instead of piling onto Node. Freed
+slots go to waiting requests in class priority order.
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from gateway.deadline import remaining
+from gateway.env import env_mapping
+
+# name -> (priority, limit, queue, retry_after, reserved); lower priority is served first
+DEFAULT_ROUTE_CLASSES = {
+    "callbacks": (0, 32, 64, 1, True),
+    "payments": (1, 64, 128, 1, False),
+    "booking": (2, 64, 128, 1, False),
+    "public": (3, 64, 128, 1, False),
+    "admin": (4, 8, 16, 5, False),
+    "ai": (5, 4, 8, 10, False),
+}
+
+# Path prefix -> route class; the longest matching prefix wins, anything else is "public".
+DEFAULT_CLASS_ROUTES = {
+    "/api/payments/capital-bank/notify": "callbacks",
+    "/api/payments/capital-bank/return": "callbacks",
+    "/api/payments": "payments",
+    "/api/payments/hourly-pricing": "public",
+    "/api/payments/provider": "public",
+    "/api/bookings": "booking",
+    "/api/slots": "booking",
+    "/api/subscriptions": "booking",
+    "/api/loyalty": "booking",
+    "/api/staff": "booking",
+    "/api/profile": "booking",
+    "/api/auth": "booking",
+    "/api/subscriptions/plans": "public",
+    "/api/admin": "admin",
+    "/api/themes/ai-generate": "ai",
+    "/api/bot": "ai",
+}
+
+
+def load_route_classes():
+    """Class table with `GATEWAY_ADMISSION_LIMITS` overrides (`class=limit/queue`)."""
+    classes = dict(DEFAULT_ROUTE_CLASSES)
+    for name, value in env_mapping("GATEWAY_ADMISSION_LIMITS").items():
+        if name not in classes:
+            print(f"Unknown route class {name} in GATEWAY_ADMISSION_LIMITS")
+            continue
+        priority, limit, queue, retry_after, reserved = classes[name]
+        try:
+            limit_text, _, queue_text = value.partition("/")
+            limit = int(limit_text)
+            queue = int(queue_text) if queue_text else queue
+        except ValueError:
+            print(f"Invalid admission limit for {name}: {value}")
+            continue
+        classes[name] = (priority, limit, queue, retry_after, reserved)
+    return classes
+
+
+def load_class_routes():
+    """Prefix table with `GATEWAY_ROUTE_CLASSES` overrides (`prefix=class`)."""
+    return env_mapping("GATEWAY_ROUTE_CLASSES", DEFAULT_CLASS_ROUTES)
+
+
+class Shed(Exception):
+    """Raised when a request is refused instead of queued."""
+
+    def __init__(self, route_class, reason):
+        super().__init__(f"{route_class.name} {reason}")
+        self.route_class = route_class
+        self.reason = reason
+
+
+class RouteClass:
+    def __init__(self, name, priority, limit, queue, retry_after=1, reserved=False):
+        self.name = name
+        self.priority = priority
+        self.limit = limit
+        self.queue = queue
+        self.retry_after = retry_after
+        self.reserved = reserved
+        self.in_flight = 0
+        self.waiters = deque()
+
+        self.admitted = 0
+        self.queued = 0
+        self.shed_queue_full = 0
+        self.shed_timeout = 0
+        self.wait_seconds = 0.0
+        self.peak_queue = 0
+
+    def stats(self):
+        return {
+            "priority": self.priority,
+            "limit": self.limit,
+            "queue_limit": self.queue,
+            "reserved": self.reserved,
+            "in_flight": self.in_flight,
+            "queue_depth": len(self.waiters),
+            "peak_queue_depth": self.peak_queue,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "shed_queue_full": self.shed_queue_full,
+            "shed_timeout": self.shed_timeout,
+            "queue_wait_seconds": self.wait_seconds,
+        }
+
+
+class AdmissionController:
+    def __init__(self, classes, routes, total_limit=256, reserved=16, queue_timeout=5.0,
+                 enabled=True, default_class="public"):
+        self.classes = {
+            name: RouteClass(name, priority, limit, queue, retry_after, is_reserved)
+            for name, (priority, limit, queue, retry_after, is_reserved) in classes.items()
+        }
+        self.by_priority = sorted(self.classes.values(), key=lambda route_class: route_class.priority)
+        self.routes = sorted(
+            ((prefix, self.classes[name]) for prefix, name in routes.items() if name in self.classes),
+            key=lambda item: len(item[0]),
+            reverse=True,
+        )
+        self.default = self.classes[default_class]
+        self.total_limit = total_limit
+        self.reserved = min(reserved, total_limit)
+        self.queue_timeout = queue_timeout
+        self.enabled = enabled
+        self.in_flight = 0
+
+    def classify(self, path):
+        for prefix, route_class in self.routes:
+            if path == prefix or path.startswith(prefix.rstrip("/") + "/"):
+                return route_class
+        return self.default
+
+    def _has_capacity(self, route_class):
+        if route_class.in_flight >= route_class.limit:
+            return False
+        shared = self.total_limit if route_class.reserved else self.total_limit - self.reserved
+        return self.in_flight < shared
+
+    def _start(self, route_class):
+        route_class.in_flight += 1
+        route_class.admitted += 1
+        self.in_flight += 1
+
+    async def acquire(self, path):
+        """Admit a request for `path`, waiting in its class queue if needed; raises `Shed`."""
+        route_class = self.classify(path)
+        if not self.enabled or (not route_class.waiters and self._has_capacity(route_class)):
+            self._start(route_class)
+            return route_class
+        if len(route_class.waiters) >= route_class.queue:
+            route_class.shed_queue_full += 1
+            raise Shed(route_class, "queue_full")
+
+        granted = asyncio.get_running_loop().create_future()
+        route_class.waiters.append(granted)
+        route_class.queued += 1
+        route_class.peak_queue = max(route_class.peak_queue, len(route_class.waiters))
+        started = time.monotonic()
+        timeout = self.queue_timeout
+        left = remaining()
+        if left is not None:
+            # No point queueing past the client's deadline.
+            timeout = max(0.0, min(timeout, left))
+        try:
+            await asyncio.wait_for(granted, timeout)
+        except BaseException as exc:
+            if granted.done() and not granted.cancelled():
+                # The slot was handed over just as we gave up on it.
+                self.release(route_class)
+            else:
+                granted.cancel()
+                try:
+                    route_class.waiters.remove(granted)
+                except ValueError:
+                    pass
+            if isinstance(exc, asyncio.TimeoutError):
+                route_class.shed_timeout += 1
+                raise Shed(route_class, "timeout") from None
+            raise
+        finally:
+            route_class.wait_seconds += time.monotonic() - started
+        return route_class
+
+    @asynccontextmanager
+    async def admit(self, path):
+        route_class = await self.acquire(path)
+        try:
+            yield route_class
+        finally:
+            self.release(route_class)
+
+    def release(self, route_class):
+        route_class.in_flight -= 1
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        for route_class in self.by_priority:
+            while route_class.waiters and self._has_capacity(route_class):
+                granted = route_class.waiters.popleft()
+                if granted.done():
+                    continue
+                self._start(route_class)
+                granted.set_result(True)
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "total_limit": self.total_limit,
+            "reserved": self.reserved,
+            "queue_timeout": self.queue_timeout,
+            "in_flight": self.in_flight,
+            "classes": {name: route_class.stats() for name, route_class in self.classes.items()},
+        }
@@ -0,0 +1,134 @@
+"""
+Bearer token verification at the edge.
+
+Routers that Node mounts entirely behind `authMiddleware` answer `401` to a
+missing, malformed, expired or forged token, but only after a round trip
+(and often a user lookup). For those prefixes the gateway can check the
+JWT itself with the secret Node signs with and answer the same `401` right
+away. Decoded claims are cached by token hash until the token expires, and
+so are rejections for a short while, so a busy client costs one signature
+check rather than one per request. Accepted requests are forwarded with the
+user id in a trusted header, which is always stripped from what clients
+send.
+"""
+import hashlib
+import time
+from collections import OrderedDict
+
+from gateway.env import env_mapping
+
+TRUSTED_USER_HEADER = "x-authenticated-user-id"
+# jsonwebtoken accepts any HMAC algorithm for a shared secret.
+ALGORITHMS = ["HS256", "HS384", "HS512"]
+
+# Path prefix -> "verify" or "skip"; the longest matching prefix wins, anything else is skipped.
+DEFAULT_AUTH_ROUTES = {
+    "/api/admin": "verify",
+    "/api/admin/cron": "skip",  # authorized by X-CRON-SECRET, not a bearer token
+    "/api/bookings": "verify",
+    "/api/loyalty": "verify",
+    "/api/profile": "verify",
+    "/api/staff": "verify",
+}
+
+
+def load_auth_routes():
+    """Prefix table with `GATEWAY_JWT_ROUTES` overrides (`prefix=verify|skip`)."""
+    return env_mapping("GATEWAY_JWT_ROUTES", DEFAULT_AUTH_ROUTES)
+
+
+class AuthRejected(Exception):
+    """The request would be refused by Node's `authMiddleware`."""
+
+    def __init__(self, error):
+        super().__init__(error)
+        self.error = error
+
+
+class EdgeAuth:
+    def __init__(self, secret, routes, enabled=False, max_entries=10000, max_ttl=300.0,
+                 rejection_ttl=60.0):
+        self.secret = secret
+        self.enabled = enabled and bool(secret)
+        self.routes = sorted(routes.items(), key=lambda item: len(item[0]), reverse=True)
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self.rejection_ttl = rejection_ttl
+        self.entries = OrderedDict()  # token hash -> (expires at, user id or None, error)
+
+        self.verified = 0
+        self.rejected = 0
+        self.hits = 0
+        self.misses = 0
+
+        if enabled and not secret:
+            print("JWT_SECRET is not set; edge token verification is disabled")
+
+    def protects(self, path):
+        if not self.enabled:
+            return False
+        for prefix, mode in self.routes:
+            if path == prefix or path.startswith(prefix.rstrip("/") + "/"):
+                return mode == "verify"
+        return False
+
+    def _decode(self, token):
+        """(expires at, user id or None, error) for a token, cached for at most `max_ttl`."""
+        # Imported on first use so a gateway without edge auth starts without it.
+        import jwt
+
+        now = time.time()
+        try:
+            claims = jwt.decode(token, self.secret, algorithms=ALGORITHMS)
+        except jwt.InvalidTokenError:
+            return now + self.rejection_ttl, None, "Invalid token"
+        user_id = claims.get("userId")
+        if not user_id:
+            # Node's User.findById(undefined) finds nobody.
+            return now + self.rejection_ttl, None, "User not found"
+        expires_at = now + self.max_ttl
+        if isinstance(claims.get("exp"), (int, float)):
+            expires_at = min(expires_at, claims["exp"])
+        return expires_at, str(user_id), None
+
+    def authenticate(self, authorization):
+        """The verified user id for an `Authorization` header; raises `AuthRejected`."""
+        if not authorization or not authorization.startswith("Bearer "):
+            self.rejected += 1
+            raise AuthRejected("No token provided")
+        # Node reads the second space-separated field.
+        token = authorization.split(" ")[1]
+        key = hashlib.sha256(token.encode()).digest()
+        now = time.time()
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] > now:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        else:
+            self.misses += 1
+            entry = self.entries[key] = self._decode(token)
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        user_id = entry[1]
+        if user_id is None:
+            self.rejected += 1
+            raise AuthRejected(entry[2])
+        self.verified += 1
+        return user_id
+
+    @staticmethod
+    def strip(headers):
+        """Upstream headers without any client-supplied trusted identity."""
+        return [(name, value) for name, value in headers if name.lower() != TRUSTED_USER_HEADER]
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "cached_tokens": len(self.entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "verified": self.verified,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,328 @@
+"""
+In-gateway TTL cache for public, rarely changing GET endpoints.
+
+Entries are keyed by path plus normalized query string, bounded by entry
+count and total bytes with LRU eviction, and dropped when the gateway sees a
+successful mutation on a path that can change them.
+
+Each gateway worker has its own cache, so invalidations are also written to
+a small SQLite file every worker on the host opens. A background task in
+each worker checks every `sync_interval` seconds, with SQLite's cheap
+`data_version`, whether another worker has published any, and drops the
+same prefixes. Reads and writes both go through a single-thread executor,
+so a locked file never holds up a lookup.
+"""
+import asyncio
+import hashlib
+import os
+import secrets
+import sqlite3
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode
+
+from starlette.responses import Response
+
+from gateway.env import env_mapping
+from gateway.proxy import relay_buffered
+
+# Cacheable path prefix -> TTL in seconds
+DEFAULT_CACHE_TTLS = {
+    "/api/payments/hourly-pricing": 60.0,
+    "/api/themes": 300.0,
+    "/api/gallery": 300.0,
+    "/api/subscriptions/plans": 300.0,
+    "/api/products": 300.0,
+}
+
+# Successful mutation under prefix -> cached prefixes to drop ("*" drops everything)
+INVALIDATION_RULES = {
+    "/api/admin": ["*"],
+    "/api/gallery": ["/api/gallery"],
+    "/api/themes": ["/api/themes"],
+}
+
+MUTATING_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+INVALIDATIONS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS invalidations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    origin TEXT NOT NULL,
+    prefix TEXT NOT NULL,
+    at REAL NOT NULL
+);
+"""
+
+
+def load_cache_ttls():
+    ttls = {}
+    for prefix, seconds in env_mapping("GATEWAY_CACHE_TTLS", DEFAULT_CACHE_TTLS).items():
+        try:
+            ttls[prefix] = float(seconds)
+        except ValueError:
+            print(f"Invalid cache TTL for {prefix}: {seconds}")
+    return ttls
+
+
+def path_matches(path, prefix):
+    return path == prefix or path.startswith(prefix.rstrip("/") + "/")
+
+
+def etag_matches(if_none_match, etag):
+    """Weak comparison as used for If-None-Match (RFC 9110 section 13.1.2)."""
+    if not if_none_match or not etag:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    wanted = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == wanted:
+            return True
+    return False
+
+
+class CacheEntry:
+    def __init__(self, status_code, headers, body, etag, ttl):
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+        self.etag = etag
+        self.expires_at = time.monotonic() + ttl
+        self.size = len(body) + sum(len(key) + len(value) for key, value in headers)
+
+    def is_fresh(self):
+        return time.monotonic() < self.expires_at
+
+
+class SharedInvalidations:
+    """Cache invalidations exchanged between the gateway workers on one host."""
+
+    def __init__(self, path=None, sync_interval=0.05, keep_seconds=3600.0):
+        self.path = path or os.path.join(tempfile.gettempdir(), "peekaboo-cache-invalidations.sqlite3")
+        self.sync_interval = sync_interval
+        self.keep_seconds = keep_seconds
+        self.origin = secrets.token_hex(8)
+        self._reader = None
+        self._writer = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-invalidations")
+        self._seen = None
+        self._data_version = None
+
+        self.published = 0
+        self.received = 0
+        self.store_errors = 0
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, isolation_level=None, timeout=0.05, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=OFF")
+        db.execute(INVALIDATIONS_SCHEMA)
+        return db
+
+    def _insert(self, prefixes):
+        try:
+            if self._writer is None:
+                self._writer = self._connect()
+            now = time.time()
+            with self._writer:
+                self._writer.execute("BEGIN IMMEDIATE")
+                self._writer.executemany(
+                    "INSERT INTO invalidations (origin, prefix, at) VALUES (?, ?, ?)",
+                    [(self.origin, prefix, now) for prefix in prefixes],
+                )
+                self._writer.execute(
+                    "DELETE FROM invalidations WHERE at < ?", (now - self.keep_seconds,)
+                )
+        except sqlite3.Error as exc:
+            self.store_errors += 1
+            print(f"Cache invalidation store unavailable, other workers keep their entries: {exc}")
+
+    def publish(self, prefixes):
+        """Hand invalidated prefixes to the other workers; does not wait for the write."""
+        self.published += len(prefixes)
+        self._executor.submit(self._insert, list(prefixes))
+
+    def _read(self):
+        """Prefixes other workers invalidated since the last call."""
+        try:
+            if self._reader is None:
+                self._reader = self._connect()
+                self._seen = self._reader.execute(
+                    "SELECT COALESCE(MAX(id), 0) FROM invalidations"
+                ).fetchone()[0]
+            # Changes only when another connection has committed something.
+            version = self._reader.execute("PRAGMA data_version").fetchone()[0]
+            if version == self._data_version:
+                return []
+            self._data_version = version
+            rows = self._reader.execute(
+                "SELECT id, origin, prefix FROM invalidations WHERE id > ? ORDER BY id", (self._seen,)
+            ).fetchall()
+        except sqlite3.Error:
+            self.store_errors += 1
+            return []
+        if rows:
+            self._seen = rows[-1][0]
+        return [prefix for _, origin, prefix in rows if origin != self.origin]
+
+    async def run(self, invalidate):
+        """Call `invalidate(prefix)` for other workers' invalidations until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            for prefix in await loop.run_in_executor(self._executor, self._read):
+                self.received += 1
+                invalidate(prefix)
+            await asyncio.sleep(self.sync_interval)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        for db in (self._reader, self._writer):
+            if db is not None:
+                db.close()
+        self._reader = self._writer = None
+
+    def stats(self):
+        return {
+            "shared_published": self.published,
+            "shared_received": self.received,
+            "shared_store_errors": self.store_errors,
+        }
+
+
+class ResponseCache:
+    def __init__(self, route_ttls=None, max_entries=512, max_bytes=32 * 1024 * 1024, shared=None):
+        # Longest prefix first so the most specific TTL wins.
+        self.route_ttls = sorted(
+            (route_ttls or {}).items(), key=lambda item: len(item[0]), reverse=True
+        )
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.shared = shared
+
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.stores = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def ttl_for(self, path):
+        for prefix, ttl in self.route_ttls:
+            if path_matches(path, prefix):
+                return ttl if ttl > 0 else None
+        return None
+
+    def is_cacheable_request(self, request, path):
+        """Anonymous GETs on a configured route."""
+        if request.method != "GET" or "authorization" in request.headers:
+            return False
+        return self.ttl_for(path) is not None
+
+    @staticmethod
+    def key_for(path, query):
+        return f"{path}?{urlencode(sorted(parse_qsl(query, keep_blank_values=True)))}"
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if not entry.is_fresh():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def store(self, key, ttl, status_code, headers, body):
+        """Cache a 200 response unless it opts out; returns the entry or None."""
+        lowered = {key.lower(): value for key, value in headers}
+        cache_control = lowered.get(b"cache-control", b"").lower()
+        if status_code != 200 or b"set-cookie" in lowered:
+            return None
+        if b"no-store" in cache_control or b"private" in cache_control:
+            return None
+
+        # A stored Date header would go stale; the server adds a fresh one.
+        headers = [(key, value) for key, value in headers if key.lower() != b"date"]
+        etag = lowered.get(b"etag", b"").decode("latin-1")
+        if not etag:
+            etag = f'"{hashlib.sha1(body).hexdigest()[:20]}"'
+            headers = headers + [(b"etag", etag.encode("latin-1"))]
+        entry = CacheEntry(status_code, headers, body, etag, ttl)
+        if entry.size > self.max_bytes:
+            return None
+
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = entry
+        self.bytes += entry.size
+        self.stores += 1
+        while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+            oldest = next(iter(self.entries))
+            self._remove(oldest)
+            self.evictions += 1
+        return entry
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry.size
+
+    def invalidate_prefix(self, prefix):
+        if prefix == "*":
+            doomed = list(self.entries)
+        else:
+            doomed = [key for key in self.entries if path_matches(key.split("?", 1)[0], prefix)]
+        for key in doomed:
+            self._remove(key)
+        self.invalidations += len(doomed)
+
+    def invalidate_for_mutation(self, method, path, status_code):
+        if method not in MUTATING_METHODS or not 200 <= status_code < 300:
+            return
+        invalidated = []
+        for mutated, cached_prefixes in INVALIDATION_RULES.items():
+            if path_matches(path, mutated):
+                for prefix in cached_prefixes:
+                    self.invalidate_prefix(prefix)
+                    invalidated.append(prefix)
+        if invalidated and self.shared is not None:
+            self.shared.publish(invalidated)
+
+    def respond(self, entry, request, cache_status):
+        """Serve an entry, answering 304 when the client already holds it."""
+        if etag_matches(request.headers.get("if-none-match"), entry.etag):
+            self.not_modified += 1
+            response = Response(status_code=304)
+            response.raw_headers = [
+                (key, value) for key, value in entry.headers
+                if key in (b"etag", b"cache-control", b"vary")
+            ]
+        else:
+            response = relay_buffered(entry.status_code, entry.headers, entry.body)
+        response.raw_headers.append((b"x-cache", cache_status.encode("latin-1")))
+        return response
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            **(self.shared.stats() if self.shared is not None else {}),
+        }
@@ -0,0 +1,433 @@
+"""
+Durable fast-ack queue for payment provider callbacks.
+
+Capital Bank's server-to-server `notify` callback used to wait on Node's
+signature check and the booking / loyalty writes behind it. With the queue
+enabled the gateway appends the raw callback (URL, headers and body) to a
+SQLite database in WAL mode, acknowledges it as soon as the row is on disk
+and delivers it to Node from a background task.
+
+Delivery is at-least-once. Callbacks for the same checkout session are
+delivered in the order they arrived: a later one waits until the earlier
+one was delivered or dead-lettered. Exact repeats of a callback already in
+the queue are acknowledged without being stored twice, and Node itself
+skips transaction ids it has already processed, so a redelivery after a
+crash mid-attempt is harmless. Failed attempts are retried with
+exponential backoff; after `max_attempts` the callback is dead-lettered
+and kept for inspection and manual retry. While Node is unreachable,
+callbacks wait without using up attempts.
+
+Several gateway workers can share one queue file; all of them enqueue, but
+only the one started with `deliver=True` sends callbacks to Node. A
+deliverer first claims a callback with a lease of `lease_seconds`, so even
+two deliverers on one file never send the same callback at once, and the
+next callback of a session is not claimed while an earlier one is leased.
+A lease left behind by a worker that crashed mid-attempt expires, and the
+callback is then delivered again; one released on a clean shutdown is
+picked up right away.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import secrets
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlsplit
+
+QUEUED_ROUTES = ("/api/payments/capital-bank/notify",)
+# Form fields naming the checkout session, in the order Node reads them
+ORDER_FIELDS = ("req_reference_number", "reference_number", "orderId")
+
+PENDING = "pending"
+DELIVERED = "delivered"
+DEAD = "dead"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS callbacks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    dedupe_key TEXT NOT NULL UNIQUE,
+    order_key TEXT NOT NULL,
+    method TEXT NOT NULL,
+    url TEXT NOT NULL,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    received_at REAL NOT NULL,
+    next_attempt_at REAL NOT NULL,
+    finished_at REAL,
+    last_status INTEGER,
+    last_error TEXT,
+    lease_owner TEXT,
+    lease_until REAL
+);
+CREATE INDEX IF NOT EXISTS callbacks_pending ON callbacks (state, order_key, id);
+"""
+# Added after the first release; queue files created before lack them.
+LEASE_COLUMNS = (("lease_owner", "TEXT"), ("lease_until", "REAL"))
+
+
+class DeliveryDeferred(Exception):
+    """Raised by the send function when Node cannot be reached at all; no attempt is used up."""
+
+
+def order_key_for(url, body):
+    """The checkout session a callback belongs to, or None when it names none."""
+    fields = dict(parse_qsl(urlsplit(url).query))
+    try:
+        fields.update(parse_qsl(body.decode("utf-8")))
+    except UnicodeDecodeError:
+        pass
+    for name in ORDER_FIELDS:
+        value = fields.get(name, "").strip()
+        if value:
+            return value
+    return None
+
+
+def delivered(status_code, body):
+    """Whether Node's answer means the callback was processed.
+
+    Node answers the notify callback with 200 even when processing threw,
+    flagging it with `"error": true`; that is worth another attempt.
+    """
+    if not 200 <= status_code < 300:
+        return False
+    try:
+        return json.loads(body).get("error") is not True
+    except (ValueError, AttributeError):
+        return True
+
+
+class CallbackQueue:
+    def __init__(self, path, send, enabled=False, max_pending=10000, max_body=64 * 1024,
+                 max_attempts=10, base_delay=1.0, max_delay=300.0, defer_delay=2.0,
+                 retention=7 * 24 * 3600.0, routes=QUEUED_ROUTES, deliver=True,
+                 idle_interval=1.0, lease_seconds=120.0):
+        # send(method, url, headers, body) -> (status_code, body bytes)
+        self.path = path
+        self.send = send
+        self.enabled = enabled
+        self.max_pending = max_pending
+        self.max_body = max_body
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.defer_delay = defer_delay
+        self.retention = retention
+        self.routes = frozenset(routes)
+        self.deliver = deliver
+        # Also how soon callbacks enqueued by another worker are noticed
+        self.idle_interval = idle_interval
+        # Longer than any single attempt can take
+        self.lease_seconds = lease_seconds
+        self.origin = secrets.token_hex(8)
+        self._db = None
+        self._executor = None
+        self._task = None
+        self._wakeup = asyncio.Event()
+        self._pending = 0
+        self._last_prune = 0.0
+
+        self.enqueued = 0
+        self.duplicates = 0
+        self.overflow = 0
+        self.store_errors = 0
+        self.attempts = 0
+        self.delivered = 0
+        self.failures = 0
+        self.deferred = 0
+        self.dead_lettered = 0
+
+    def accepts(self, method, path):
+        return self.enabled and self._db is not None and method == "POST" and path in self.routes
+
+    async def _run_db(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA journal_mode=WAL")
+        # Every acknowledged callback must survive a power cut.
+        db.execute("PRAGMA synchronous=FULL")
+        db.executescript(SCHEMA)
+        columns = {row[1] for row in db.execute("PRAGMA table_info(callbacks)")}
+        for column, kind in LEASE_COLUMNS:
+            if column not in columns:
+                try:
+                    db.execute(f"ALTER TABLE callbacks ADD COLUMN {column} {kind}")
+                except sqlite3.OperationalError as exc:
+                    # Another worker added it first.
+                    if "duplicate column" not in str(exc):
+                        raise
+        self._db = db
+        self._pending = self._count_pending()
+
+    def _count_pending(self):
+        return self._db.execute(
+            "SELECT COUNT(*) FROM callbacks WHERE state = ?", (PENDING,)
+        ).fetchone()[0]
+
+    async def start(self):
+        if not self.enabled:
+            return
+        # One thread owns the connection, which also serializes writes.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="callback-queue")
+        await self._run_db(self._open)
+        if self._pending:
+            print(f"Callback queue has {self._pending} callbacks left to deliver")
+        if self.deliver:
+            self._task = asyncio.create_task(self._deliver_loop())
+
+    async def aclose(self):
+        if self._task is not None:
+            # An attempt cut short here stays pending and is redelivered on the next start.
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            try:
+                await self._run_db(self._release_leases)
+            except sqlite3.Error as exc:
+                print(f"Callback queue could not release its leases: {exc}")
+        if self._db is not None:
+            await self._run_db(self._db.close)
+            self._db = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _insert(self, method, url, headers, body):
+        dedupe_key = hashlib.sha256(f"{method} {url}\n".encode() + body).hexdigest()
+        now = time.time()
+        cursor = self._db.execute(
+            "INSERT OR IGNORE INTO callbacks (dedupe_key, order_key, method, url, headers, body,"
+            " state, received_at, next_attempt_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                dedupe_key,
+                order_key_for(url, body) or dedupe_key,
+                method,
+                url,
+                json.dumps(headers),
+                body,
+                PENDING,
+                now,
+                now,
+            ),
+        )
+        return cursor.rowcount == 1
+
+    async def enqueue(self, method, url, headers, body):
+        """Store a callback durably; False if it cannot be queued and must be proxied directly."""
+        if self._pending >= self.max_pending:
+            # Another worker may have delivered some since this one last counted.
+            self._pending = await self._run_db(self._count_pending)
+        if len(body) > self.max_body or self._pending >= self.max_pending:
+            self.overflow += 1
+            return False
+        try:
+            inserted = await self._run_db(
+                self._insert, method, url, [list(pair) for pair in headers], body
+            )
+        except sqlite3.Error as exc:
+            self.store_errors += 1
+            print(f"Callback queue could not store {url}: {exc}")
+            return False
+        if inserted:
+            self.enqueued += 1
+            self._pending += 1
+            self._wakeup.set()
+        else:
+            self.duplicates += 1
+        return True
+
+    def _claim(self):
+        """(callback, None) once leased to us, else (None, when the next one is due or None)."""
+        now = time.time()
+        # The most due pending callback that is first in line for its session;
+        # one leased by another deliverer is due when its lease runs out.
+        row = self._db.execute(
+            "SELECT * FROM callbacks AS c WHERE state = ? AND id = ("
+            " SELECT MIN(id) FROM callbacks WHERE state = ? AND order_key = c.order_key)"
+            " ORDER BY MAX(next_attempt_at, COALESCE(lease_until, 0)), id LIMIT 1",
+            (PENDING, PENDING),
+        ).fetchone()
+        if row is None:
+            return None, None
+        due_at = max(row["next_attempt_at"], row["lease_until"] or 0.0)
+        if due_at > now:
+            return None, due_at
+        cursor = self._db.execute(
+            "UPDATE callbacks SET lease_owner = ?, lease_until = ? WHERE id = ? AND state = ?"
+            " AND attempts = ? AND next_attempt_at <= ?"
+            " AND (lease_until IS NULL OR lease_until <= ?)",
+            (self.origin, now + self.lease_seconds, row["id"], PENDING, row["attempts"], now, now),
+        )
+        if cursor.rowcount != 1:
+            # Another deliverer claimed it first; look again.
+            return None, now
+        return row, None
+
+    def _update(self, callback_id, state, attempts, next_attempt_at, status, error):
+        """Record an attempt and drop the lease, unless another deliverer has taken it over."""
+        self._db.execute(
+            "UPDATE callbacks SET state = ?, attempts = ?, next_attempt_at = ?, last_status = ?,"
+            " last_error = ?, finished_at = ?, lease_owner = NULL, lease_until = NULL"
+            " WHERE id = ? AND lease_owner = ?",
+            (
+                state,
+                attempts,
+                next_attempt_at,
+                status,
+                error,
+                None if state == PENDING else time.time(),
+                callback_id,
+                self.origin,
+            ),
+        )
+
+    def _release_leases(self):
+        self._db.execute(
+            "UPDATE callbacks SET lease_owner = NULL, lease_until = NULL WHERE lease_owner = ?",
+            (self.origin,),
+        )
+
+    def _prune(self):
+        self._db.execute(
+            "DELETE FROM callbacks WHERE state = ? AND finished_at < ?",
+            (DELIVERED, time.time() - self.retention),
+        )
+
+    async def _deliver_loop(self):
+        while True:
+            try:
+                if time.time() - self._last_prune > 3600:
+                    self._last_prune = time.time()
+                    await self._run_db(self._prune)
+                # Cleared before looking, so a callback enqueued meanwhile still wakes us.
+                self._wakeup.clear()
+                row, due_at = await self._run_db(self._claim)
+                if row is not None:
+                    await self._deliver(row)
+                    continue
+                wait = self.idle_interval
+                if due_at is not None:
+                    wait = min(wait, due_at - time.time())
+                if wait > 0:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), wait)
+                    except asyncio.TimeoutError:
+                        pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                print(f"Callback queue error: {exc}")
+                await asyncio.sleep(self.defer_delay)
+
+    async def _deliver(self, row):
+        headers = [tuple(pair) for pair in json.loads(row["headers"])]
+        status = None
+        try:
+            status, body = await self.send(row["method"], row["url"], headers, row["body"])
+        except DeliveryDeferred:
+            self.deferred += 1
+            await self._record(
+                row["id"], PENDING, row["attempts"],
+                time.time() + self.defer_delay, row["last_status"], "upstream unavailable",
+            )
+            return
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}"
+        else:
+            error = None if delivered(status, body) else body[:500].decode("utf-8", "replace")
+
+        attempts = row["attempts"] + 1
+        self.attempts += 1
+        if error is None:
+            self.delivered += 1
+            self._pending = max(0, self._pending - 1)
+            await self._record(row["id"], DELIVERED, attempts, 0, status, None)
+            return
+        self.failures += 1
+        if attempts >= self.max_attempts:
+            self.dead_lettered += 1
+            self._pending = max(0, self._pending - 1)
+            print(f"Callback {row['id']} dead-lettered after {attempts} attempts: {error}")
+            await self._record(row["id"], DEAD, attempts, 0, status, error)
+            return
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempts - 1)))
+        await self._record(row["id"], PENDING, attempts, time.time() + delay, status, error)
+
+    async def _record(self, *update):
+        # Shielded: a shutdown must not drop the outcome of an attempt already made.
+        await asyncio.shield(self._run_db(self._update, *update))
+
+    def _dead_letters(self, limit):
+        rows = self._db.execute(
+            "SELECT id, order_key, method, url, headers, body, attempts, received_at,"
+            " finished_at, last_status, last_error FROM callbacks WHERE state = ?"
+            " ORDER BY id DESC LIMIT ?",
+            (DEAD, limit),
+        ).fetchall()
+        return [
+            {
+                **dict(row),
+                "headers": json.loads(row["headers"]),
+                "body": row["body"].decode("utf-8", "replace"),
+            }
+            for row in rows
+        ]
+
+    async def dead_letters(self, limit=100):
+        if self._db is None:
+            return []
+        return await self._run_db(self._dead_letters, limit)
+
+    def _requeue(self, callback_id):
+        cursor = self._db.execute(
+            "UPDATE callbacks SET state = ?, attempts = 0, next_attempt_at = ?, finished_at = NULL,"
+            " lease_owner = NULL, lease_until = NULL WHERE id = ? AND state = ?",
+            (PENDING, time.time(), callback_id, DEAD),
+        )
+        return cursor.rowcount == 1
+
+    async def requeue(self, callback_id):
+        """Give a dead-lettered callback a fresh set of attempts; False if there is no such one."""
+        if self._db is None or not await self._run_db(self._requeue, callback_id):
+            return False
+        self._pending += 1
+        self._wakeup.set()
+        return True
+
+    def _counts(self):
+        counts = dict(
+            self._db.execute("SELECT state, COUNT(*) FROM callbacks GROUP BY state").fetchall()
+        )
+        oldest = self._db.execute(
+            "SELECT MIN(received_at) FROM callbacks WHERE state = ?", (PENDING,)
+        ).fetchone()[0]
+        return counts, oldest
+
+    async def stats(self):
+        stats = {
+            "enabled": self.enabled,
+            "pending": self._pending,
+            "enqueued": self.enqueued,
+            "duplicates": self.duplicates,
+            "overflow": self.overflow,
+            "store_errors": self.store_errors,
+            "attempts": self.attempts,
+            "delivered": self.delivered,
+            "failures": self.failures,
+            "deferred": self.deferred,
+            "dead_lettered": self.dead_lettered,
+        }
+        if self._db is not None:
+            counts, oldest = await self._run_db(self._counts)
+            stats["pending"] = counts.get(PENDING, 0)
+            stats["dead"] = counts.get(DEAD, 0)
+            stats["oldest_pending_seconds"] = time.time() - oldest if oldest else 0.0
+        return stats
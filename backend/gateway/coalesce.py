@@ -0,0 +1,98 @@
+"""
+Single-flight coalescing of identical concurrent upstream GETs.
+
+The first request for a key starts the upstream call; identical requests that
+arrive while it is in flight wait for the same result instead of hitting
+Node again. The call runs in its own task so a disconnecting leader does not
+cancel it for everyone else. That task starts from an empty context, so it
+is bound by the route timeout rather than the leader's `X-Deadline-Ms`;
+each caller waits for it only as long as its own deadline allows.
+"""
+import asyncio
+import contextvars
+
+from gateway.cache import path_matches
+from gateway.deadline import DeadlineExceeded, remaining
+from gateway.env import env_str
+
+DEFAULT_COALESCE_ROUTES = [
+    "/api/slots/available",
+]
+
+
+def load_coalesce_routes():
+    raw = env_str("GATEWAY_COALESCE_ROUTES", "")
+    if not raw:
+        return list(DEFAULT_COALESCE_ROUTES)
+    return [route.strip() for route in raw.split(",") if route.strip()]
+
+
+class UpstreamResult:
+    """Fully read upstream response that can be shared between waiters."""
+
+    __slots__ = ("status_code", "headers", "body")
+
+    def __init__(self, status_code, headers, body):
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+
+
+class SingleFlight:
+    def __init__(self, routes=None):
+        self.routes = list(routes or [])
+        self.calls = {}
+        self.requests = 0
+        self.leaders = 0
+        self.coalesced = 0
+
+    def is_coalescable_request(self, request, path):
+        """Anonymous GETs on a configured route."""
+        if request.method != "GET" or "authorization" in request.headers:
+            return False
+        return any(path_matches(path, route) for route in self.routes)
+
+    async def do(self, key, fn):
+        """Run `fn()` once per key at a time and hand its result to every caller.
+
+        Raises `DeadlineExceeded` when the caller's own deadline runs out first;
+        the shared call carries on for the others.
+        """
+        self.requests += 1
+        task = self.calls.get(key)
+        if task is None:
+            self.leaders += 1
+            # A fresh context: the shared call must not inherit the leader's
+            # deadline or request timing.
+            task = asyncio.create_task(fn(), context=contextvars.Context())
+            self.calls[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        else:
+            self.coalesced += 1
+        left = remaining()
+        if left is None:
+            return await asyncio.shield(task)
+        timeout = asyncio.timeout(max(0.0, left))
+        try:
+            async with timeout:
+                return await asyncio.shield(task)
+        except TimeoutError:
+            if timeout.expired():
+                raise DeadlineExceeded() from None
+            raise
+
+    def _finished(self, key, task):
+        if self.calls.get(key) is task:
+            del self.calls[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved even if every waiter went away.
+            task.exception()
+
+    def stats(self):
+        return {
+            "routes": self.routes,
+            "requests": self.requests,
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "in_flight_keys": len(self.calls),
+        }
@@ -0,0 +1,211 @@
+"""
+Negotiated gzip / brotli compression of gateway responses.
+
+Works as ASGI middleware on every `http.response.body` message, so streamed
+proxy responses are compressed chunk by chunk instead of being buffered.
+Only allow-listed text-like content types are touched; images such as WebP
+and anything already carrying a `content-encoding` or marked
+`Cache-Control: no-transform` pass through unchanged.
+"""
+import time
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+DEFAULT_CONTENT_TYPES = (
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/",
+)
+
+
+def parse_accept_encoding(header):
+    """{coding: qvalue} from an Accept-Encoding header."""
+    codings = {}
+    for item in (header or "").split(","):
+        parts = [part.strip() for part in item.split(";")]
+        if not parts[0]:
+            continue
+        quality = 1.0
+        for param in parts[1:]:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        codings[parts[0].lower()] = quality
+    return codings
+
+
+def choose_encoding(header, available):
+    """Best coding from `available` (in server preference order), or None."""
+    codings = parse_accept_encoding(header)
+    best, best_quality = None, 0.0
+    for coding in available:
+        quality = codings.get(coding, codings.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+class _Compressor:
+    def __init__(self, encoding, gzip_level, brotli_quality):
+        self.encoding = encoding
+        if encoding == "br":
+            self._impl = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._impl = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        if self.encoding == "br":
+            return self._impl.process(data)
+        return self._impl.compress(data)
+
+    def flush(self):
+        if self.encoding == "br":
+            return self._impl.finish()
+        return self._impl.flush()
+
+
+class CompressionStats:
+    def __init__(self):
+        self.responses = {}
+        self.bytes_in = {}
+        self.bytes_out = {}
+        self.cpu_seconds = {}
+        self.skipped = 0
+
+    def record(self, encoding, bytes_in, bytes_out, cpu_seconds):
+        self.bytes_in[encoding] = self.bytes_in.get(encoding, 0) + bytes_in
+        self.bytes_out[encoding] = self.bytes_out.get(encoding, 0) + bytes_out
+        self.cpu_seconds[encoding] = self.cpu_seconds.get(encoding, 0.0) + cpu_seconds
+
+    def as_dict(self):
+        return {
+            "responses": dict(self.responses),
+            "bytes_in": dict(self.bytes_in),
+            "bytes_out": dict(self.bytes_out),
+            "cpu_seconds": dict(self.cpu_seconds),
+            "skipped": self.skipped,
+        }
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size=1024, content_types=DEFAULT_CONTENT_TYPES,
+                 gzip_level=6, brotli_quality=4, stats=None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.content_types = tuple(content_types)
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.available = ("br", "gzip") if brotli is not None else ("gzip",)
+        self.stats = stats or CompressionStats()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"), self.available)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressedSend(self, encoding, send).run(scope, receive)
+
+    def is_compressible(self, headers, status):
+        if status < 200 or status in (204, 206, 304):
+            return False
+        if "content-encoding" in headers:
+            return False
+        cache_control = headers.get("cache-control", "")
+        if "no-transform" in (part.strip().lower() for part in cache_control.split(",")):
+            return False
+        content_type = headers.get("content-type", "").split(";", 1)[0].strip().lower()
+        if not content_type or content_type == "text/event-stream":
+            return False
+        if not content_type.startswith(self.content_types):
+            return False
+        length = headers.get("content-length")
+        if length is not None and length.isdigit() and int(length) < self.minimum_size:
+            return False
+        return True
+
+
+class _CompressedSend:
+    """Per-response state: holds the start message until the first body chunk."""
+
+    def __init__(self, middleware, encoding, send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.send = send
+        self.start_message = None
+        self.compressor = None
+        self.passthrough = False
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_seconds = 0.0
+
+    async def run(self, scope, receive):
+        await self.middleware.app(scope, receive, self.wrapped_send)
+
+    async def wrapped_send(self, message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            if not self.middleware.is_compressible(headers, message["status"]):
+                self.passthrough = True
+                self.middleware.stats.skipped += 1
+                await self.send(message)
+            return
+
+        if self.passthrough or message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            if not more_body and len(body) < self.middleware.minimum_size:
+                # Small response whose size was only known at the end.
+                self.passthrough = True
+                self.middleware.stats.skipped += 1
+                await self.send(self.start_message)
+                await self.send(message)
+                return
+            await self.start_compressing()
+
+        started = time.thread_time()
+        output = self.compressor.compress(body) if body else b""
+        if not more_body:
+            output += self.compressor.flush()
+        self.cpu_seconds += time.thread_time() - started
+        self.bytes_in += len(body)
+        self.bytes_out += len(output)
+
+        if output or not more_body:
+            await self.send({"type": "http.response.body", "body": output, "more_body": more_body})
+        if not more_body:
+            self.middleware.stats.record(self.encoding, self.bytes_in, self.bytes_out, self.cpu_seconds)
+
+    async def start_compressing(self):
+        middleware = self.middleware
+        self.compressor = _Compressor(self.encoding, middleware.gzip_level, middleware.brotli_quality)
+        middleware.stats.responses[self.encoding] = middleware.stats.responses.get(self.encoding, 0) + 1
+
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        del headers["content-length"]
+        headers["content-encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            # The representation changed, so only a weak validator still holds.
+            headers["etag"] = f"W/{etag}"
+        self.start_message["headers"] = headers.raw
+        await self.send(self.start_message)
@@ -0,0 +1,110 @@
+"""
+Client deadlines and cancellation of abandoned upstream calls.
+
+A client may send `X-Deadline-Ms`, the number of milliseconds it is still
+willing to wait. `DeadlineMiddleware` turns it into an absolute deadline for
+the request, held in a context variable like the request's timing. The
+upstream client clips each route's timeouts to what is left and forwards
+the remainder to Node as `X-Deadline-Ms`, so Node can stop work nobody is
+waiting for. `cancel_on_disconnect` cancels an upstream call as soon as the
+client goes away instead of letting it run to completion.
+"""
+import asyncio
+import time
+from contextvars import ContextVar
+
+DEADLINE_HEADER = b"x-deadline-ms"
+# Longest client budget honoured; route timeouts usually cut in far earlier.
+MAX_BUDGET_SECONDS = 300.0
+
+_current = ContextVar("gateway_request_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The request's time budget ran out before Node answered."""
+
+
+class ClientDisconnected(Exception):
+    """The client went away while its upstream call was in flight."""
+
+
+def parse_budget(value):
+    """Seconds from an `X-Deadline-Ms` value, or None when it is missing or invalid."""
+    try:
+        milliseconds = int(value)
+    except (TypeError, ValueError):
+        return None
+    if milliseconds <= 0:
+        return None
+    return min(milliseconds / 1000.0, MAX_BUDGET_SECONDS)
+
+
+def remaining():
+    """Seconds left before the current request's deadline, or None without one."""
+    deadline = _current.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+class DeadlineMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        budget = None
+        for name, value in scope["headers"]:
+            if name == DEADLINE_HEADER:
+                budget = parse_budget(value.decode("latin-1"))
+                break
+        if budget is None:
+            await self.app(scope, receive, send)
+            return
+        token = _current.set(time.monotonic() + budget)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current.reset(token)
+
+
+async def relay_body(chunks, body_sent):
+    """Pass a request body through, setting `body_sent` once it is exhausted."""
+    async for chunk in chunks:
+        yield chunk
+    body_sent.set()
+
+
+async def _disconnected(request, body_sent):
+    if body_sent is not None:
+        await body_sent.wait()
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def cancel_on_disconnect(request, awaitable, body_sent=None):
+    """Await `awaitable`, cancelling it and raising `ClientDisconnected` if the client leaves first.
+
+    The disconnect arrives on the request's receive channel, so it is only
+    watched once the body has been read: right away, or when the
+    `body_sent` event is set for a body that is streamed upstream.
+    """
+    task = asyncio.ensure_future(awaitable)
+    watcher = asyncio.ensure_future(_disconnected(request, body_sent))
+    try:
+        await asyncio.wait((task, watcher), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        if not task.done():
+            task.cancel()
+            try:
+                await task
+            except BaseException:
+                pass
+    if task.cancelled():
+        raise ClientDisconnected()
+    return task.result()
@@ -0,0 +1,45 @@
+"""
+Helpers for reading gateway settings from environment variables.
+"""
+import os
+
+
+def env_str(name, default=""):
+    value = os.environ.get(name)
+    return value.strip() if value is not None and value.strip() else default
+
+
+def env_int(name, default):
+    try:
+        return int(env_str(name, str(default)))
+    except ValueError:
+        print(f"Invalid integer for {name}, using {default}")
+        return default
+
+
+def env_float(name, default):
+    try:
+        return float(env_str(name, str(default)))
+    except ValueError:
+        print(f"Invalid number for {name}, using {default}")
+        return default
+
+
+def env_bool(name, default=False):
+    value = env_str(name, "")
+    if not value:
+        return default
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+def env_mapping(name, default=None):
+    """Parse `key=value,key=value` pairs, e.g. `/api/themes=60,/api/gallery=30`."""
+    mapping = dict(default or {})
+    raw = env_str(name, "")
+    for item in raw.split(","):
+        if "=" not in item:
+            continue
+        key, value = item.split("=", 1)
+        if key.strip():
+            mapping[key.strip()] = value.strip()
+    return mapping
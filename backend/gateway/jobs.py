@@ -0,0 +1,328 @@
+"""
+Slow AI requests offloaded to background jobs.
+
+Image generation keeps a client connection and an `ai` admission slot busy
+for up to 90 seconds. A request to an async route that carries
+`Prefer: respond-async` (or any request, on routes configured `always`) is
+answered `202` with a job id instead. The gateway then sends it to Node
+from a bounded per-worker queue, at most `concurrency` at a time, and
+stores Node's answer. Clients fetch that answer from `/api/jobs/{id}`,
+which relays the original status and body once the job has finished, or
+follow it as an event stream.
+
+Jobs and results live in a SQLite file, so whichever gateway worker a
+status request lands on can answer it. Results are kept for `result_ttl`
+seconds. Every store call runs on a single-thread executor, so a worker
+waiting for the file lock never stalls the event loop. A job whose worker
+died before it finished is reported as failed once `job_timeout` has
+passed. Jobs submitted with an `Authorization` header can only be read
+back with the same header.
+"""
+import asyncio
+import contextvars
+import hashlib
+import json
+import os
+import secrets
+import sqlite3
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from gateway.env import env_mapping
+
+# Path prefix -> "prefer" (only with Prefer: respond-async), "always" or "off";
+# the longest matching prefix wins, unmatched paths are never offloaded.
+DEFAULT_ASYNC_ROUTES = {
+    "/api/themes/ai-generate": "prefer",
+}
+
+FINAL_STATES = frozenset({"done", "failed"})
+# Not worth replaying from a stored result
+DROPPED_HEADERS = frozenset({"content-length", "date", "set-cookie"})
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    path TEXT NOT NULL,
+    state TEXT NOT NULL,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    status_code INTEGER,
+    headers TEXT,
+    body BLOB
+) WITHOUT ROWID;
+"""
+
+
+def load_async_routes():
+    """Prefix table with `GATEWAY_ASYNC_ROUTES` overrides (`prefix=prefer|always|off`)."""
+    return env_mapping("GATEWAY_ASYNC_ROUTES", DEFAULT_ASYNC_ROUTES)
+
+
+def prefers_async(prefer):
+    """Whether a `Prefer` header value asks for `respond-async` (RFC 7240)."""
+    return any(
+        part.split(";", 1)[0].strip().lower() == "respond-async"
+        for part in (prefer or "").split(",")
+    )
+
+
+def owner_for(authorization):
+    return hashlib.sha256(authorization.encode()).hexdigest() if authorization else ""
+
+
+class QueueFull(Exception):
+    """Raised when this worker already has its maximum number of queued jobs."""
+
+
+class JobRecord:
+    """A job as stored; `status_code`, `headers` and `body` are set once it has finished."""
+
+    __slots__ = ("id", "path", "state", "created", "updated", "status_code", "headers", "body")
+
+    def __init__(self, id, path, state, created, updated, status_code=None, headers=None,
+                 body=None):
+        self.id = id
+        self.path = path
+        self.state = state
+        self.created = created
+        self.updated = updated
+        self.status_code = status_code
+        self.headers = headers or []
+        self.body = body or b""
+
+    @property
+    def finished(self):
+        return self.state in FINAL_STATES
+
+    def summary(self):
+        return {"job_id": self.id, "status": self.state, "path": self.path}
+
+
+class PendingJob:
+    __slots__ = ("id", "method", "url", "headers", "body", "task")
+
+    def __init__(self, id, method, url, headers, body):
+        self.id = id
+        self.method = method
+        self.url = url
+        self.headers = headers
+        self.body = body
+        self.task = None
+
+
+class JobQueue:
+    def __init__(self, run, routes, path=None, enabled=True, concurrency=2, max_queued=16,
+                 result_ttl=600.0, job_timeout=180.0, poll_interval=0.5):
+        # run(method, url, headers, body) -> (status_code, raw headers, body bytes)
+        self.run = run
+        self.routes = sorted(routes.items(), key=lambda item: len(item[0]), reverse=True)
+        self.path = path or os.path.join(tempfile.gettempdir(), "peekaboo-jobs.sqlite3")
+        self.enabled = enabled
+        self.concurrency = concurrency
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        self.job_timeout = job_timeout
+        self.poll_interval = poll_interval
+        self._db = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-store")
+        self._submitting = 0
+        self._queued = deque()
+        self._running = {}
+        self._finished = {}  # job id -> Event, for waiters in this worker
+        self._last_prune = 0.0
+
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.run_seconds = 0.0
+
+    def mode_for(self, path):
+        if not self.enabled:
+            return "off"
+        for prefix, mode in self.routes:
+            if path == prefix or path.startswith(prefix.rstrip("/") + "/"):
+                return mode
+        return "off"
+
+    def wants_job(self, method, path, prefer):
+        """Whether this request should be answered with a job instead of proxied."""
+        if method in ("GET", "HEAD", "OPTIONS"):
+            return False
+        mode = self.mode_for(path)
+        return mode == "always" or (mode == "prefer" and prefers_async(prefer))
+
+    async def _run_db(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=1.0)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(SCHEMA)
+        return db
+
+    def _execute(self, sql, params=()):
+        if self._db is None:
+            self._db = self._connect()
+        return self._db.execute(sql, params)
+
+    def _insert(self, job_id, owner, path, now):
+        self._execute(
+            "INSERT INTO jobs (id, owner, path, state, created, updated) "
+            "VALUES (?, ?, ?, 'queued', ?, ?)",
+            (job_id, owner, path, now, now),
+        )
+        if now - self._last_prune >= 60:
+            self._last_prune = now
+            self._execute(
+                "DELETE FROM jobs WHERE (state IN ('done', 'failed') AND updated < ?) OR created < ?",
+                (now - self.result_ttl, now - self.result_ttl - self.job_timeout),
+            )
+
+    def _select(self, job_id):
+        return self._execute(
+            "SELECT path, state, created, updated, status_code, headers, body, owner "
+            "FROM jobs WHERE id = ?",
+            (job_id,),
+        ).fetchone()
+
+    async def submit(self, method, url, headers, body, authorization=""):
+        """Queue a request and return its `JobRecord`; raises `QueueFull` or `sqlite3.Error`."""
+        if len(self._queued) + self._submitting >= self.max_queued:
+            self.rejected += 1
+            raise QueueFull()
+        now = time.time()
+        job_id = secrets.token_urlsafe(16)
+        path = url.split("?", 1)[0]
+        self._submitting += 1
+        try:
+            await self._run_db(self._insert, job_id, owner_for(authorization), path, now)
+        finally:
+            self._submitting -= 1
+        self._queued.append(PendingJob(job_id, method, url, headers, body))
+        self._finished[job_id] = asyncio.Event()
+        self.submitted += 1
+        self._dispatch()
+        return JobRecord(job_id, path, "queued", now, now)
+
+    def _dispatch(self):
+        while self._queued and len(self._running) < self.concurrency:
+            job = self._queued.popleft()
+            self._running[job.id] = job
+            # A fresh context: the job must not inherit the submitting request's
+            # deadline or request timing.
+            job.task = asyncio.create_task(self._run(job), context=contextvars.Context())
+
+    async def _run(self, job):
+        started = time.monotonic()
+        try:
+            await self._run_db(self._set_state, job.id, "running")
+            try:
+                status_code, headers, body = await self.run(job.method, job.url, job.headers, job.body)
+            except Exception as exc:
+                print(f"Job {job.id} for {job.url} failed: {exc}")
+                status_code, headers, body = 500, [], b'{"error": "Job failed"}'
+            state = "done" if status_code < 500 else "failed"
+            await self._run_db(self._store, job.id, state, status_code, headers, body)
+            if state == "done":
+                self.completed += 1
+            else:
+                self.failed += 1
+        except sqlite3.Error as exc:
+            print(f"Job store unavailable, result of {job.id} lost: {exc}")
+        finally:
+            self.run_seconds += time.monotonic() - started
+            self._running.pop(job.id, None)
+            finished = self._finished.pop(job.id, None)
+            if finished is not None:
+                finished.set()
+            self._dispatch()
+
+    def _set_state(self, job_id, state):
+        self._execute("UPDATE jobs SET state = ?, updated = ? WHERE id = ?", (state, time.time(), job_id))
+
+    def _store(self, job_id, state, status_code, headers, body):
+        kept = [
+            [name.decode("latin-1"), value.decode("latin-1")]
+            for name, value in headers if name.decode("latin-1") not in DROPPED_HEADERS
+        ]
+        self._execute(
+            "UPDATE jobs SET state = ?, updated = ?, status_code = ?, headers = ?, body = ? "
+            "WHERE id = ?",
+            (state, time.time(), status_code, json.dumps(kept), body, job_id),
+        )
+
+    async def get(self, job_id, authorization=""):
+        """The job's `JobRecord`, or None if it is unknown, expired or someone else's."""
+        row = await self._run_db(self._select, job_id)
+        if row is None or not secrets.compare_digest(row[7], owner_for(authorization)):
+            return None
+        path, state, created, updated, status_code, headers, body, _ = row
+        now = time.time()
+        if state in FINAL_STATES:
+            if now - updated > self.result_ttl:
+                return None
+            headers = [
+                (name.encode("latin-1"), value.encode("latin-1"))
+                for name, value in json.loads(headers or "[]")
+            ]
+            return JobRecord(job_id, path, state, created, updated, status_code, headers, body)
+        if now - created > self.job_timeout and job_id not in self._finished:
+            # Not pending in this worker, and whichever worker took it is gone.
+            return JobRecord(job_id, path, "failed", created, updated, 504, [],
+                             b'{"error": "Job timed out"}')
+        return JobRecord(job_id, path, state, created, updated)
+
+    async def wait(self, job_id, authorization, timeout, since=None):
+        """The job once its state differs from `since` or it has finished, or after `timeout`."""
+        deadline = time.monotonic() + timeout
+        while True:
+            record = await self.get(job_id, authorization)
+            if record is None or record.finished or (since is not None and record.state != since):
+                return record
+            left = deadline - time.monotonic()
+            if left <= 0:
+                return record
+            finished = self._finished.get(job_id)
+            if finished is not None and record.state == "running":
+                # Running here: no need to poll the store.
+                try:
+                    await asyncio.wait_for(finished.wait(), left)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await asyncio.sleep(min(self.poll_interval, left))
+
+    async def aclose(self):
+        # Unstarted jobs are dropped first so cancelled ones do not start them.
+        self._queued.clear()
+        tasks = [job.task for job in self._running.values() if job.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._run_db(self._close_db)
+        self._executor.shutdown(wait=False)
+
+    def _close_db(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "concurrency": self.concurrency,
+            "max_queued": self.max_queued,
+            "queued": len(self._queued),
+            "running": len(self._running),
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "failed": self.failed,
+            "run_seconds": self.run_seconds,
+        }
@@ -0,0 +1,294 @@
+"""
+Prometheus text-format metrics for the gateway (`GET /metrics`).
+
+Requests are labelled by route template (`/api/payments/status/{session_id}`,
+`/api/admin/customers/{id}`) rather than raw path. Each request's time is
+split into the upstream part, which is the time Node takes to send back
+response headers and is recorded by `UpstreamClient.send` in the request's
+`RequestTiming`, and the gateway's own overhead before the response starts.
+"""
+import re
+import time
+from bisect import bisect_left
+
+from gateway.timing import begin_timing, end_timing
+
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+_OBJECT_ID = re.compile(r"^[0-9a-fA-F]{24}$")
+_UUID = re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")
+_NUMBER = re.compile(r"^\d+$")
+_HAS_DIGIT = re.compile(r"\d")
+_CONVERTER = re.compile(r":\w+}")
+
+def normalize_path(path):
+    """Replace ids and other high-cardinality segments of a raw path."""
+    segments = []
+    for segment in path.split("/"):
+        if _OBJECT_ID.match(segment) or _UUID.match(segment):
+            segment = "{id}"
+        elif _NUMBER.match(segment):
+            segment = "{n}"
+        elif len(segment) >= 16 and _HAS_DIGIT.search(segment):
+            segment = "{token}"
+        segments.append(segment)
+    return "/".join(segments)
+
+
+def route_template(scope, expand_routes=()):
+    """Template of the matched route; catch-all proxy routes use the normalized path."""
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if template is None or template in expand_routes:
+        return normalize_path(scope.get("path", ""))
+    return _CONVERTER.sub("}", template)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _number(value):
+    if value is None:
+        return "NaN"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsWriter:
+    """Accumulates metric families and renders the text exposition format."""
+
+    def __init__(self):
+        self.lines = []
+
+    def _family(self, name, kind, help_text):
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {kind}")
+
+    def counter(self, name, help_text, samples):
+        self._family(name, "counter", help_text)
+        for labels, value in samples:
+            self.lines.append(f"{name}{_labels(labels)} {_number(value)}")
+
+    def gauge(self, name, help_text, samples):
+        self._family(name, "gauge", help_text)
+        for labels, value in samples:
+            self.lines.append(f"{name}{_labels(labels)} {_number(value)}")
+
+    def histogram(self, name, help_text, samples):
+        self._family(name, "histogram", help_text)
+        for labels, histogram in samples:
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                cumulative += count
+                bucket_labels = dict(labels, le=_number(float(bound)))
+                self.lines.append(f"{name}_bucket{_labels(bucket_labels)} {cumulative}")
+            self.lines.append(f"{name}_sum{_labels(labels)} {_number(histogram.sum)}")
+            self.lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+
+    def render(self):
+        return "\n".join(self.lines) + "\n"
+
+
+class RequestMetrics:
+    def __init__(self, buckets=DEFAULT_BUCKETS, max_routes=256):
+        self.buckets = buckets
+        self.max_routes = max_routes
+        self.routes = set()
+        self.requests = {}  # (method, route, status) -> count
+        self.duration = {}  # (method, route) -> Histogram
+        self.upstream = {}
+        self.overhead = {}
+        self.in_flight = 0
+
+    def route_label(self, template):
+        """Bound the label set: unseen templates past `max_routes` share one label."""
+        if template in self.routes:
+            return template
+        if len(self.routes) >= self.max_routes:
+            return "other"
+        self.routes.add(template)
+        return template
+
+    def _histogram(self, table, key):
+        histogram = table.get(key)
+        if histogram is None:
+            histogram = table[key] = Histogram(self.buckets)
+        return histogram
+
+    def observe(self, method, template, status, total, to_headers, upstream):
+        key = (method, self.route_label(template))
+        status_key = key + (str(status),)
+        self.requests[status_key] = self.requests.get(status_key, 0) + 1
+        self._histogram(self.duration, key).observe(total)
+        if upstream > 0:
+            self._histogram(self.upstream, key).observe(upstream)
+        self._histogram(self.overhead, key).observe(max(0.0, to_headers - upstream))
+
+    def write(self, writer):
+        def labelled(table):
+            return [
+                ({"method": method, "route": route}, value)
+                for (method, route), value in sorted(table.items())
+            ]
+
+        writer.counter("gateway_requests_total", "Requests by route template and status.", [
+            ({"method": method, "route": route, "status": status}, count)
+            for (method, route, status), count in sorted(self.requests.items())
+        ])
+        writer.gauge("gateway_requests_in_flight", "Requests currently being handled.", [
+            ({}, self.in_flight),
+        ])
+        writer.histogram(
+            "gateway_request_duration_seconds",
+            "Time from request arrival to the last response byte.",
+            labelled(self.duration),
+        )
+        writer.histogram(
+            "gateway_upstream_duration_seconds",
+            "Time Node took to return response headers.",
+            labelled(self.upstream),
+        )
+        writer.histogram(
+            "gateway_overhead_seconds",
+            "Gateway time before response headers, excluding upstream time.",
+            labelled(self.overhead),
+        )
+
+
+class MetricsMiddleware:
+    """Times every HTTP request and records it in a `RequestMetrics`."""
+
+    def __init__(self, app, metrics, expand_routes=()):
+        self.app = app
+        self.metrics = metrics
+        self.expand_routes = tuple(expand_routes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metrics = self.metrics
+        started = time.perf_counter()
+        timing, token = begin_timing()
+        response = {"status": 500, "to_headers": None}
+
+        async def timed_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["to_headers"] = time.perf_counter() - started
+            await send(message)
+
+        metrics.in_flight += 1
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            metrics.in_flight -= 1
+            end_timing(token)
+            total = time.perf_counter() - started
+            metrics.observe(
+                scope["method"],
+                route_template(scope, self.expand_routes),
+                response["status"],
+                total,
+                response["to_headers"] if response["to_headers"] is not None else total,
+                timing.phases.get("upstream", 0.0),
+            )
+
+
+def write_upstream_metrics(writer, pool_stats):
+    """Per-worker connection pool and traffic figures from `UpstreamPool.stats()`."""
+    workers = pool_stats["workers"]
+
+    def per_worker(key):
+        return [({"worker": worker["name"]}, worker[key]) for worker in workers]
+
+    writer.gauge("gateway_upstream_healthy", "1 while the Node worker is in rotation.",
+                 per_worker("healthy"))
+    writer.gauge("gateway_upstream_in_flight", "Requests currently sent to the Node worker.",
+                 per_worker("in_flight"))
+    writer.counter("gateway_upstream_requests_total", "Requests sent to the Node worker.",
+                   per_worker("requests_total"))
+    writer.counter("gateway_upstream_errors_total", "Requests to the Node worker that failed.",
+                   per_worker("errors_total"))
+    writer.counter("gateway_upstream_timeouts_total",
+                   "Requests to the Node worker cut off by the route timeout or client deadline.",
+                   per_worker("timeouts_total"))
+    writer.counter("gateway_upstream_connections_opened_total",
+                   "New connections opened to the Node worker.", per_worker("connections_opened"))
+    pools = [(worker["name"], worker["pool"]) for worker in workers if worker["pool"]]
+    writer.gauge("gateway_upstream_pool_connections", "Pooled upstream connections by state.", [
+        ({"worker": name, "state": state}, pool[state])
+        for name, pool in pools for state in ("idle", "active")
+    ])
+    writer.gauge("gateway_upstream_pool_queued_requests",
+                 "Requests waiting for a pooled upstream connection.",
+                 [({"worker": name}, pool["queued_requests"]) for name, pool in pools])
+    breakers = [(worker["name"], worker["breaker"]) for worker in workers]
+    writer.gauge("gateway_upstream_breaker_state",
+                 "Circuit breaker state: 0 closed, 1 half-open, 2 open.",
+                 [({"worker": name}, breaker["state_value"]) for name, breaker in breakers])
+    writer.counter("gateway_upstream_breaker_opened_total", "Times the circuit breaker opened.",
+                   [({"worker": name}, breaker["opened_total"]) for name, breaker in breakers])
+    writer.counter("gateway_upstream_breaker_rejected_total",
+                   "Calls failed fast by an open circuit breaker.",
+                   [({"worker": name}, breaker["rejected_total"]) for name, breaker in breakers])
+    writer.counter("gateway_upstream_retries_total", "Safe requests retried after an upstream failure.",
+                   [({}, pool_stats["retry"]["retries"])])
+    writer.counter("gateway_upstream_retry_budget_exhausted_total",
+                   "Retries skipped because the retry budget was spent.",
+                   [({}, pool_stats["retry"]["budget_exhausted"])])
+    writer.counter("gateway_upstream_hedges_total", "Hedged second attempts sent.",
+                   [({}, pool_stats["hedge"]["hedged"])])
+    writer.counter("gateway_upstream_hedge_wins_total", "Hedged attempts that answered first.",
+                   [({}, pool_stats["hedge"]["hedge_wins"])])
+
+
+def write_node_metrics(writer, node_stats):
+    """Readiness and restart figures from `NodeSupervisor.stats()`."""
+    workers = node_stats["workers"]
+    writer.gauge("node_worker_ready", "1 while the Node worker answers /healthz.",
+                 [({"worker": worker["name"]}, worker["ready"]) for worker in workers])
+    writer.counter("node_worker_restarts_total", "Times the Node worker was restarted.",
+                   [({"worker": worker["name"]}, worker["restarts"]) for worker in workers])
+    writer.gauge("node_worker_ready_seconds", "Seconds the last start took to become ready.",
+                 [({"worker": worker["name"]}, worker["ready_seconds"]) for worker in workers])
+
+
+def write_stats_metrics(writer, prefix, stats, counters):
+    """Numeric top-level entries of a `stats()` dict: `counters` as counters, the rest as gauges."""
+    for key, value in stats.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        if key in counters:
+            name = key if key.endswith("_total") else f"{key}_total"
+            writer.counter(f"{prefix}_{name}", f"{prefix} {key.replace('_', ' ')}.", [({}, value)])
+        else:
+            writer.gauge(f"{prefix}_{key}", f"{prefix} {key.replace('_', ' ')}.", [({}, value)])
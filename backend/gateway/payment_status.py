@@ -0,0 +1,178 @@
+"""
+Shared upstream polling for payment status subscribers.
+
+Clients waiting for a checkout to settle subscribe to its status over
+Server-Sent Events or a long-poll instead of hitting
+`/api/payments/status/{session_id}` every tick. All subscribers of one
+session (and one bearer token, since the status is per user) share a
+single poll loop against Node. The loop polls quickly at first, backs off
+while nothing changes, snaps back to the short interval after a change,
+and tears itself down once the status is terminal or the last subscriber
+has left.
+"""
+import asyncio
+import contextvars
+import hashlib
+import json
+from contextlib import asynccontextmanager
+
+TERMINAL_STATUSES = frozenset({"paid", "failed", "expired", "cancelled"})
+# Node answers that will not change by polling again
+FINAL_HTTP_STATUSES = frozenset({400, 401, 403, 404})
+
+
+class PollerFull(Exception):
+    """Raised when the poller is already watching its maximum number of sessions."""
+
+
+class StatusSnapshot:
+    __slots__ = ("status_code", "body", "status", "final")
+
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+        self.status = None
+        if status_code == 200:
+            try:
+                self.status = json.loads(body).get("status")
+            except (ValueError, AttributeError):
+                pass
+        self.final = self.status in TERMINAL_STATUSES or status_code in FINAL_HTTP_STATUSES
+
+
+class StatusWatch:
+    """Latest status of one session; subscribers wait for versions newer than theirs."""
+
+    def __init__(self, key, session_id, authorization):
+        self.key = key
+        self.session_id = session_id
+        self.authorization = authorization
+        self.subscribers = 0
+        self.version = 0
+        self.snapshot = None
+        self.polls = 0
+        self.task = None
+        self.closed = False
+        self._updated = asyncio.Event()
+
+    @property
+    def done(self):
+        return self.closed or (self.snapshot is not None and self.snapshot.final)
+
+    def publish(self, snapshot):
+        self.version += 1
+        self.snapshot = snapshot
+        self._wake()
+
+    def close(self):
+        self.closed = True
+        self._wake()
+
+    def _wake(self):
+        updated, self._updated = self._updated, asyncio.Event()
+        updated.set()
+
+    async def wait(self, since, timeout):
+        """Return once there is a version newer than `since`, or after `timeout` seconds."""
+        if self.version > since or self.done or timeout <= 0:
+            return
+        try:
+            await asyncio.wait_for(self._updated.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+class PaymentStatusPoller:
+    def __init__(self, fetch, min_interval=1.0, max_interval=10.0, backoff=1.5,
+                 error_interval=5.0, max_watches=1000):
+        # fetch(session_id, authorization) -> (status_code, body bytes)
+        self.fetch = fetch
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.error_interval = error_interval
+        self.max_watches = max_watches
+        self.watches = {}
+
+        self.subscriptions = 0
+        self.polls = 0
+        self.poll_errors = 0
+        self.changes = 0
+        self.loops_started = 0
+
+    @staticmethod
+    def key_for(session_id, authorization):
+        return session_id, hashlib.sha256(authorization.encode()).hexdigest()
+
+    def has_room(self, session_id, authorization):
+        """Whether `subscribe` would succeed."""
+        return (len(self.watches) < self.max_watches
+                or self.key_for(session_id, authorization) in self.watches)
+
+    @asynccontextmanager
+    async def subscribe(self, session_id, authorization):
+        """The session's shared `StatusWatch`, polled for as long as anyone is subscribed."""
+        key = self.key_for(session_id, authorization)
+        watch = self.watches.get(key)
+        if watch is None:
+            if len(self.watches) >= self.max_watches:
+                raise PollerFull()
+            watch = self.watches[key] = StatusWatch(key, session_id, authorization)
+            self.loops_started += 1
+            # A fresh context: the loop must not inherit the first subscriber's
+            # deadline or request timing.
+            watch.task = asyncio.create_task(self._poll(watch), context=contextvars.Context())
+        watch.subscribers += 1
+        self.subscriptions += 1
+        try:
+            yield watch
+        finally:
+            watch.subscribers -= 1
+
+    async def _poll(self, watch):
+        interval = self.min_interval
+        try:
+            while watch.subscribers > 0:
+                watch.polls += 1
+                self.polls += 1
+                try:
+                    status_code, body = await self.fetch(watch.session_id, watch.authorization)
+                except Exception as exc:
+                    self.poll_errors += 1
+                    print(f"Payment status poll for {watch.session_id} failed: {exc}")
+                    interval = max(interval, self.error_interval)
+                else:
+                    if watch.snapshot is None or body != watch.snapshot.body \
+                            or status_code != watch.snapshot.status_code:
+                        self.changes += 1
+                        watch.publish(StatusSnapshot(status_code, body))
+                        interval = self.min_interval
+                    else:
+                        interval = min(self.max_interval, interval * self.backoff)
+                    if watch.done:
+                        break
+                await asyncio.sleep(interval)
+        finally:
+            if self.watches.get(watch.key) is watch:
+                del self.watches[watch.key]
+            # Wake anyone still waiting so they can give up.
+            watch.close()
+
+    async def aclose(self):
+        tasks = [watch.task for watch in self.watches.values() if watch.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self):
+        return {
+            "watching": len(self.watches),
+            "subscribers": sum(watch.subscribers for watch in self.watches.values()),
+            "subscriptions": self.subscriptions,
+            "loops_started": self.loops_started,
+            "polls": self.polls,
+            "poll_errors": self.poll_errors,
+            "changes": self.changes,
+            "min_interval": self.min_interval,
+            "max_interval": self.max_interval,
+        }
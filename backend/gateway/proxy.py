@@ -0,0 +1,96 @@
+"""
+Header handling shared by the proxy handlers.
+
+Hop-by-hop headers (RFC 9110 section 7.6.1) describe a single connection and
+must not be forwarded, otherwise `content-length` / `transfer-encoding` end up
+duplicated or contradicting the framing the next hop actually uses.
+"""
+from starlette.responses import Response, StreamingResponse
+
+HOP_BY_HOP_HEADERS = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "proxy-connection",
+    "te",
+    "trailer",
+    "transfer-encoding",
+    "upgrade",
+}
+
+BODYLESS_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+def _connection_tokens(headers):
+    tokens = set()
+    # Starlette spells it `getlist`, httpx `get_list`.
+    getlist = getattr(headers, "getlist", None) or headers.get_list
+    for value in getlist("connection"):
+        tokens.update(token.strip().lower() for token in value.split(",") if token.strip())
+    return tokens
+
+
+def upstream_request_headers(request):
+    """Headers to send to Node for an incoming Starlette request."""
+    drop = HOP_BY_HOP_HEADERS | _connection_tokens(request.headers) | {"host"}
+    headers = [
+        (key, value) for key, value in request.headers.items() if key.lower() not in drop
+    ]
+    if "transfer-encoding" in request.headers:
+        # The body is re-framed by httpx, a stale length would corrupt it.
+        headers = [(key, value) for key, value in headers if key.lower() != "content-length"]
+    return headers
+
+
+def has_request_body(request):
+    if "transfer-encoding" in request.headers:
+        return True
+    length = request.headers.get("content-length")
+    if length is not None:
+        return length.strip() not in ("", "0")
+    return request.method not in BODYLESS_METHODS
+
+
+def downstream_response_headers(response, buffered):
+    """Raw ASGI headers for relaying an httpx response back to the client.
+
+    Buffered responses carry httpx's decoded body, so the upstream
+    `content-encoding` and `content-length` no longer describe it and are
+    dropped; Starlette recomputes the length. Streamed responses relay the raw
+    upstream bytes and keep both.
+    """
+    drop = HOP_BY_HOP_HEADERS | _connection_tokens(response.headers)
+    if buffered:
+        drop = drop | {"content-encoding", "content-length"}
+    return [
+        (key.lower().encode("latin-1"), value.encode("latin-1"))
+        for key, value in response.headers.multi_items()
+        if key.lower() not in drop
+    ]
+
+
+def buffered_response(response):
+    """Starlette response carrying a fully read httpx response."""
+    return relay_buffered(
+        response.status_code,
+        downstream_response_headers(response, buffered=True),
+        response.content,
+    )
+
+
+def relay_buffered(status_code, headers, body):
+    """Starlette response for an already read body and relayed raw headers."""
+    relayed = Response(content=body, status_code=status_code)
+    length = [header for header in relayed.raw_headers if header[0] == b"content-length"]
+    relayed.raw_headers = length + list(headers)
+    return relayed
+
+
+def streaming_response(response, background=None):
+    """Starlette response that relays the raw upstream byte stream as it arrives."""
+    relayed = StreamingResponse(
+        response.aiter_raw(), status_code=response.status_code, background=background
+    )
+    relayed.raw_headers = downstream_response_headers(response, buffered=False)
+    return relayed
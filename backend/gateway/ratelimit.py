@@ -0,0 +1,254 @@
+"""
+Token-bucket rate limiting shared by every gateway worker.
+
+Node's `express-rate-limit` counters live in each Node process, so with
+several workers a client gets several budgets, and a rejected request has
+already paid for the proxy hop. Here each (client IP, rule) pair has a
+token bucket in a small SQLite database that every gateway process on the
+host opens. One `INSERT ... ON CONFLICT ... RETURNING` statement refills
+the bucket for the time elapsed and takes a token atomically, so workers
+never race. The statement runs on a single-thread executor, so a worker
+waiting for the file lock never stalls the event loop. Requests over the
+limit get `429` with `Retry-After` before the gateway reads the body or
+contacts Node. As with Express's nested `app.use` limiters, a request
+counts against every rule whose prefix matches it (`/api/auth/login`
+against both `api` and `auth`), outermost first.
+
+The client IP is taken from `X-Forwarded-For` the way Express's
+`trust proxy` does it: the entry `trusted_hops` from the right, falling
+back to the socket peer. If the store cannot be used, requests are let
+through rather than refused.
+"""
+import asyncio
+import json
+import math
+import os
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from gateway.env import env_mapping
+
+# rule -> (requests, per seconds); mirrors apiLimiter / authLimiter in node-app/index.js
+DEFAULT_RATE_LIMITS = {
+    "auth": (10, 900.0),
+    "api": (300, 900.0),
+}
+
+# Path prefix -> rule, or "off". Every matching rule applies unless the longest match is
+# "off"; unmatched paths are not limited.
+DEFAULT_RATE_ROUTES = {
+    "/api": "api",
+    "/api/auth/login": "auth",
+    "/api/auth/forgot-password": "auth",
+    # The bank's server-to-server callbacks must never be turned away.
+    "/api/payments/capital-bank/notify": "off",
+}
+
+RATE_LIMIT_MESSAGES = {
+    "auth": "محاولات كثيرة جداً، الرجاء المحاولة بعد 15 دقيقة",
+}
+DEFAULT_MESSAGE = "Too many requests, please try again later."
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL,
+    allowed INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+# Refill by elapsed time (capped at capacity), then take one token if there is one.
+TAKE = """
+INSERT INTO buckets (key, tokens, updated, allowed) VALUES (:key, :capacity - 1, :now, 1)
+ON CONFLICT (key) DO UPDATE SET
+    tokens = MIN(:capacity, tokens + MAX(0, :now - updated) * :rate)
+        - (MIN(:capacity, tokens + MAX(0, :now - updated) * :rate) >= 1),
+    allowed = MIN(:capacity, tokens + MAX(0, :now - updated) * :rate) >= 1,
+    updated = MAX(updated, :now)
+RETURNING tokens, allowed
+"""
+
+
+def load_rate_limits():
+    """Rule table with `GATEWAY_RATE_LIMITS` overrides (`rule=requests/seconds`)."""
+    limits = dict(DEFAULT_RATE_LIMITS)
+    for name, value in env_mapping("GATEWAY_RATE_LIMITS").items():
+        try:
+            requests_text, _, seconds_text = value.partition("/")
+            limits[name] = (int(requests_text), float(seconds_text) if seconds_text else 60.0)
+        except ValueError:
+            print(f"Invalid rate limit for {name}: {value}")
+    return limits
+
+
+def load_rate_routes():
+    """Prefix table with `GATEWAY_RATE_ROUTES` overrides (`prefix=rule|off`)."""
+    return env_mapping("GATEWAY_RATE_ROUTES", DEFAULT_RATE_ROUTES)
+
+
+def client_ip(scope, trusted_hops=1):
+    """The client address as Express computes it with `trust proxy` set to `trusted_hops`."""
+    peer = scope.get("client")
+    address = peer[0] if peer else ""
+    if trusted_hops <= 0:
+        return address
+    forwarded = []
+    for name, value in scope["headers"]:
+        if name == b"x-forwarded-for":
+            forwarded.extend(part.strip() for part in value.decode("latin-1").split(","))
+    forwarded = [part for part in forwarded if part]
+    if not forwarded:
+        return address
+    return forwarded[-min(trusted_hops, len(forwarded))]
+
+
+class RateLimiter:
+    def __init__(self, limits, routes, path=None, enabled=True, trusted_hops=1):
+        self.limits = limits
+        self.routes = sorted(
+            ((prefix, rule) for prefix, rule in routes.items() if rule == "off" or rule in limits),
+            key=lambda item: len(item[0]),
+            reverse=True,
+        )
+        self.path = path or os.path.join(tempfile.gettempdir(), "peekaboo-rate-limits.sqlite3")
+        self.enabled = enabled
+        self.trusted_hops = trusted_hops
+        self._db = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rate-limits")
+        self._last_prune = 0.0
+        self._last_error_log = 0.0
+
+        self.allowed = {name: 0 for name in limits}
+        self.limited = {name: 0 for name in limits}
+        self.store_errors = 0
+
+    def rules_for(self, path):
+        """Rules a request for `path` counts against, outermost (shortest prefix) first."""
+        matched = [
+            rule for prefix, rule in self.routes
+            if path == prefix or path.startswith(prefix.rstrip("/") + "/")
+        ]
+        if not matched or matched[0] == "off":
+            return []
+        return [rule for rule in reversed(matched) if rule != "off"]
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, isolation_level=None, timeout=0.05)
+        db.execute("PRAGMA journal_mode=WAL")
+        # Buckets are cheap to lose; never wait on the disk for them.
+        db.execute("PRAGMA synchronous=OFF")
+        db.execute(SCHEMA)
+        return db
+
+    def _prune(self, now):
+        # Any bucket idle for a full window is back at capacity; dropping it changes nothing.
+        longest = max(seconds for _, seconds in self.limits.values())
+        self._db.execute("DELETE FROM buckets WHERE updated < ?", (now - longest,))
+
+    def take(self, rule, client):
+        """(allowed, tokens left, seconds until the next token) for one request."""
+        requests, seconds = self.limits[rule]
+        rate = requests / seconds
+        now = time.time()
+        try:
+            if self._db is None:
+                self._db = self._connect()
+            tokens, allowed = self._db.execute(
+                TAKE,
+                {"key": f"{rule}:{client}", "capacity": requests, "rate": rate, "now": now},
+            ).fetchone()
+            if now - self._last_prune > 60:
+                self._last_prune = now
+                self._prune(now)
+        except sqlite3.Error as exc:
+            self.store_errors += 1
+            if now - self._last_error_log >= 60:
+                self._last_error_log = now
+                print(f"Rate limit store unavailable, letting requests through "
+                      f"({self.store_errors} errors so far): {exc}")
+            return True, requests, 0.0
+        if allowed:
+            self.allowed[rule] += 1
+            return True, tokens, 0.0
+        self.limited[rule] += 1
+        return False, tokens, (1 - tokens) / rate
+
+    def _take_all(self, rules, client):
+        for rule in rules:
+            allowed, tokens, wait = self.take(rule, client)
+            if not allowed:
+                return rule, False, tokens, wait
+        return rule, True, tokens, wait
+
+    async def check(self, rules, client):
+        """(rule, allowed, tokens left, seconds to wait): the first rule that refuses, else the last."""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, self._take_all, rules, client
+        )
+
+    def _close_db(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def close(self):
+        self._executor.submit(self._close_db)
+        self._executor.shutdown(wait=True)
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "trusted_hops": self.trusted_hops,
+            "store_errors": self.store_errors,
+            "rules": {
+                name: {
+                    "requests": requests,
+                    "seconds": seconds,
+                    "allowed": self.allowed[name],
+                    "limited": self.limited[name],
+                }
+                for name, (requests, seconds) in self.limits.items()
+            },
+        }
+
+
+class RateLimitMiddleware:
+    def __init__(self, app, limiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.limiter.enabled or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        rules = self.limiter.rules_for(scope["path"])
+        if not rules:
+            await self.app(scope, receive, send)
+            return
+        rule, allowed, tokens, wait = await self.limiter.check(
+            rules, client_ip(scope, self.limiter.trusted_hops)
+        )
+        if allowed:
+            await self.app(scope, receive, send)
+            return
+        requests, _ = self.limiter.limits[rule]
+        retry_after = str(max(1, math.ceil(wait)))
+        body = json.dumps(
+            {"error": RATE_LIMIT_MESSAGES.get(rule, DEFAULT_MESSAGE)}, ensure_ascii=False
+        ).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json; charset=utf-8"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", retry_after.encode()),
+                (b"ratelimit-limit", str(requests).encode()),
+                (b"ratelimit-remaining", str(max(0, math.floor(tokens))).encode()),
+                (b"ratelimit-reset", retry_after.encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,301 @@
+"""
+Circuit breaker, bounded retries and hedging for upstream calls.
+
+Each Node worker has a `CircuitBreaker` fed by every call that reaches it.
+It opens when, over a sliding window, too many calls failed (connection
+errors, timeouts) or were slow, and while open, calls fail immediately
+instead of waiting for the full timeout. Any HTTP response counts as Node
+being up: Node itself answers 502/503 when an optional integration (AI,
+a payment provider) is not configured, and that must not take the whole
+upstream out. After `open_seconds`
+a few probe calls are let through (half-open); if they succeed the breaker
+closes, and if any of them fails it opens again.
+
+`RetryPolicy` and `HedgePolicy` only apply to safe requests without a body
+(`GET`, `HEAD`). Retries use full-jitter exponential backoff and draw on a
+budget refilled by first attempts, so a struggling Node never sees more
+than a fixed fraction of extra traffic. A hedge is a second copy of a
+request sent when the first has not answered within the route's recent p95
+latency; the first usable response wins and the other is cancelled.
+Requests with bodies, such as checkout creation, are never sent twice.
+"""
+import math
+import random
+import time
+from collections import OrderedDict, deque
+
+from gateway.env import env_bool, env_float, env_int
+
+SAFE_METHODS = ("GET", "HEAD")
+# Answers worth retrying a safe request on
+FAILURE_STATUSES = (502, 503, 504)
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling a worker whose breaker is open."""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"circuit open for {name}")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name, enabled=True, window=10.0, min_requests=20, error_ratio=0.5,
+                 slow_ratio=0.5, slow_call_seconds=2.0, open_seconds=5.0, half_open_probes=3):
+        self.name = name
+        self.enabled = enabled
+        self.window = window
+        self.min_requests = min_requests
+        self.error_ratio = error_ratio
+        self.slow_ratio = slow_ratio
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.calls = deque()  # (monotonic time, failed, slow)
+        self.failures = 0
+        self.slow = 0
+        self.probes = 0
+        self.probe_successes = 0
+
+        self.opened_total = 0
+        self.rejected_total = 0
+        self.last_opened_at = None
+
+    def _trim(self, now):
+        while self.calls and now - self.calls[0][0] > self.window:
+            _, failed, slow = self.calls.popleft()
+            self.failures -= failed
+            self.slow -= slow
+
+    def _reset_window(self):
+        self.calls.clear()
+        self.failures = 0
+        self.slow = 0
+
+    def _open(self, now):
+        self.state = self.OPEN
+        self.opened_at = now
+        self.probes = 0
+        self.probe_successes = 0
+        self.opened_total += 1
+        self.last_opened_at = time.time()
+        self._reset_window()
+        print(f"Circuit breaker for {self.name} opened")
+
+    def _close(self):
+        self.state = self.CLOSED
+        self.probes = 0
+        self.probe_successes = 0
+        self._reset_window()
+        print(f"Circuit breaker for {self.name} closed")
+
+    def available(self):
+        """False while open and not yet due for a probe."""
+        return self.state != self.OPEN or time.monotonic() - self.opened_at >= self.open_seconds
+
+    def allow(self):
+        """Admit a call, returning whether it is a half-open probe; raises `CircuitOpen`."""
+        if not self.enabled or self.state == self.CLOSED:
+            return False
+        now = time.monotonic()
+        if self.state == self.OPEN:
+            remaining = self.open_seconds - (now - self.opened_at)
+            if remaining > 0:
+                self.rejected_total += 1
+                raise CircuitOpen(self.name, max(1, math.ceil(remaining)))
+            self.state = self.HALF_OPEN
+        if self.probes >= self.half_open_probes:
+            self.rejected_total += 1
+            raise CircuitOpen(self.name, 1)
+        self.probes += 1
+        return True
+
+    def record(self, probe, failed, slow=False):
+        """Outcome of a call admitted by `allow`."""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        if probe:
+            if self.state != self.HALF_OPEN:
+                return
+            self.probes -= 1
+            if failed or slow:
+                self._open(now)
+                return
+            self.probe_successes += 1
+            if self.probe_successes >= self.half_open_probes:
+                self._close()
+            return
+        if self.state != self.CLOSED:
+            # Started before the breaker opened; says nothing about the current state.
+            return
+        self.calls.append((now, failed, slow))
+        self.failures += failed
+        self.slow += slow
+        self._trim(now)
+        total = len(self.calls)
+        if total >= self.min_requests and (
+            self.failures >= total * self.error_ratio or self.slow >= total * self.slow_ratio
+        ):
+            self._open(now)
+
+    def cancelled(self, probe):
+        """A call that was abandoned (client gone, hedge lost) before it finished."""
+        if probe and self.state == self.HALF_OPEN:
+            self.probes -= 1
+
+    def stats(self):
+        self._trim(time.monotonic())
+        return {
+            "enabled": self.enabled,
+            "state": self.state,
+            "state_value": self.STATE_VALUES[self.state],
+            "window_calls": len(self.calls),
+            "window_failures": self.failures,
+            "window_slow": self.slow,
+            "opened_total": self.opened_total,
+            "rejected_total": self.rejected_total,
+            "last_opened_at": self.last_opened_at,
+        }
+
+
+class RetryBudget:
+    """Every first attempt deposits `ratio` tokens (up to `capacity`); a retry or hedge spends one."""
+
+    def __init__(self, ratio, capacity=10.0):
+        self.ratio = ratio
+        self.capacity = capacity
+        self.tokens = capacity
+
+    def deposit(self):
+        self.tokens = min(self.capacity, self.tokens + self.ratio)
+
+    def withdraw(self):
+        if self.tokens < 1.0:
+            return False
+        self.tokens -= 1.0
+        return True
+
+
+class RetryPolicy:
+    def __init__(self, max_retries=2, base_delay=0.05, max_delay=1.0, budget_ratio=0.2):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = RetryBudget(budget_ratio)
+
+        self.retries = 0
+        self.exhausted = 0
+
+    def should_retry(self, attempt):
+        """Whether retry number `attempt` (1-based) may be sent."""
+        if attempt > self.max_retries:
+            return False
+        if not self.budget.withdraw():
+            self.exhausted += 1
+            return False
+        self.retries += 1
+        return True
+
+    def backoff(self, attempt):
+        """Full jitter: uniform between 0 and the capped exponential delay."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+    def stats(self):
+        return {
+            "max_retries": self.max_retries,
+            "retries": self.retries,
+            "budget_exhausted": self.exhausted,
+            "budget_tokens": self.budget.tokens,
+        }
+
+
+class LatencyWindow:
+    """Recent latencies of one route; the percentile is recomputed every few samples."""
+
+    def __init__(self, size=200, refresh=20):
+        self.samples = deque(maxlen=size)
+        self.refresh = refresh
+        self.pending = 0
+        self.cached = {}
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+        self.pending += 1
+
+    def percentile(self, p):
+        if self.pending >= self.refresh or p not in self.cached:
+            ordered = sorted(self.samples)
+            self.cached = {}
+            self.pending = 0
+            if ordered:
+                self.cached[p] = ordered[min(len(ordered) - 1, int(len(ordered) * p / 100.0))]
+        return self.cached.get(p)
+
+
+class HedgePolicy:
+    def __init__(self, enabled=False, percentile=95.0, min_delay=0.005, max_delay=2.0,
+                 min_samples=20, budget_ratio=0.05, max_routes=256):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = min_samples
+        self.budget = RetryBudget(budget_ratio)
+        self.max_routes = max_routes
+        self.routes = OrderedDict()
+
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def record(self, route, seconds):
+        window = self.routes.get(route)
+        if window is None:
+            window = self.routes[route] = LatencyWindow()
+            if len(self.routes) > self.max_routes:
+                self.routes.popitem(last=False)
+        else:
+            self.routes.move_to_end(route)
+        window.record(seconds)
+
+    def delay_for(self, route):
+        """Seconds to wait before hedging `route`, or None when there is too little history."""
+        if not self.enabled:
+            return None
+        window = self.routes.get(route)
+        if window is None or len(window.samples) < self.min_samples:
+            return None
+        return min(self.max_delay, max(self.min_delay, window.percentile(self.percentile)))
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "percentile": self.percentile,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "budget_tokens": self.budget.tokens,
+            "routes_tracked": len(self.routes),
+        }
+
+
+def breaker_from_env(name):
+    return CircuitBreaker(
+        name,
+        enabled=env_bool("GATEWAY_BREAKER", True),
+        window=env_float("GATEWAY_BREAKER_WINDOW", 10.0),
+        min_requests=env_int("GATEWAY_BREAKER_MIN_REQUESTS", 20),
+        error_ratio=env_float("GATEWAY_BREAKER_ERROR_RATIO", 0.5),
+        slow_ratio=env_float("GATEWAY_BREAKER_SLOW_RATIO", 0.5),
+        slow_call_seconds=env_float("GATEWAY_BREAKER_SLOW_SECONDS", 2.0),
+        open_seconds=env_float("GATEWAY_BREAKER_OPEN_SECONDS", 5.0),
+        half_open_probes=max(1, env_int("GATEWAY_BREAKER_PROBES", 3)),
+    )
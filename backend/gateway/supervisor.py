@@ -0,0 +1,252 @@
+"""
+Supervisor for the Node.js worker processes.
+
+Each worker gets a monitor thread that spawns `node index.js`, polls
+`/healthz` until the worker answers, then waits for it to exit and restarts
+it with exponential backoff. Readiness is published through a
+`threading.Event` so async handlers can hold or fast-fail traffic while Node
+is (re)starting.
+
+With `external=True` nothing is spawned: the workers are managed elsewhere
+(a benchmark stub, another process) and the monitor threads only probe them.
+"""
+import asyncio
+import os
+import shlex
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from gateway.env import env_float, env_int, env_str
+
+
+def probe_healthz(port=None, socket_path=None, timeout=1.0):
+    """True when the Node worker answers `GET /healthz` with 200."""
+    try:
+        if socket_path:
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            conn.settimeout(timeout)
+            conn.connect(socket_path)
+        else:
+            conn = socket.create_connection(("127.0.0.1", port), timeout=timeout)
+        with conn:
+            conn.sendall(b"GET /healthz HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+            response = b""
+            while len(response) < 4096:
+                chunk = conn.recv(1024)
+                if not chunk:
+                    break
+                response += chunk
+            status_line = response.split(b"\r\n", 1)[0]
+        return status_line.split(b" ")[1:2] == [b"200"]
+    except (OSError, IndexError):
+        return False
+
+
+class NodeWorkerProcess:
+    """State of one supervised Node process."""
+
+    def __init__(self, name, port, socket_path=""):
+        self.name = name
+        self.port = port
+        self.socket_path = socket_path
+        self.process = None
+        self.ready = threading.Event()
+        self.restarts = 0
+        self.started_at = None
+        self.ready_seconds = None
+        self.last_exit_code = None
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "port": self.port,
+            "socket": self.socket_path or None,
+            "pid": self.process.pid if self.process else None,
+            "ready": self.ready.is_set(),
+            "restarts": self.restarts,
+            "ready_seconds": self.ready_seconds,
+            "last_exit_code": self.last_exit_code,
+            "uptime_seconds": (
+                time.monotonic() - self.started_at if self.started_at and self.ready.is_set() else None
+            ),
+        }
+
+
+class NodeSupervisor:
+    """Starts, probes and restarts the Node workers."""
+
+    def __init__(self, addresses, cwd, command=None, env=None, ready_timeout=60.0,
+                 probe_interval=0.1, backoff_initial=0.5, backoff_max=30.0, stable_after=30.0,
+                 external=False, watch_interval=1.0):
+        self.workers = [
+            NodeWorkerProcess(f"node-{index}", port, socket_path)
+            for index, (port, socket_path) in enumerate(addresses)
+        ]
+        self.cwd = cwd
+        self.command = command or ["node", "index.js"]
+        self.env = env
+        self.ready_timeout = ready_timeout
+        self.probe_interval = probe_interval
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.stable_after = stable_after
+        self.external = external
+        self.watch_interval = watch_interval
+        self._stopping = threading.Event()
+        self._threads = []
+
+    def start(self):
+        if self._threads:
+            return  # already started early (GATEWAY_FAST_START)
+        self._stopping.clear()
+        for worker in self.workers:
+            thread = threading.Thread(
+                target=self._watch if self.external else self._supervise,
+                args=(worker,), name=f"supervise-{worker.name}", daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=10.0):
+        self._stopping.set()
+        for worker in self.workers:
+            if worker.process and worker.process.poll() is None:
+                worker.process.terminate()
+        for worker in self.workers:
+            if worker.process:
+                try:
+                    worker.process.wait(timeout=timeout)
+                except subprocess.TimeoutExpired:
+                    worker.process.kill()
+                    worker.process.wait()
+            worker.ready.clear()
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+        if self._threads and not self.external:
+            print("Node.js server stopped")
+        self._threads = []
+
+    def _spawn(self, worker):
+        env = dict(self.env or {})
+        env["PORT"] = str(worker.port)
+        if worker.socket_path:
+            env["SOCKET_PATH"] = worker.socket_path
+        worker.process = subprocess.Popen(
+            self.command, cwd=self.cwd, stdout=sys.stdout, stderr=sys.stderr, env=env
+        )
+        worker.started_at = time.monotonic()
+
+    def _wait_ready(self, worker):
+        deadline = worker.started_at + self.ready_timeout
+        while not self._stopping.is_set() and time.monotonic() < deadline:
+            if worker.process.poll() is not None:
+                return False
+            if probe_healthz(worker.port, worker.socket_path):
+                return True
+            self._stopping.wait(self.probe_interval)
+        return False
+
+    def _supervise(self, worker):
+        backoff = self.backoff_initial
+        while not self._stopping.is_set():
+            self._spawn(worker)
+            address = worker.socket_path or f"internal port {worker.port}"
+
+            if self._wait_ready(worker):
+                worker.ready_seconds = time.monotonic() - worker.started_at
+                worker.ready.set()
+                print(f"Node.js server ready on {address} after {worker.ready_seconds:.2f}s")
+            elif worker.process.poll() is None and not self._stopping.is_set():
+                print(f"Node.js server on {address} not ready after {self.ready_timeout:.0f}s, restarting")
+                worker.process.kill()
+
+            worker.last_exit_code = worker.process.wait()
+            worker.ready.clear()
+            if self._stopping.is_set():
+                break
+
+            if time.monotonic() - worker.started_at >= self.stable_after:
+                backoff = self.backoff_initial
+            print(f"Node.js server on {address} exited with code {worker.last_exit_code}, "
+                  f"restarting in {backoff:.1f}s")
+            if self._stopping.wait(backoff):
+                break
+            backoff = min(backoff * 2, self.backoff_max)
+            worker.restarts += 1
+
+    def _watch(self, worker):
+        """Track readiness of a worker this process does not own."""
+        worker.started_at = time.monotonic()
+        address = worker.socket_path or f"port {worker.port}"
+        while not self._stopping.is_set():
+            if probe_healthz(worker.port, worker.socket_path):
+                if not worker.ready.is_set():
+                    if worker.ready_seconds is None:
+                        worker.ready_seconds = time.monotonic() - worker.started_at
+                    worker.ready.set()
+                    print(f"External Node.js server ready on {address}")
+                self._stopping.wait(self.watch_interval)
+            else:
+                if worker.ready.is_set():
+                    worker.ready.clear()
+                    print(f"External Node.js server on {address} stopped answering /healthz")
+                self._stopping.wait(self.probe_interval)
+
+    def is_ready(self):
+        return any(worker.ready.is_set() for worker in self.workers)
+
+    async def wait_ready(self, timeout):
+        """Wait up to `timeout` seconds for at least one worker to be ready."""
+        deadline = time.monotonic() + timeout
+        while not self.is_ready():
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.01)
+        return True
+
+    def stats(self):
+        workers = [worker.stats() for worker in self.workers]
+        return {
+            "ready": self.is_ready(),
+            # Probed only: restarts and exit codes belong to whoever spawned Node.
+            "external": self.external,
+            "workers_ready": sum(1 for worker in workers if worker["ready"]),
+            "restarts_total": sum(worker["restarts"] for worker in workers),
+            "workers": workers,
+        }
+
+
+def node_addresses_from_env():
+    """(port, socket path) for every Node worker.
+
+    Worker i listens on `NODE_PORT + i`, or on `NODE_SOCKET` (`NODE_SOCKET.i`
+    with several workers) when a Unix socket is configured.
+    """
+    port = env_int("NODE_PORT", 8002)
+    socket_base = env_str("NODE_SOCKET", "")
+    count = max(1, env_int("NODE_WORKERS", 1))
+    addresses = []
+    for index in range(count):
+        socket_path = ""
+        if socket_base:
+            socket_path = socket_base if count == 1 else f"{socket_base}.{index}"
+        addresses.append((port + index, socket_path))
+    return addresses
+
+
+def node_supervisor_from_env(cwd, external=False):
+    return NodeSupervisor(
+        node_addresses_from_env(),
+        cwd=cwd,
+        # Benchmarks swap Node for a stub; it gets PORT / SOCKET_PATH like Node does
+        command=shlex.split(env_str("NODE_COMMAND", "")) or None,
+        env=os.environ.copy(),
+        ready_timeout=env_float("NODE_READY_TIMEOUT", 60.0),
+        probe_interval=env_float("NODE_PROBE_INTERVAL", 0.05),
+        backoff_initial=env_float("NODE_RESTART_BACKOFF", 0.5),
+        backoff_max=env_float("NODE_RESTART_BACKOFF_MAX", 30.0),
+        external=external,
+    )
@@ -0,0 +1,152 @@
+"""
+Per-request timing phases, `Server-Timing` headers and request ids.
+
+A `RequestTiming` lives in a context variable for the duration of a request,
+so the upstream client can record connect and time-to-first-byte without the
+handlers passing it around. `ServerTimingMiddleware` reports the phases in a
+`Server-Timing` header and makes sure every request carries an `X-Request-ID`
+that is forwarded to Node and echoed back to the client.
+"""
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from starlette.datastructures import MutableHeaders
+
+REQUEST_ID_HEADER = "x-request-id"
+# Phases known by the time response headers leave, in header order
+SERVER_TIMING_PHASES = ("read", "connect", "ttfb", "upstream")
+
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+_current = ContextVar("gateway_request_timing", default=None)
+
+
+def valid_request_id(value):
+    """The incoming request id if it is safe to log and forward, else None."""
+    if value and _VALID_REQUEST_ID.match(value):
+        return value
+    return None
+
+
+class RequestTiming:
+    __slots__ = ("started", "phases", "request_id", "headers_at")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.request_id = None
+        self.headers_at = None
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        parts = [
+            f"{phase};dur={self.phases[phase] * 1000:.1f}"
+            for phase in SERVER_TIMING_PHASES if phase in self.phases
+        ]
+        parts.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(parts)
+
+
+def current_timing():
+    return _current.get()
+
+
+def begin_timing():
+    """(timing, token) for the current request, creating it if no outer middleware did."""
+    timing = _current.get()
+    if timing is not None:
+        return timing, None
+    timing = RequestTiming()
+    return timing, _current.set(timing)
+
+
+def end_timing(token):
+    if token is not None:
+        _current.reset(token)
+
+
+def record_phase(phase, seconds):
+    timing = _current.get()
+    if timing is not None:
+        timing.add(phase, seconds)
+
+
+@contextmanager
+def timed_phase(phase):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(phase, time.perf_counter() - started)
+
+
+async def timed_stream(stream, phase="read"):
+    """Pass `stream` through, recording the time spent waiting for each chunk."""
+    iterator = stream.__aiter__()
+    while True:
+        started = time.perf_counter()
+        try:
+            chunk = await iterator.__anext__()
+        except StopAsyncIteration:
+            record_phase(phase, time.perf_counter() - started)
+            return
+        record_phase(phase, time.perf_counter() - started)
+        yield chunk
+
+
+class ServerTimingMiddleware:
+    """Adds `Server-Timing` and `X-Request-ID` to responses.
+
+    Streaming the body out happens after the headers are sent, so the `send`
+    phase only appears in the optional per-request log line.
+    """
+
+    def __init__(self, app, log=False):
+        self.app = app
+        self.log = log
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timing, token = begin_timing()
+        request_headers = MutableHeaders(scope=scope)
+        timing.request_id = (
+            valid_request_id(request_headers.get(REQUEST_ID_HEADER)) or str(uuid.uuid4())
+        )
+        # Rewritten in the scope so handlers and the proxy forward it to Node.
+        request_headers[REQUEST_ID_HEADER] = timing.request_id
+        status = [500]
+
+        async def timed_send(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                timing.headers_at = time.perf_counter()
+                headers = MutableHeaders(scope=message)
+                headers["server-timing"] = timing.server_timing()
+                headers[REQUEST_ID_HEADER] = timing.request_id
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                if timing.headers_at is not None:
+                    timing.add("send", time.perf_counter() - timing.headers_at)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            end_timing(token)
+            if self.log:
+                phases = " ".join(
+                    f"{phase}={seconds * 1000:.1f}ms" for phase, seconds in timing.phases.items()
+                )
+                print(
+                    f"[{timing.request_id}] {scope['method']} {scope['path']} {status[0]} "
+                    f"{phases} total={timing.elapsed() * 1000:.1f}ms"
+                )
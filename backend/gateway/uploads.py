@@ -0,0 +1,185 @@
+"""
+Serve `node-app/uploads` straight from the gateway.
+
+Upload names are timestamped and never rewritten, so responses are marked
+immutable with a year-long max-age. Full responses go through Starlette's
+`FileResponse` (which uses the ASGI `pathsend` extension where the server
+offers sendfile); single byte ranges are answered with 206 using the
+`zerocopysend` extension when available and chunked reads otherwise.
+"""
+import mimetypes
+import os
+import stat
+from email.utils import formatdate
+
+import anyio
+from starlette.responses import FileResponse, Response
+
+from gateway.cache import etag_matches
+
+CHUNK_SIZE = 64 * 1024
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single `bytes=` range, None to ignore it, or "unsatisfiable"."""
+    if not header or not header.startswith("bytes="):
+        return None
+    spec = header[len("bytes="):].strip()
+    if "," in spec or "-" not in spec:
+        # Multipart ranges are not worth it for images; serve the whole file.
+        return None
+    first, last = (part.strip() for part in spec.split("-", 1))
+    try:
+        if not first:
+            suffix = int(last)
+            if suffix <= 0:
+                return "unsatisfiable"
+            return max(0, size - suffix), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return "unsatisfiable"
+    return start, min(end, size - 1)
+
+
+class FileRangeResponse(Response):
+    """206 response for one byte range of a file."""
+
+    def __init__(self, path, start, end, headers):
+        self.path = path
+        self.start = start
+        self.count = end - start + 1
+        self.status_code = 206
+        self.background = None
+        self.init_headers(headers)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": 206, "headers": self.raw_headers})
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        extensions = scope.get("extensions") or {}
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            if "http.response.zerocopysend" in extensions:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file.wrapped.fileno(),
+                    "offset": self.start,
+                    "count": self.count,
+                    "more_body": False,
+                })
+                return
+            await file.seek(self.start)
+            remaining = self.count
+            while remaining > 0:
+                chunk = await file.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+class UploadFiles:
+    def __init__(self, directory):
+        self.directory = os.path.realpath(directory)
+        self.served = 0
+        self.partial = 0
+        self.not_modified = 0
+        self.not_found = 0
+
+    def resolve(self, name):
+        """Absolute path for an upload name, or None if it escapes the directory."""
+        if not name or "\x00" in name or "\\" in name:
+            return None
+        path = os.path.realpath(os.path.join(self.directory, name))
+        if os.path.commonpath([self.directory, path]) != self.directory or path == self.directory:
+            return None
+        return path
+
+    @staticmethod
+    def etag_for(stat_result):
+        return f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+    def file_headers(self, path, stat_result):
+        return {
+            "cache-control": IMMUTABLE_CACHE_CONTROL,
+            "etag": self.etag_for(stat_result),
+            "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+            "accept-ranges": "bytes",
+            "content-type": mimetypes.guess_type(path)[0] or "application/octet-stream",
+            # Parity with the helmet defaults Node applied to these files.
+            "x-content-type-options": "nosniff",
+            "cross-origin-resource-policy": "same-origin",
+        }
+
+    async def lookup(self, name):
+        """(path, stat) of an upload, or (None, None) when it is missing or not allowed."""
+        path = self.resolve(name)
+        if path is None:
+            return None, None
+        try:
+            stat_result = await anyio.to_thread.run_sync(os.stat, path)
+        except OSError:
+            return None, None
+        if not stat.S_ISREG(stat_result.st_mode):
+            return None, None
+        return path, stat_result
+
+    def not_found_response(self):
+        self.not_found += 1
+        return Response(
+            content='{"error": "Not found"}', status_code=404, media_type="application/json"
+        )
+
+    async def serve(self, request, name):
+        path, stat_result = await self.lookup(name)
+        if path is None:
+            return self.not_found_response()
+        return self.serve_path(request, path, stat_result)
+
+    def serve_path(self, request, path, stat_result, etag=None):
+        """Conditional / ranged response for a file already known to exist."""
+        headers = self.file_headers(path, stat_result)
+        if etag:
+            headers["etag"] = etag
+        if etag_matches(request.headers.get("if-none-match"), headers["etag"]):
+            self.not_modified += 1
+            return Response(status_code=304, headers={
+                key: headers[key] for key in ("cache-control", "etag", "last-modified")
+            })
+
+        byte_range = None
+        if_range = request.headers.get("if-range")
+        if if_range is None or if_range.strip() == headers["etag"]:
+            byte_range = parse_range(request.headers.get("range"), stat_result.st_size)
+
+        if byte_range == "unsatisfiable":
+            return Response(status_code=416, headers={
+                "content-range": f"bytes */{stat_result.st_size}",
+                "accept-ranges": "bytes",
+            })
+        if byte_range is not None:
+            start, end = byte_range
+            self.partial += 1
+            headers["content-range"] = f"bytes {start}-{end}/{stat_result.st_size}"
+            headers["content-length"] = str(end - start + 1)
+            return FileRangeResponse(path, start, end, headers)
+
+        self.served += 1
+        return FileResponse(
+            path, headers=headers, media_type=headers["content-type"], stat_result=stat_result
+        )
+
+    def stats(self):
+        return {
+            "directory": self.directory,
+            "served": self.served,
+            "partial": self.partial,
+            "not_modified": self.not_modified,
+            "not_found": self.not_found,
+        }
@@ -0,0 +1,505 @@
+"""
+Application-scoped HTTP client used to reach the Node.js API.
+
+One pooled `httpx.AsyncClient` is created when the app starts and closed on
+shutdown, so proxied calls reuse keep-alive connections instead of paying a
+fresh TCP connect to Node on every request.
+
+With several Node workers, `UpstreamPool` spreads requests over one client
+per worker using least-outstanding-requests balancing. Every worker sits
+behind a circuit breaker, and `UpstreamPool.dispatch` retries and hedges
+safe requests (see `gateway.resilience`).
+"""
+import asyncio
+import time
+
+import httpx
+
+from gateway.deadline import DeadlineExceeded, remaining
+from gateway.env import env_float, env_int, env_mapping
+from gateway.metrics import normalize_path
+from gateway.resilience import (
+    FAILURE_STATUSES,
+    SAFE_METHODS,
+    CircuitBreaker,
+    HedgePolicy,
+    RetryPolicy,
+    breaker_from_env,
+)
+from gateway.timing import record_phase
+
+# Failures where the request cannot have been processed, or the connection
+# died under it; timeouts are not retried, the request may still be running.
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError, httpx.ReadError)
+
+# Sent to Node with the seconds (in ms) the gateway will still wait for the answer
+DEADLINE_HEADER = "X-Deadline-Ms"
+
+# Path prefix -> (connect, read, total) seconds; None keeps the default. The
+# total covers the call up to the response headers, or the whole body for
+# buffered responses.
+DEFAULT_ROUTE_TIMEOUTS = {
+    # Settings reads answered from memory or one small query: fail fast.
+    "/api/payments/provider": (1.0, 2.0, 3.0),
+    "/api/payments/hourly-pricing": (1.0, 3.0, 5.0),
+    "/api/slots/available": (1.0, 5.0, 8.0),
+    "/api/bot": (1.0, 5.0, 5.0),
+    # Gemini / Vertex image generation.
+    "/api/themes/ai-generate": (None, 60.0, 90.0),
+}
+
+
+def parse_route_timeout(value):
+    """(connect, read, total) from a tuple, `seconds` (read and total) or `connect/read/total`."""
+    if isinstance(value, tuple):
+        return value
+    parts = [part.strip() for part in str(value).split("/")]
+    if len(parts) == 1:
+        seconds = float(parts[0])
+        return (None, seconds, seconds)
+    if len(parts) != 3:
+        raise ValueError(value)
+    return tuple(float(part) if part else None for part in parts)
+
+
+def load_route_timeouts():
+    mapping = env_mapping("GATEWAY_ROUTE_TIMEOUTS", DEFAULT_ROUTE_TIMEOUTS)
+    timeouts = {}
+    for prefix, value in mapping.items():
+        try:
+            timeouts[prefix] = parse_route_timeout(value)
+        except ValueError:
+            print(f"Invalid timeout for {prefix}: {value}")
+    return timeouts
+
+
+class UpstreamClient:
+    """Pooled client for a single Node.js upstream, with utilization counters."""
+
+    def __init__(self, base_url, max_connections=100, max_keepalive_connections=20,
+                 keepalive_expiry=30.0, connect_timeout=5.0, default_timeout=30.0,
+                 total_timeout=None, route_timeouts=None, uds=None, name="node", readiness=None, breaker=None):
+        self.name = name
+        # Optional callable reporting whether the worker process is up at all.
+        self.readiness = readiness
+        self.base_url = base_url
+        self.uds = uds or None
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.connect_timeout = connect_timeout
+        self.default_timeout = default_timeout
+        self.total_timeout = total_timeout or default_timeout
+        # Longest prefix first so the most specific route wins.
+        self.route_timeouts = sorted(
+            (route_timeouts or {}).items(), key=lambda item: len(item[0]), reverse=True
+        )
+        self.client = None
+        self.breaker = breaker or CircuitBreaker(name, enabled=False)
+
+        self.requests_total = 0
+        self.errors_total = 0
+        self.timeouts_total = 0
+        self.connections_opened = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+        self.healthy = True
+        self.unhealthy_until = 0.0
+        self.last_health_check = None
+
+    @classmethod
+    def from_env(cls, base_url, uds=None, name="node", readiness=None):
+        return cls(
+            base_url,
+            uds=uds,
+            name=name,
+            readiness=readiness,
+            max_connections=env_int("GATEWAY_MAX_CONNECTIONS", 100),
+            max_keepalive_connections=env_int("GATEWAY_MAX_KEEPALIVE", 20),
+            keepalive_expiry=env_float("GATEWAY_KEEPALIVE_EXPIRY", 30.0),
+            connect_timeout=env_float("GATEWAY_CONNECT_TIMEOUT", 5.0),
+            default_timeout=env_float("GATEWAY_UPSTREAM_TIMEOUT", 30.0),
+            total_timeout=env_float("GATEWAY_UPSTREAM_TOTAL_TIMEOUT", 30.0),
+            route_timeouts=load_route_timeouts(),
+            breaker=breaker_from_env(name),
+        )
+
+    def create_transport(self):
+        return httpx.AsyncHTTPTransport(limits=self.limits, uds=self.uds)
+
+    async def start(self):
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                base_url=self.base_url,
+                transport=self.create_transport(),
+                timeout=httpx.Timeout(self.default_timeout, connect=self.connect_timeout),
+                trust_env=False,
+            )
+
+    async def aclose(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def route_timeout(self, path):
+        """(connect, read, total) seconds for `path`, with the defaults filled in."""
+        connect = read = total = None
+        for prefix, value in self.route_timeouts:
+            if path.startswith(prefix):
+                connect, read, total = value
+                break
+        if total is None:
+            total = read if read is not None else self.total_timeout
+        if read is None:
+            read = self.default_timeout
+        if connect is None:
+            connect = self.connect_timeout
+        return min(connect, total), min(read, total), total
+
+    def timeout_for(self, path):
+        connect, read, _ = self.route_timeout(path)
+        return httpx.Timeout(read, connect=connect)
+
+    def is_slow(self, path, seconds):
+        """Slow enough to count against the breaker; routes allowed a longer timeout never are."""
+        return (seconds > self.breaker.slow_call_seconds
+                and self.route_timeout(path)[2] <= self.total_timeout)
+
+    def _tracer(self):
+        """httpcore trace hook for one request: counts new connections and
+        records connect and time-to-first-byte phases."""
+        marks = {}
+
+        async def trace(event_name, info):
+            now = time.perf_counter()
+            if event_name in ("connection.connect_tcp.started",
+                              "connection.connect_unix_socket.started"):
+                marks["connect"] = now
+            elif event_name in ("connection.connect_tcp.complete",
+                                "connection.connect_unix_socket.complete"):
+                self.connections_opened += 1
+                record_phase("connect", now - marks.pop("connect", now))
+            elif event_name == "http11.send_request_headers.started":
+                marks["ttfb"] = now
+            elif event_name == "http11.receive_response_headers.complete":
+                record_phase("ttfb", now - marks.pop("ttfb", now))
+
+        return trace
+
+    def build_request(self, method, url, **kwargs):
+        path = url.split("?", 1)[0]
+        kwargs.setdefault("timeout", self.timeout_for(path))
+        extensions = kwargs.pop("extensions", None) or {}
+        extensions.setdefault("trace", self._tracer())
+        return self.client.build_request(method, url, extensions=extensions, **kwargs)
+
+    async def send(self, request, stream=False):
+        """Send a request; streamed responses must be passed to `release` when done.
+
+        The call gets the route's total timeout, cut to the client's remaining
+        deadline, and raises `DeadlineExceeded` when that runs out. Raises
+        `CircuitOpen` without contacting Node while the breaker is open.
+        """
+        total = self.route_timeout(request.url.path)[2]
+        left = remaining()
+        client_bound = left is not None and left < total
+        budget = left if client_bound else total
+        if budget <= 0:
+            raise DeadlineExceeded()
+        request.headers[DEADLINE_HEADER] = str(max(1, int(budget * 1000)))
+
+        probe = self.breaker.allow()
+        self.requests_total += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        started = time.perf_counter()
+        try:
+            async with asyncio.timeout(budget):
+                response = await self.client.send(request, stream=stream)
+        except asyncio.CancelledError:
+            self.in_flight -= 1
+            self.breaker.cancelled(probe)
+            raise
+        except TimeoutError:
+            self.errors_total += 1
+            self.timeouts_total += 1
+            self.in_flight -= 1
+            if client_bound:
+                # The client's budget, not Node, ran out.
+                self.breaker.cancelled(probe)
+            else:
+                self.breaker.record(probe, failed=True)
+            raise DeadlineExceeded() from None
+        except Exception as exc:
+            self.errors_total += 1
+            self.in_flight -= 1
+            self.breaker.record(probe, failed=True)
+            if isinstance(exc, (httpx.ConnectError, httpx.ConnectTimeout)):
+                self.mark_unhealthy()
+            raise
+        finally:
+            record_phase("upstream", time.perf_counter() - started)
+        self.breaker.record(
+            probe, failed=False, slow=self.is_slow(request.url.path, time.perf_counter() - started)
+        )
+        if not stream:
+            self.in_flight -= 1
+        return response
+
+    async def release(self, response):
+        try:
+            await response.aclose()
+        finally:
+            self.in_flight -= 1
+
+    async def request(self, method, url, **kwargs):
+        return await self.send(self.build_request(method, url, **kwargs))
+
+    def mark_unhealthy(self, cooldown=2.0):
+        """Take the worker out of rotation until the cooldown passes or a probe succeeds."""
+        self.healthy = False
+        self.unhealthy_until = time.monotonic() + cooldown
+
+    def is_healthy(self):
+        if self.readiness is not None and not self.readiness():
+            return False
+        if not self.breaker.available():
+            return False
+        return self.healthy or time.monotonic() >= self.unhealthy_until
+
+    async def check_health(self, timeout=2.0):
+        self.last_health_check = time.time()
+        try:
+            response = await self.client.get("/healthz", timeout=timeout)
+            ok = response.status_code == 200
+        except httpx.HTTPError:
+            ok = False
+        if ok:
+            self.healthy = True
+        else:
+            self.mark_unhealthy()
+        return ok
+
+    async def warm(self, connections, timeout=2.0):
+        """Open up to `connections` keep-alive connections ahead of real traffic."""
+        results = await asyncio.gather(
+            *(self.client.get("/healthz", timeout=timeout) for _ in range(connections)),
+            return_exceptions=True,
+        )
+        return sum(1 for result in results if isinstance(result, httpx.Response))
+
+    def pool_stats(self):
+        pool = getattr(getattr(self.client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+        idle = sum(1 for conn in connections if conn.is_idle())
+        queued = [req for req in getattr(pool, "_requests", []) or [] if req.is_queued()]
+        return {
+            "connections": len(connections),
+            "idle": idle,
+            "active": len(connections) - idle,
+            "queued_requests": len(queued),
+        }
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "base_url": self.base_url,
+            "uds": self.uds,
+            "healthy": self.is_healthy(),
+            "last_health_check": self.last_health_check,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "keepalive_expiry": self.limits.keepalive_expiry,
+            "requests_total": self.requests_total,
+            "errors_total": self.errors_total,
+            "timeouts_total": self.timeouts_total,
+            "connections_opened": self.connections_opened,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "pool": self.pool_stats() if self.client is not None else None,
+            "breaker": self.breaker.stats(),
+            "collected_at": time.time(),
+        }
+
+
+class UpstreamPool:
+    """Several Node workers behind least-outstanding-requests balancing."""
+
+    def __init__(self, workers, health_interval=5.0, retry=None, hedge=None):
+        self.workers = list(workers)
+        self.health_interval = health_interval
+        self.retry = retry or RetryPolicy(max_retries=0)
+        self.hedge = hedge or HedgePolicy(enabled=False)
+        self._cursor = 0
+        self._health_task = None
+
+    async def start(self):
+        for worker in self.workers:
+            await worker.start()
+        if self.health_interval > 0:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def warm(self, connections):
+        """Pre-open connections to every ready worker; returns how many answered."""
+        counts = await asyncio.gather(*(
+            worker.warm(connections) for worker in self.workers
+            if worker.readiness is None or worker.readiness()
+        ))
+        return sum(counts)
+
+    async def aclose(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        for worker in self.workers:
+            await worker.aclose()
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            await asyncio.gather(
+                *(worker.check_health() for worker in self.workers), return_exceptions=True
+            )
+
+    def pick(self, exclude=None):
+        """Healthy worker with the fewest in-flight requests; ties rotate.
+
+        `exclude` is avoided when any other healthy worker is available.
+        """
+        healthy = [worker for worker in self.workers if worker.is_healthy()]
+        candidates = [worker for worker in healthy if worker is not exclude] or healthy or self.workers
+        self._cursor = (self._cursor + 1) % len(candidates)
+        rotated = candidates[self._cursor:] + candidates[:self._cursor]
+        return min(rotated, key=lambda worker: worker.in_flight)
+
+    async def request(self, method, url, **kwargs):
+        _, response = await self.dispatch(method, url, **kwargs)
+        return response
+
+    async def dispatch(self, method, url, stream=False, **kwargs):
+        """Send a request and return `(worker, response)`.
+
+        Streamed responses must be passed to `worker.release` when done. Safe
+        requests without a body are retried on connection errors and
+        502/503/504, and hedged when hedging is on; anything else is sent
+        exactly once.
+        """
+        if method not in SAFE_METHODS or has_body(kwargs):
+            worker = self.pick()
+            return worker, await worker.send(worker.build_request(method, url, **kwargs), stream=stream)
+
+        self.retry.budget.deposit()
+        self.hedge.budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                worker, response = await self._attempt(method, url, stream, kwargs)
+            except RETRYABLE_ERRORS:
+                attempt += 1
+                delay = self._retry_delay(attempt)
+                if delay is None:
+                    raise
+            else:
+                if response.status_code not in FAILURE_STATUSES:
+                    return worker, response
+                attempt += 1
+                delay = self._retry_delay(attempt)
+                if delay is None:
+                    return worker, response
+                if stream:
+                    await worker.release(response)
+            await asyncio.sleep(delay)
+
+    def _retry_delay(self, attempt):
+        """Backoff before retry number `attempt`, or None when it should not be sent."""
+        delay = self.retry.backoff(attempt)
+        left = remaining()
+        if left is not None and left <= delay:
+            return None
+        if not self.retry.should_retry(attempt):
+            return None
+        return delay
+
+    async def _attempt(self, method, url, stream, kwargs):
+        """One attempt, hedged on a second worker if the first is slower than the route's p95."""
+        route = normalize_path(url.split("?", 1)[0])
+
+        async def send(worker):
+            response = await worker.send(worker.build_request(method, url, **kwargs), stream=stream)
+            return worker, response
+
+        started = time.perf_counter()
+        delay = self.hedge.delay_for(route)
+        if delay is None:
+            result = await send(self.pick())
+        else:
+            primary = self.pick()
+            tasks = [asyncio.ensure_future(send(primary))]
+            winner = None
+            try:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done and self.hedge.budget.withdraw():
+                    self.hedge.hedged += 1
+                    tasks.append(asyncio.ensure_future(send(self.pick(exclude=primary))))
+                winner = await first_usable(tasks)
+            finally:
+                await abandon([task for task in tasks if task is not winner], stream)
+            if winner is not tasks[0]:
+                self.hedge.hedge_wins += 1
+            result = winner.result()
+        if self.hedge.enabled:
+            self.hedge.record(route, time.perf_counter() - started)
+        return result
+
+    def stats(self):
+        workers = [worker.stats() for worker in self.workers]
+        return {
+            "workers_total": len(workers),
+            "workers_healthy": sum(1 for worker in workers if worker["healthy"]),
+            "in_flight": sum(worker["in_flight"] for worker in workers),
+            "requests_total": sum(worker["requests_total"] for worker in workers),
+            "retry": self.retry.stats(),
+            "hedge": self.hedge.stats(),
+            "workers": workers,
+        }
+
+
+def has_body(kwargs):
+    content = kwargs.get("content")
+    if content is not None and content != b"":
+        return True
+    return any(kwargs.get(key) is not None for key in ("data", "files", "json"))
+
+
+def _usable(task):
+    return task.exception() is None and task.result()[1].status_code not in FAILURE_STATUSES
+
+
+async def first_usable(tasks):
+    """The first task to finish with a usable response; the first attempt if none is usable."""
+    pending = set(tasks)
+    while True:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        usable = [task for task in tasks if task in done and _usable(task)]
+        if usable:
+            return usable[0]
+        if not pending:
+            return next(task for task in tasks if task in done)
+
+
+async def abandon(tasks, stream):
+    """Cancel losing attempts and release any streamed response they already got."""
+    for task in tasks:
+        task.cancel()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    for result in results:
+        if stream and isinstance(result, tuple):
+            worker, response = result
+            await worker.release(response)
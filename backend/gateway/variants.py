@@ -0,0 +1,225 @@
+"""
+Responsive variants of uploaded images (`/api/uploads/<name>?w=480&q=70`).
+
+Widths snap to a fixed ladder and quality to steps of 5 so the number of
+variants per image stays small. Variants are rendered once in a process
+pool, written to a disk cache bounded by total bytes (least recently used
+files are evicted first) and then served like any other upload.
+"""
+import asyncio
+import hashlib
+import importlib.util
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import anyio
+
+from gateway.coalesce import SingleFlight
+
+VARIANT_WIDTHS = (160, 320, 480, 640, 960, 1280, 1920)
+DEFAULT_QUALITY = 75
+MIN_QUALITY = 30
+MAX_QUALITY = 90
+IMAGE_FORMATS = {".webp": "WEBP", ".jpg": "JPEG", ".jpeg": "JPEG", ".png": "PNG"}
+
+
+def snap_width(width):
+    for candidate in VARIANT_WIDTHS:
+        if width <= candidate:
+            return candidate
+    return VARIANT_WIDTHS[-1]
+
+
+def snap_quality(quality):
+    quality = max(MIN_QUALITY, min(MAX_QUALITY, quality))
+    return int(round(quality / 5.0) * 5)
+
+
+def render_variant(source, destination, width, quality):
+    """Resize `source` to at most `width` pixels wide and write it to `destination`.
+
+    Runs in a worker process. When the re-encoded image would not be smaller
+    than the original, the original bytes are copied instead.
+    """
+    from PIL import Image
+
+    image_format = IMAGE_FORMATS[os.path.splitext(source)[1].lower()]
+    temporary = f"{destination}.{os.getpid()}.tmp"
+    with Image.open(source) as image:
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.LANCZOS)
+        options = {"quality": quality} if image_format in ("WEBP", "JPEG") else {"optimize": True}
+        if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.save(temporary, format=image_format, **options)
+
+    if os.path.getsize(temporary) >= os.path.getsize(source):
+        shutil.copyfile(source, temporary)
+    os.replace(temporary, destination)
+    return os.path.getsize(destination)
+
+
+class ImageVariants:
+    def __init__(self, uploads, cache_dir, max_bytes=512 * 1024 * 1024, workers=2,
+                 max_pending=8):
+        self.uploads = uploads
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self.max_pending = max_pending
+        self.enabled = importlib.util.find_spec("PIL") is not None
+        self.single_flight = SingleFlight()
+        self._executor = None
+        self._index = None  # variant path -> [size, last access]
+        self._bytes = 0
+        self._pending = 0
+
+        self.hits = 0
+        self.renders = 0
+        self.render_seconds = 0.0
+        self.render_errors = 0
+        self.overloaded = 0
+        self.evictions = 0
+
+        if not self.enabled:
+            print("Pillow is not installed; image variants are disabled")
+
+    @staticmethod
+    def wants_variant(request):
+        return "w" in request.query_params or "q" in request.query_params
+
+    @staticmethod
+    def parse(request):
+        """(width, quality) from the query string, or None if it is not usable."""
+        try:
+            width = int(request.query_params.get("w", VARIANT_WIDTHS[-1]))
+            quality = int(request.query_params.get("q", DEFAULT_QUALITY))
+        except ValueError:
+            return None
+        if width <= 0:
+            return None
+        return snap_width(width), snap_quality(quality)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _load_index(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._index = {}
+        self._bytes = 0
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat_result = entry.stat()
+                self._index[entry.path] = [stat_result.st_size, stat_result.st_atime]
+                self._bytes += stat_result.st_size
+
+    def _touch(self, path, size):
+        if path not in self._index:
+            self._bytes += size
+        self._index[path] = [size, time.time()]
+
+    def _evict(self, keep):
+        victims = sorted(
+            (item for item in self._index.items() if item[0] != keep),
+            key=lambda item: item[1][1],
+        )
+        for path, (size, _) in victims:
+            if self._bytes <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            del self._index[path]
+            self._bytes -= size
+            self.evictions += 1
+
+    def variant_path(self, source, stat_result, width, quality):
+        digest = hashlib.sha1(source.encode("utf-8")).hexdigest()[:16]
+        extension = os.path.splitext(source)[1].lower()
+        name = f"{digest}-{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}-w{width}-q{quality}{extension}"
+        return os.path.join(self.cache_dir, name)
+
+    async def _render(self, source, destination, width, quality):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        started = time.perf_counter()
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            size = await loop.run_in_executor(
+                self._executor, render_variant, source, destination, width, quality
+            )
+        finally:
+            self._pending -= 1
+        self.renders += 1
+        self.render_seconds += time.perf_counter() - started
+        self._touch(destination, size)
+        self._evict(keep=destination)
+
+    async def serve(self, request, name):
+        source, stat_result = await self.uploads.lookup(name)
+        if source is None:
+            return self.uploads.not_found_response()
+        params = self.parse(request)
+        extension = os.path.splitext(source)[1].lower()
+        if not self.enabled or params is None or extension not in IMAGE_FORMATS:
+            return self.uploads.serve_path(request, source, stat_result)
+
+        width, quality = params
+        if self._index is None:
+            await anyio.to_thread.run_sync(self._load_index)
+        destination = self.variant_path(source, stat_result, width, quality)
+
+        if destination in self._index:
+            self.hits += 1
+        elif self._pending >= self.max_pending and destination not in self.single_flight.calls:
+            # Render queue is full: the original is always a correct answer.
+            self.overloaded += 1
+            return self.uploads.serve_path(request, source, stat_result)
+        else:
+            try:
+                await self.single_flight.do(
+                    destination, lambda: self._render(source, destination, width, quality)
+                )
+            except Exception as e:
+                print(f"Image variant error for {name}: {e}")
+                self.render_errors += 1
+                return self.uploads.serve_path(request, source, stat_result)
+
+        try:
+            variant_stat = await anyio.to_thread.run_sync(os.stat, destination)
+        except FileNotFoundError:
+            # Evicted by another gateway process sharing the cache directory.
+            entry = self._index.pop(destination, None)
+            if entry is not None:
+                self._bytes -= entry[0]
+            return self.uploads.serve_path(request, source, stat_result)
+        entry = self._index.get(destination)
+        if entry is None:
+            # Evicted by a render in this process while the stat was pending.
+            return self.uploads.serve_path(request, source, stat_result)
+        entry[1] = time.time()
+        etag = f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}-w{width}-q{quality}"'
+        return self.uploads.serve_path(request, destination, variant_stat, etag=etag)
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "cache_dir": self.cache_dir,
+            "cached_variants": len(self._index or {}),
+            "cached_bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "renders": self.renders,
+            "render_seconds_total": self.render_seconds,
+            "render_errors": self.render_errors,
+            "pending_renders": self._pending,
+            "overloaded": self.overloaded,
+            "evictions": self.evictions,
+        }
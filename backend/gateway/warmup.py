@@ -0,0 +1,75 @@
+"""
+Start-up bookkeeping and cache/connection pre-warming.
+
+The first requests after a (re)deploy used to pay for everything at once:
+Node still booting, no keep-alive connections to it and an empty response
+cache. Once Node answers `/healthz`, a background task opens a few upstream
+connections and fills the cache for the public read routes, so the first
+visitors hit warm paths. `/readyz` only waits for Node, not for this.
+"""
+import asyncio
+import time
+
+from gateway.env import env_str
+
+
+def load_prewarm_routes(default):
+    """`GATEWAY_PREWARM_ROUTES` (comma-separated paths), else `default`."""
+    raw = env_str("GATEWAY_PREWARM_ROUTES", "")
+    if not raw:
+        return list(default)
+    return [route.strip() for route in raw.split(",") if route.strip()]
+
+
+class WarmUp:
+    def __init__(self, imported_at, routes, connections=4, enabled=True, ready_timeout=60.0):
+        self.imported_at = imported_at
+        self.routes = list(routes)
+        self.connections = connections
+        self.enabled = enabled
+        self.ready_timeout = ready_timeout
+        self.ready_seconds = None
+        self.warm_seconds = None
+        self.connections_opened = 0
+        self.routes_filled = 0
+        self.routes_failed = 0
+
+    def mark_ready(self):
+        if self.ready_seconds is None:
+            self.ready_seconds = time.monotonic() - self.imported_at
+
+    async def run(self, wait_ready, open_connections, fill_route):
+        """Wait for Node, then warm connections and cached routes; never raises."""
+        if not await wait_ready(self.ready_timeout):
+            print("Node.js server not ready; skipping gateway pre-warm")
+            return
+        self.mark_ready()
+        if not self.enabled:
+            return
+        started = time.monotonic()
+        try:
+            self.connections_opened = await open_connections(self.connections)
+        except Exception as exc:
+            print(f"Connection pre-warm failed: {exc}")
+        for filled in await asyncio.gather(
+            *(fill_route(route) for route in self.routes), return_exceptions=True
+        ):
+            if filled is True:
+                self.routes_filled += 1
+            else:
+                self.routes_failed += 1
+        self.warm_seconds = time.monotonic() - started
+        print(f"Gateway pre-warm: {self.connections_opened} connections, "
+              f"{self.routes_filled}/{len(self.routes)} routes cached in {self.warm_seconds:.2f}s")
+
+    def stats(self):
+        return {
+            "prewarm": self.enabled,
+            "uptime_seconds": time.monotonic() - self.imported_at,
+            "node_ready_seconds": self.ready_seconds,
+            "warm_seconds": self.warm_seconds,
+            "connections_opened": self.connections_opened,
+            "routes": len(self.routes),
+            "routes_filled": self.routes_filled,
+            "routes_failed": self.routes_failed,
+        }
@@ -50,10 +50,15 @@ app.get('/favicon.ico', (req, res) => res.status(204).end());
 app.use('/.git', (req, res) => res.status(404).end());
 
 // ==================== REQUEST ID MIDDLEWARE ====================
+// Reuse the id the Python gateway assigned so both logs can be joined
+const VALID_REQUEST_ID = /^[A-Za-z0-9._:-]{1,128}$/;
 app.use((req, res, next) => {
-  const id = (crypto.randomUUID && typeof crypto.randomUUID === 'function')
-    ? crypto.randomUUID()
-    : crypto.randomBytes(16).toString('hex');
+  const incoming = req.get('X-Request-Id');
+  const id = (incoming && VALID_REQUEST_ID.test(incoming))
+    ? incoming
+    : (crypto.randomUUID && typeof crypto.randomUUID === 'function')
+      ? crypto.randomUUID()
+      : crypto.randomBytes(16).toString('hex');
   req.req_id = id;
   res.setHeader('X-Request-Id', id);
   return next();
@@ -119,6 +124,13 @@ app.use((req, res, next) => {
   return next();
 });
 
+// ==================== DEADLINE PROPAGATION ====================
+// Registered after body parsing so the request context survives into handlers,
+// and before the routes (and their models) are loaded so the plugin applies.
+const { deadlineMiddleware, deadlinePlugin } = require('./middleware/deadline');
+mongoose.plugin(deadlinePlugin);
+app.use(deadlineMiddleware);
+
 // ==================== HEALTH CHECK (before rate limiting) ====================
 app.get('/healthz', (req, res) => res.status(200).send('ok'));
 
@@ -316,6 +328,20 @@ if (!mongoUrl) {
 
 // ==================== START SERVER ====================
 const PORT = process.env.PORT || 8080;
-app.listen(PORT, '0.0.0.0', () => {
-  console.log('LISTENING', PORT);
-});
+const SOCKET_PATH = process.env.SOCKET_PATH;
+
+if (SOCKET_PATH) {
+  // Unix domain socket used by the Python gateway (backend/server.py)
+  try {
+    fs.unlinkSync(SOCKET_PATH);
+  } catch (err) {
+    if (err.code !== 'ENOENT') throw err;
+  }
+  app.listen(SOCKET_PATH, () => {
+    console.log('LISTENING', SOCKET_PATH);
+  });
+} else {
+  app.listen(PORT, '0.0.0.0', () => {
+    console.log('LISTENING', PORT);
+  });
+}
@@ -0,0 +1,101 @@
+const { AsyncLocalStorage } = require('async_hooks');
+
+// The Python gateway sends the time it is still willing to wait for this
+// request as X-Deadline-Ms. `req.signal` aborts when that budget runs out or
+// the gateway drops the connection, and Mongo queries started while handling
+// the request get the remaining budget as maxTimeMS, so abandoned requests
+// stop using Node and Mongo capacity.
+//
+// The header is only honored from the gateway (a loopback or Unix socket
+// peer), never on the Capital Bank callbacks, and only bounds reads: a write
+// cut short by maxTimeMS can leave a multi-step update (a paid transaction
+// and its booking) half applied.
+const deadlineContext = new AsyncLocalStorage();
+
+const READ_OPERATIONS = [
+  'find',
+  'findOne',
+  'countDocuments',
+  'estimatedDocumentCount',
+  'distinct'
+];
+
+const LOOPBACK_ADDRESSES = new Set(['127.0.0.1', '::1', '::ffff:127.0.0.1']);
+
+// Bank server-to-server callbacks must run to completion once started
+const UNBOUNDED_PATHS = ['/api/payments/capital-bank/'];
+
+const fromGateway = (req) => {
+  // Unix domain socket peers have no remote address.
+  const address = req.socket?.remoteAddress;
+  return address === undefined || LOOPBACK_ADDRESSES.has(address);
+};
+
+const deadlineExceeded = () => {
+  const error = new Error('Deadline exceeded');
+  error.code = 'DEADLINE_EXCEEDED';
+  return error;
+};
+
+const parseBudget = (value) => {
+  const budget = Number.parseInt(value, 10);
+  return Number.isFinite(budget) && budget > 0 ? budget : null;
+};
+
+const deadlineMiddleware = (req, res, next) => {
+  const controller = new AbortController();
+  const honored = fromGateway(req)
+    && !UNBOUNDED_PATHS.some((prefix) => req.originalUrl.startsWith(prefix));
+  const budget = honored ? parseBudget(req.get('X-Deadline-Ms')) : null;
+  let timer = null;
+
+  req.deadlineAt = budget ? Date.now() + budget : null;
+  req.signal = controller.signal;
+
+  if (budget) {
+    timer = setTimeout(() => controller.abort(deadlineExceeded()), budget);
+    timer.unref();
+  }
+
+  res.on('close', () => {
+    clearTimeout(timer);
+    if (!res.writableFinished) {
+      controller.abort(new Error('Client disconnected'));
+    }
+  });
+
+  return deadlineContext.run({ deadlineAt: req.deadlineAt }, next);
+};
+
+// Milliseconds left for the request being handled (0 once spent), or null without a deadline
+const remainingMs = () => {
+  const deadlineAt = deadlineContext.getStore()?.deadlineAt;
+  return deadlineAt ? Math.max(0, deadlineAt - Date.now()) : null;
+};
+
+// Global mongoose plugin for reads; must be registered before the models are compiled.
+// A read started after the budget is spent fails instead of running.
+const deadlinePlugin = (schema) => {
+  schema.pre(READ_OPERATIONS, async function applyDeadline() {
+    const ms = remainingMs();
+    if (ms === null || this.getOptions().maxTimeMS !== undefined) {
+      return;
+    }
+    if (ms <= 0) {
+      throw deadlineExceeded();
+    }
+    this.maxTimeMS(ms);
+  });
+  schema.pre('aggregate', async function applyDeadline() {
+    const ms = remainingMs();
+    if (ms === null || this.options.maxTimeMS !== undefined) {
+      return;
+    }
+    if (ms <= 0) {
+      throw deadlineExceeded();
+    }
+    this.option({ maxTimeMS: ms });
+  });
+};
+
+module.exports = { deadlineMiddleware, deadlinePlugin, remainingMs };
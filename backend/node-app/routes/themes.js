@@ -53,7 +53,7 @@ router.post('/ai-generate', aiGenerateLimiter, async (req, res) => {
       status: 'pending'
     });
 
-    const { imageBuffer, mimeType } = await generateThemeImage({ prompt, aspectRatio });
+    const { imageBuffer, mimeType } = await generateThemeImage({ prompt, aspectRatio, signal: req.signal });
 
     const extension = mimeType && mimeType.includes('jpeg') ? 'jpg' : 'png';
     const relativePath = `ai-themes/${aiTheme._id}.${extension}`;
@@ -42,7 +42,7 @@ const getAccessTokenFromMetadata = async () => {
   return token;
 };
 
-const generateThemeImage = async ({ prompt, aspectRatio }) => {
+const generateThemeImage = async ({ prompt, aspectRatio, signal }) => {
   const project = process.env.GOOGLE_CLOUD_PROJECT?.trim();
   if (!project) {
     const err = new Error('GOOGLE_CLOUD_PROJECT missing');
@@ -59,6 +59,7 @@ const generateThemeImage = async ({ prompt, aspectRatio }) => {
 
     const response = await fetch(endpoint, {
       method: 'POST',
+      signal,
       headers: {
         'Content-Type': 'application/json',
         Authorization: `Bearer ${accessToken}`
@@ -2,20 +2,298 @@
 Python wrapper that spawns the Node.js/Express API and proxies API traffic to it.
 Business and payment logic run in the Node.js backend.
 """
-import subprocess
 import os
-import sys
-import atexit
-import threading
 import time
+
+IMPORTED_AT = time.monotonic()
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from gateway.env import env_bool, env_float, env_int, env_str
+from gateway.supervisor import node_supervisor_from_env
+
+# Node process management (NODE_PORT / NODE_SOCKET / NODE_WORKERS). With NODE_EXTERNAL,
+# Node is started by something else (benchmarks, cluster.py); only probe it.
+node_supervisor = node_supervisor_from_env(
+    os.path.join(os.path.dirname(__file__), 'node-app'),
+    external=env_bool("NODE_EXTERNAL", False),
+)
+if env_bool("GATEWAY_FAST_START", False):
+    # Cold start: Node boots while FastAPI and the rest of the gateway are imported.
+    node_supervisor.start()
+
+import asyncio
+import atexit
+import hmac
+import json
+import sqlite3
+import tempfile
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Response, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 import httpx
-from dotenv import load_dotenv
 
-load_dotenv()
+from gateway.admission import AdmissionController, Shed, load_class_routes, load_route_classes
+from gateway.auth import TRUSTED_USER_HEADER, AuthRejected, EdgeAuth, load_auth_routes
+from gateway.callbacks import CallbackQueue, DeliveryDeferred
+from gateway.cache import ResponseCache, SharedInvalidations, load_cache_ttls
+from gateway.compression import CompressionMiddleware, CompressionStats
+from gateway.coalesce import SingleFlight, UpstreamResult, load_coalesce_routes
+from gateway.deadline import (
+    ClientDisconnected,
+    DeadlineExceeded,
+    DeadlineMiddleware,
+    cancel_on_disconnect,
+    relay_body,
+)
+from gateway.jobs import JobQueue, QueueFull, load_async_routes, prefers_async
+from gateway.metrics import (
+    MetricsMiddleware,
+    MetricsWriter,
+    RequestMetrics,
+    write_node_metrics,
+    write_stats_metrics,
+    write_upstream_metrics,
+)
+from gateway.payment_status import PaymentStatusPoller, PollerFull
+from gateway.proxy import (
+    buffered_response,
+    downstream_response_headers,
+    has_request_body,
+    relay_buffered,
+    streaming_response,
+    upstream_request_headers,
+)
+from gateway.ratelimit import RateLimiter, RateLimitMiddleware, load_rate_limits, load_rate_routes
+from gateway.resilience import CircuitOpen, HedgePolicy, RetryPolicy
+from gateway.timing import ServerTimingMiddleware, timed_phase, timed_stream
+from gateway.upstream import UpstreamClient, UpstreamPool
+from gateway.uploads import UploadFiles
+from gateway.variants import ImageVariants
+from gateway.warmup import WarmUp, load_prewarm_routes
+
+upstream = UpstreamPool(
+    [
+        UpstreamClient.from_env(
+            f"http://localhost:{process.port}",
+            uds=process.socket_path,
+            name=process.name,
+            readiness=process.ready.is_set,
+        )
+        for process in node_supervisor.workers
+    ],
+    health_interval=env_float("GATEWAY_HEALTH_INTERVAL", 5.0),
+    # Jittered retries and optional hedging, for safe requests without a body only
+    retry=RetryPolicy(
+        max_retries=env_int("GATEWAY_RETRIES", 2),
+        base_delay=env_float("GATEWAY_RETRY_BASE_DELAY", 0.05),
+        max_delay=env_float("GATEWAY_RETRY_MAX_DELAY", 1.0),
+        budget_ratio=env_float("GATEWAY_RETRY_BUDGET", 0.2),
+    ),
+    hedge=HedgePolicy(
+        enabled=env_bool("GATEWAY_HEDGE", False),
+        percentile=env_float("GATEWAY_HEDGE_PERCENTILE", 95.0),
+        min_delay=env_float("GATEWAY_HEDGE_MIN_DELAY", 0.005),
+        budget_ratio=env_float("GATEWAY_HEDGE_BUDGET", 0.05),
+    ),
+)
+
+# How long requests are held while Node is (re)starting before failing fast
+READY_WAIT = env_float("GATEWAY_READY_WAIT", 10.0)
+
+# Pipe request/response bodies through instead of buffering them in memory
+STREAM_PROXY = env_bool("GATEWAY_STREAM_PROXY", True)
+
+# TTL cache for public read endpoints
+response_cache = ResponseCache(
+    load_cache_ttls() if env_bool("GATEWAY_CACHE", True) else {},
+    max_entries=env_int("GATEWAY_CACHE_MAX_ENTRIES", 512),
+    max_bytes=env_int("GATEWAY_CACHE_MAX_BYTES", 32 * 1024 * 1024),
+    # Invalidations reach the caches of the other workers (cluster.py) through this file
+    shared=SharedInvalidations(env_str("GATEWAY_CACHE_SHARED_PATH", "") or None)
+    if env_bool("GATEWAY_CACHE", True) and env_bool("GATEWAY_CACHE_SHARED", True) else None,
+)
+
+# Serve node-app/uploads from the gateway instead of proxying to express.static
+SERVE_UPLOADS = env_bool("GATEWAY_SERVE_UPLOADS", True)
+upload_files = UploadFiles(os.path.join(os.path.dirname(__file__), 'node-app', 'uploads'))
+
+# Resized variants of uploads (?w=&q=), rendered once and kept in a bounded disk cache
+image_variants = ImageVariants(
+    upload_files,
+    cache_dir=env_str(
+        "GATEWAY_VARIANT_DIR", os.path.join(tempfile.gettempdir(), "peekaboo-image-variants")
+    ),
+    max_bytes=env_int("GATEWAY_VARIANT_MAX_BYTES", 512 * 1024 * 1024),
+    workers=max(1, env_int("GATEWAY_IMAGE_WORKERS", 2)),
+)
+
+# Identical concurrent anonymous GETs share one upstream call
+single_flight = SingleFlight(load_coalesce_routes() if env_bool("GATEWAY_COALESCE", True) else [])
+
+# Per-route-class concurrency limits and bounded queues in front of Node
+admission = AdmissionController(
+    load_route_classes(),
+    load_class_routes(),
+    total_limit=env_int("GATEWAY_MAX_CONCURRENCY", 256),
+    reserved=env_int("GATEWAY_RESERVED_CONCURRENCY", 16),
+    queue_timeout=env_float("GATEWAY_QUEUE_TIMEOUT", 5.0),
+    enabled=env_bool("GATEWAY_ADMISSION", True),
+)
+
+
+async def fetch_checkout_status(session_id: str, authorization: str):
+    path = f"/api/payments/status/{session_id}"
+    async with admission.admit(path):
+        response = await upstream.request("GET", path, headers={"Authorization": authorization})
+    return response.status_code, response.content
+
+
+# One shared upstream poll loop per (session, token) for status subscribers
+payment_status = PaymentStatusPoller(
+    fetch_checkout_status,
+    min_interval=env_float("GATEWAY_STATUS_POLL_MIN", 1.0),
+    max_interval=env_float("GATEWAY_STATUS_POLL_MAX", 10.0),
+    max_watches=env_int("GATEWAY_STATUS_MAX_SESSIONS", 1000),
+)
+STATUS_LONG_POLL_MAX = env_float("GATEWAY_STATUS_LONG_POLL_MAX", 25.0)
+STATUS_STREAM_MAX = env_float("GATEWAY_STATUS_STREAM_MAX", 600.0)
+STATUS_HEARTBEAT = 15.0
+
+
+async def deliver_callback(method: str, url: str, headers, body: bytes):
+    if not node_supervisor.is_ready():
+        raise DeliveryDeferred()
+    try:
+        async with admission.admit(url.split("?", 1)[0]):
+            response = await upstream.request(method, url, headers=headers, content=body)
+    except (httpx.ConnectError, CircuitOpen, Shed) as exc:
+        raise DeliveryDeferred() from exc
+    return response.status_code, response.content
+
+
+# Capital Bank notify callbacks acked once on disk and delivered to Node in the background
+callback_queue = CallbackQueue(
+    env_str(
+        "GATEWAY_CALLBACK_QUEUE_PATH",
+        os.path.join(os.path.dirname(__file__), "data", "callback-queue.sqlite3"),
+    ),
+    deliver_callback,
+    enabled=env_bool("GATEWAY_CALLBACK_QUEUE", False),
+    max_pending=env_int("GATEWAY_CALLBACK_QUEUE_MAX", 10000),
+    max_attempts=max(1, env_int("GATEWAY_CALLBACK_MAX_ATTEMPTS", 10)),
+    max_delay=env_float("GATEWAY_CALLBACK_MAX_DELAY", 300.0),
+    lease_seconds=env_float("GATEWAY_CALLBACK_LEASE", 120.0),
+    # cluster.py turns this off in all workers but one
+    deliver=env_bool("GATEWAY_CALLBACK_DELIVERY", True),
+)
+# Bearer tokens checked at the edge for routers Node mounts entirely behind authMiddleware
+edge_auth = EdgeAuth(
+    env_str("JWT_SECRET", ""),
+    load_auth_routes(),
+    enabled=env_bool("GATEWAY_JWT_VERIFY", False),
+    max_entries=env_int("GATEWAY_JWT_CACHE_SIZE", 10000),
+)
+
+
+async def run_job(method: str, url: str, headers, body: bytes):
+    """Send an offloaded request to Node; failures get the answers the proxy would give."""
+    if not await upstream_ready():
+        answer = upstream_unavailable()
+    else:
+        path = url.split("?", 1)[0]
+        try:
+            async with admission.admit(path):
+                response = await upstream.request(method, url, headers=headers, content=body)
+        except Shed as shed:
+            answer = shed_response(shed)
+        except CircuitOpen as exc:
+            answer = upstream_unavailable(exc.retry_after)
+        except (DeadlineExceeded, httpx.TimeoutException):
+            answer = upstream_timeout()
+        except httpx.ConnectError:
+            answer = upstream_unavailable()
+        else:
+            response_cache.invalidate_for_mutation(method, path, response.status_code)
+            return (
+                response.status_code,
+                downstream_response_headers(response, buffered=True),
+                response.content,
+            )
+    return answer.status_code, answer.raw_headers, answer.body
+
+
+# Slow AI requests answered 202 with a job id and sent to Node from a bounded queue
+job_queue = JobQueue(
+    run_job,
+    load_async_routes(),
+    path=env_str("GATEWAY_JOB_STORE_PATH", "") or None,
+    enabled=env_bool("GATEWAY_ASYNC_JOBS", True),
+    concurrency=max(1, env_int("GATEWAY_JOB_CONCURRENCY", 2)),
+    max_queued=env_int("GATEWAY_JOB_QUEUE_MAX", 16),
+    result_ttl=env_float("GATEWAY_JOB_RESULT_TTL", 600.0),
+    job_timeout=env_float("GATEWAY_JOB_TIMEOUT", 180.0),
+)
+JOB_LONG_POLL_MAX = env_float("GATEWAY_JOB_LONG_POLL_MAX", 25.0)
+
+# Guards the /api/gateway/* stats and dead-letter endpoints; unset disables them
+GATEWAY_ADMIN_TOKEN = env_str("GATEWAY_ADMIN_TOKEN", "")
+
+# Once Node is up: open upstream connections and fill the cache for public read routes
+warm_up = WarmUp(
+    IMPORTED_AT,
+    load_prewarm_routes(prefix for prefix, _ in response_cache.route_ttls),
+    connections=env_int("GATEWAY_PREWARM_CONNECTIONS", 4),
+    enabled=env_bool("GATEWAY_PREWARM", True),
+)
+
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    node_supervisor.start()
+    await upstream.start()
+    await callback_queue.start()
+    warm_up_task = asyncio.create_task(
+        warm_up.run(node_supervisor.wait_ready, upstream.warm, prewarm_route)
+    )
+    shared_task = None
+    if response_cache.shared is not None:
+        shared_task = asyncio.create_task(
+            response_cache.shared.run(response_cache.invalidate_prefix)
+        )
+    try:
+        yield
+    finally:
+        warm_up_task.cancel()
+        if shared_task is not None:
+            shared_task.cancel()
+            await asyncio.gather(shared_task, return_exceptions=True)
+        await job_queue.aclose()
+        await callback_queue.aclose()
+        await payment_status.aclose()
+        await upstream.aclose()
+        image_variants.close()
+        rate_limiter.close()
+        if response_cache.shared is not None:
+            response_cache.shared.close()
+        node_supervisor.stop()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Per-client token buckets shared by all gateway workers; inside CORS so 429s stay readable
+rate_limiter = RateLimiter(
+    load_rate_limits(),
+    load_rate_routes(),
+    path=env_str("GATEWAY_RATE_LIMIT_PATH", "") or None,
+    enabled=env_bool("GATEWAY_RATE_LIMIT", False),
+    trusted_hops=env_int("GATEWAY_TRUSTED_PROXIES", 1),
+)
+app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
 
 # CORS
 app.add_middleware(
@@ -24,42 +302,77 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Request-ID"],
+)
+
+# gzip / brotli negotiated from Accept-Encoding, applied chunk by chunk
+compression_stats = CompressionStats()
+if env_bool("GATEWAY_COMPRESSION", True):
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=env_int("GATEWAY_COMPRESSION_MIN_SIZE", 1024),
+        gzip_level=env_int("GATEWAY_GZIP_LEVEL", 6),
+        brotli_quality=env_int("GATEWAY_BROTLI_QUALITY", 4),
+        stats=compression_stats,
+    )
+
+# Server-Timing breakdown and X-Request-ID on every response (forwarded to Node)
+app.add_middleware(ServerTimingMiddleware, log=env_bool("GATEWAY_TIMING_LOG", False))
+
+# Client X-Deadline-Ms budgets, clipped into upstream timeouts and forwarded to Node
+app.add_middleware(DeadlineMiddleware)
+
+# Per-route request counters and latency histograms; added last so it is the
+# outermost middleware and counts every response, deadline 504s included
+request_metrics = RequestMetrics(max_routes=env_int("GATEWAY_METRICS_MAX_ROUTES", 256))
+app.add_middleware(
+    MetricsMiddleware, metrics=request_metrics, expand_routes=("/api/{path:path}",)
 )
 
-# Node process management
-node_process = None
-NODE_PORT = 8002  # Internal Node port
+
+def stop_node_server():
+    node_supervisor.stop()
 
 
-def start_node_server():
-    global node_process
-    node_app_path = os.path.join(os.path.dirname(__file__), 'node-app')
+atexit.register(stop_node_server)
 
-    env = os.environ.copy()
-    env['PORT'] = str(NODE_PORT)
 
-    node_process = subprocess.Popen(
-        ['node', 'index.js'],
-        cwd=node_app_path,
-        stdout=sys.stdout,
-        stderr=sys.stderr,
-        env=env
+async def upstream_ready():
+    """Hold the request while Node starts; False once GATEWAY_READY_WAIT runs out."""
+    if node_supervisor.is_ready():
+        return True
+    return await node_supervisor.wait_ready(READY_WAIT)
+
+
+def upstream_unavailable(retry_after=1):
+    return Response(
+        content='{"error": "Backend service unavailable"}',
+        status_code=503,
+        media_type="application/json",
+        headers={"Retry-After": str(retry_after)},
     )
 
-    time.sleep(2)
-    print(f"Node.js server started on internal port {NODE_PORT}")
 
+def upstream_timeout():
+    return Response(
+        content='{"error": "Backend service timed out"}',
+        status_code=504,
+        media_type="application/json",
+    )
 
-def stop_node_server():
-    global node_process
-    if node_process:
-        node_process.terminate()
-        node_process.wait()
-        print("Node.js server stopped")
 
+def client_gone():
+    # Nobody is left to read this; 499 marks it in logs and metrics.
+    return Response(status_code=499)
 
-atexit.register(stop_node_server)
-threading.Thread(target=start_node_server, daemon=True).start()
+
+def shed_response(shed: Shed):
+    return Response(
+        content='{"error": "Server busy, please retry shortly"}',
+        status_code=503,
+        media_type="application/json",
+        headers={"Retry-After": str(shed.route_class.retry_after)},
+    )
 
 
 @app.get("/api/health")
@@ -68,20 +381,158 @@ async def health_check():
     return {"ok": True, "service": "peekaboo-api"}
 
 
+@app.get("/readyz")
+async def readiness_check():
+    """200 once Node answers /healthz (pre-warm may still be running), else 503"""
+    if not node_supervisor.is_ready():
+        return Response(
+            content=json.dumps({"ready": False, **warm_up.stats()}),
+            status_code=503,
+            media_type="application/json",
+            headers={"Retry-After": "1"},
+        )
+    warm_up.mark_ready()
+    return {"ready": True, **warm_up.stats()}
+
+
+@app.get("/api/gateway/pool")
+async def gateway_pool_stats(request: Request):
+    """Upstream connection pool utilization, per-worker health and in-flight gauges"""
+    if not admin_authorized(request):
+        return admin_forbidden()
+    return upstream.stats()
+
+
+@app.get("/api/gateway/cache")
+async def gateway_cache_stats(request: Request):
+    """Response cache hit/miss, eviction and invalidation counters"""
+    if not admin_authorized(request):
+        return admin_forbidden()
+    return response_cache.stats()
+
+
+@app.get("/api/gateway/coalesce")
+async def gateway_coalesce_stats(request: Request):
+    """Single-flight leader and coalesced request counters"""
+    if not admin_authorized(request):
+        return admin_forbidden()
+    return single_flight.stats()
+
+
+@app.get("/api/gateway/uploads")
+async def gateway_upload_stats(request: Request):
+    """Upload file serving and image variant cache counters"""
+    if not admin_authorized(request):
+        return admin_forbidden()
+    return {"files": upload_files.stats(), "variants": image_variants.stats()}
+
+
+@app.get("/api/gateway/compression")
+async def gateway_compression_stats(request: Request):
+    """Compressed responses, bytes in/out and CPU time per encoding"""
+    if not admin_authorized(request):
+        return admin_forbidden()
+    return compression_stats.as_dict()
+
+
+@app.get("/api/gateway/admission")
+async def gateway_admission_stats(request: Request):
+    """In-flight requests, queue depth and shed counts per route class"""
+    if not admin_authorized(request):
+        return admin_forbidden()
+    return admission.stats()
+
+
+@app.get("/api/gateway/node")
+async def gateway_node_stats(request: Request):
+    """Node worker readiness, restart counts and time-to-ready"""
+    if not admin_authorized(request):
+        return admin_forbidden()
+    return node_supervisor.stats()
+
+
+@app.get("/metrics")
+async def metrics(request: Request):
+    """Prometheus text exposition of request, upstream, Node and cache metrics"""
+    if not admin_authorized(request):
+        return admin_forbidden()
+    writer = MetricsWriter()
+    request_metrics.write(writer)
+    write_upstream_metrics(writer, upstream.stats())
+    write_node_metrics(writer, node_supervisor.stats())
+    write_stats_metrics(writer, "gateway_cache", response_cache.stats(), counters=(
+        "hits", "misses", "not_modified", "stores", "evictions", "invalidations",
+        "shared_published", "shared_received", "shared_store_errors",
+    ))
+    write_stats_metrics(writer, "gateway_coalesce", single_flight.stats(), counters=(
+        "requests", "leaders", "coalesced",
+    ))
+    write_stats_metrics(writer, "gateway_uploads", upload_files.stats(), counters=(
+        "served", "partial", "not_modified", "not_found",
+    ))
+    write_stats_metrics(writer, "gateway_image_variants", image_variants.stats(), counters=(
+        "hits", "renders", "render_seconds_total", "render_errors", "overloaded", "evictions",
+    ))
+    write_stats_metrics(writer, "gateway_auth", edge_auth.stats(), counters=(
+        "hits", "misses", "verified", "rejected",
+    ))
+    write_stats_metrics(writer, "gateway_startup", warm_up.stats(), counters=())
+    write_stats_metrics(writer, "gateway_jobs", job_queue.stats(), counters=(
+        "submitted", "rejected", "completed", "failed", "run_seconds",
+    ))
+    write_stats_metrics(writer, "gateway_callbacks", await callback_queue.stats(), counters=(
+        "enqueued", "duplicates", "overflow", "store_errors", "attempts", "delivered", "failures",
+        "deferred", "dead_lettered",
+    ))
+    write_stats_metrics(writer, "gateway_payment_status", payment_status.stats(), counters=(
+        "subscriptions", "loops_started", "polls", "poll_errors", "changes",
+    ))
+    compression = compression_stats.as_dict()
+    for key in ("responses", "bytes_in", "bytes_out", "cpu_seconds"):
+        writer.counter(f"gateway_compression_{key}_total", f"Compression {key.replace('_', ' ')} by encoding.", [
+            ({"encoding": encoding}, value) for encoding, value in sorted(compression[key].items())
+        ])
+    classes = admission.stats()["classes"]
+    for key in ("in_flight", "queue_depth"):
+        writer.gauge(f"gateway_admission_{key}", f"Admission {key.replace('_', ' ')} by route class.", [
+            ({"route_class": name}, stats[key]) for name, stats in classes.items()
+        ])
+    for key in ("admitted", "queued", "shed_queue_full", "shed_timeout"):
+        writer.counter(f"gateway_admission_{key}_total", f"Admission {key.replace('_', ' ')} by route class.", [
+            ({"route_class": name}, stats[key]) for name, stats in classes.items()
+        ])
+    rules = rate_limiter.stats()["rules"]
+    for key in ("allowed", "limited"):
+        writer.counter(f"gateway_rate_limit_{key}_total", f"Requests {key} by rate limit rule.", [
+            ({"rule": name}, stats[key]) for name, stats in rules.items()
+        ])
+    return Response(content=writer.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/api/payments/create-checkout")
 async def create_checkout(request: Request):
     """Delegate checkout creation to the Node.js payments providers."""
     try:
         auth_header = request.headers.get("authorization", "")
-        payload = await request.json()
-
-        async with httpx.AsyncClient() as client:
-            node_resp = await client.post(
-                f"http://localhost:{NODE_PORT}/api/payments/create-checkout",
-                json=payload,
-                headers={"Authorization": auth_header},
-                timeout=30.0
-            )
+        with timed_phase("read"):
+            payload = await request.json()
+
+        if not await upstream_ready():
+            return upstream_unavailable()
+
+        async def forward():
+            async with admission.admit("/api/payments/create-checkout"):
+                return await upstream.request(
+                    "POST",
+                    "/api/payments/create-checkout",
+                    json=payload,
+                    headers={
+                        "Authorization": auth_header,
+                        "X-Request-ID": request.headers.get("x-request-id", ""),
+                    },
+                )
+
+        node_resp = await cancel_on_disconnect(request, forward())
 
         if node_resp.status_code >= 400:
             raise HTTPException(status_code=node_resp.status_code, detail=node_resp.text)
@@ -89,35 +540,412 @@ async def create_checkout(request: Request):
         return node_resp.json()
     except HTTPException:
         raise
+    except Shed as shed:
+        return shed_response(shed)
+    except CircuitOpen as exc:
+        return upstream_unavailable(exc.retry_after)
+    except (DeadlineExceeded, httpx.TimeoutException):
+        return upstream_timeout()
+    except ClientDisconnected:
+        return client_gone()
     except Exception as e:
-        print(f"Checkout error: {e}")
+        print(f"Checkout error [{request.headers.get('x-request-id')}]: {e}")
         raise HTTPException(status_code=500, detail="Failed to create checkout session")
 
 
 @app.get("/api/payments/status/{session_id}")
 async def get_checkout_status(request: Request, session_id: str):
-    """Delegate checkout status checks to the Node.js payments providers."""
+    """Delegate checkout status checks to the Node.js payments providers.
+
+    With `?wait=<seconds>` this long-polls: it answers as soon as the status
+    differs from `since` (or right away without `since`), is terminal, or
+    the wait runs out.
+    """
     try:
         auth_header = request.headers.get("authorization", "")
 
-        async with httpx.AsyncClient() as client:
-            node_resp = await client.get(
-                f"http://localhost:{NODE_PORT}/api/payments/status/{session_id}",
-                headers={"Authorization": auth_header},
-                timeout=30.0
+        if not await upstream_ready():
+            return upstream_unavailable()
+
+        if "wait" in request.query_params:
+            return await cancel_on_disconnect(
+                request, long_poll_checkout_status(request, session_id, auth_header)
             )
 
+        async def forward():
+            async with admission.admit(f"/api/payments/status/{session_id}"):
+                return await upstream.request(
+                    "GET",
+                    f"/api/payments/status/{session_id}",
+                    headers={
+                        "Authorization": auth_header,
+                        "X-Request-ID": request.headers.get("x-request-id", ""),
+                    },
+                )
+
+        node_resp = await cancel_on_disconnect(request, forward())
+
         if node_resp.status_code >= 400:
             raise HTTPException(status_code=node_resp.status_code, detail=node_resp.text)
 
         return node_resp.json()
     except HTTPException:
         raise
+    except Shed as shed:
+        return shed_response(shed)
+    except CircuitOpen as exc:
+        return upstream_unavailable(exc.retry_after)
+    except (DeadlineExceeded, httpx.TimeoutException):
+        return upstream_timeout()
+    except ClientDisconnected:
+        return client_gone()
+    except PollerFull:
+        return shed_status_poller()
     except Exception as e:
-        print(f"Status check error: {e}")
+        print(f"Status check error [{request.headers.get('x-request-id')}]: {e}")
         raise HTTPException(status_code=500, detail="Failed to get checkout status")
 
 
+async def long_poll_checkout_status(request: Request, session_id: str, auth_header: str):
+    try:
+        wait = min(max(float(request.query_params["wait"]), 0.0), STATUS_LONG_POLL_MAX)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid wait")
+    since = request.query_params.get("since")
+    deadline = time.monotonic() + wait
+
+    async with payment_status.subscribe(session_id, auth_header) as watch:
+        seen = 0
+        while True:
+            await watch.wait(seen, deadline - time.monotonic())
+            seen = watch.version
+            snapshot = watch.snapshot
+            if snapshot is not None and (since is None or snapshot.status != since or watch.done):
+                break
+            if watch.done or time.monotonic() >= deadline:
+                break
+
+    if snapshot is None:
+        return upstream_unavailable()
+    if snapshot.status_code >= 400:
+        raise HTTPException(status_code=snapshot.status_code, detail=snapshot.body.decode("utf-8", "replace"))
+    return Response(content=snapshot.body, media_type="application/json")
+
+
+def admin_authorized(request: Request):
+    # Prometheus scrapers can only send the token as a bearer credential.
+    token = request.headers.get("x-gateway-admin-token", "")
+    if not token:
+        scheme, _, credentials = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() == "bearer":
+            token = credentials.strip()
+    return bool(GATEWAY_ADMIN_TOKEN) and hmac.compare_digest(
+        token.encode(), GATEWAY_ADMIN_TOKEN.encode()
+    )
+
+
+def admin_forbidden():
+    return Response(
+        content='{"error": "Gateway admin token required"}',
+        status_code=403,
+        media_type="application/json",
+    )
+
+
+def shed_status_poller():
+    return Response(
+        content='{"error": "Too many status subscriptions, poll instead"}',
+        status_code=503,
+        media_type="application/json",
+        headers={"Retry-After": "5"},
+    )
+
+
+def status_event(version: int, snapshot):
+    try:
+        data = json.dumps(json.loads(snapshot.body))
+    except ValueError:
+        data = json.dumps({"error": snapshot.body.decode("utf-8", "replace")})
+    event = "status" if snapshot.status_code == 200 else "error"
+    return f"event: {event}\nid: {version}\ndata: {data}\n\n"
+
+
+@app.get("/api/payments/status/{session_id}/stream")
+async def stream_checkout_status(request: Request, session_id: str):
+    """Server-Sent Events: a `status` event whenever the checkout status changes.
+
+    The stream ends after a terminal status (`paid`, `failed`, `expired`,
+    `cancelled`), an `error` event for a Node error answer, or
+    GATEWAY_STATUS_STREAM_MAX seconds. Needs the same Authorization header
+    as the status endpoint.
+    """
+    auth_header = request.headers.get("authorization", "")
+    if not await upstream_ready():
+        return upstream_unavailable()
+    if not payment_status.has_room(session_id, auth_header):
+        return shed_status_poller()
+
+    async def events():
+        started = time.monotonic()
+        yield "retry: 3000\n\n"
+        async with payment_status.subscribe(session_id, auth_header) as watch:
+            seen = 0
+            while True:
+                left = STATUS_STREAM_MAX - (time.monotonic() - started)
+                if left <= 0:
+                    return
+                await watch.wait(seen, min(STATUS_HEARTBEAT, left))
+                if watch.version > seen:
+                    seen = watch.version
+                    yield status_event(seen, watch.snapshot)
+                elif not watch.done:
+                    yield ": keep-alive\n\n"
+                if watch.done:
+                    return
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/api/gateway/payment-status")
+async def gateway_payment_status_stats(request: Request):
+    """Shared payment status poll loops, subscribers and upstream polls"""
+    if not admin_authorized(request):
+        return admin_forbidden()
+    return payment_status.stats()
+
+
+@app.get("/api/gateway/rate-limits")
+async def gateway_rate_limit_stats(request: Request):
+    """Allowed and limited requests per rate limit rule"""
+    if not admin_authorized(request):
+        return admin_forbidden()
+    return rate_limiter.stats()
+
+
+@app.get("/api/gateway/auth")
+async def gateway_auth_stats(request: Request):
+    """Edge token verification and claims cache counters"""
+    if not admin_authorized(request):
+        return admin_forbidden()
+    return edge_auth.stats()
+
+
+@app.get("/api/gateway/callbacks")
+async def gateway_callback_stats(request: Request):
+    """Queued, delivered and dead-lettered payment callbacks"""
+    if not admin_authorized(request):
+        return admin_forbidden()
+    return await callback_queue.stats()
+
+
+@app.get("/api/gateway/callbacks/dead")
+async def gateway_dead_callbacks(request: Request, limit: int = 100):
+    """Dead-lettered callbacks with their headers and body; needs X-Gateway-Admin-Token"""
+    if not admin_authorized(request):
+        return admin_forbidden()
+    return await callback_queue.dead_letters(min(max(limit, 1), 1000))
+
+
+@app.post("/api/gateway/callbacks/{callback_id}/retry")
+async def gateway_retry_callback(request: Request, callback_id: int):
+    """Put a dead-lettered callback back in the queue; needs X-Gateway-Admin-Token"""
+    if not admin_authorized(request):
+        return admin_forbidden()
+    if not await callback_queue.requeue(callback_id):
+        raise HTTPException(status_code=404, detail="No dead-lettered callback with that id")
+    return {"requeued": callback_id}
+
+
+async def job_accepted(request: Request, url: str, headers, body: bytes):
+    """202 for a newly queued job, 503 when the queue is full, None to proxy synchronously."""
+    try:
+        job = await job_queue.submit(
+            request.method, url, headers, body, request.headers.get("authorization", "")
+        )
+    except QueueFull:
+        return Response(
+            content='{"error": "Too many queued jobs, please retry shortly"}',
+            status_code=503,
+            media_type="application/json",
+            headers={"Retry-After": "5"},
+        )
+    except sqlite3.Error as exc:
+        print(f"Job store unavailable, proxying synchronously: {exc}")
+        return None
+    location = f"/api/jobs/{job.id}"
+    response_headers = {"Location": location, "Retry-After": "2"}
+    if prefers_async(request.headers.get("prefer")):
+        response_headers["Preference-Applied"] = "respond-async"
+    return Response(
+        content=json.dumps({**job.summary(), "status_url": location, "stream_url": f"{location}/stream"}),
+        status_code=202,
+        media_type="application/json",
+        headers=response_headers,
+    )
+
+
+def job_not_found():
+    return Response(content='{"error": "Job not found"}', status_code=404, media_type="application/json")
+
+
+def job_pending(job):
+    return Response(
+        content=json.dumps(job.summary()),
+        status_code=202,
+        media_type="application/json",
+        headers={"Retry-After": "2"},
+    )
+
+
+@app.get("/api/jobs/{job_id}")
+async def job_status(request: Request, job_id: str, wait: float = 0.0):
+    """An offloaded request: `202` with its state while pending, then Node's own answer.
+
+    `?wait=N` holds the request up to N seconds (at most GATEWAY_JOB_LONG_POLL_MAX)
+    for the job to finish. Needs the Authorization header it was submitted with.
+    """
+    authorization = request.headers.get("authorization", "")
+    try:
+        job = await job_queue.wait(job_id, authorization, min(max(wait, 0.0), JOB_LONG_POLL_MAX))
+    except sqlite3.Error as exc:
+        print(f"Job store unavailable: {exc}")
+        return upstream_unavailable()
+    if job is None:
+        return job_not_found()
+    if not job.finished:
+        return job_pending(job)
+    return relay_buffered(job.status_code, job.headers + [(b"x-job-status", job.state.encode())], job.body)
+
+
+def job_event(job):
+    if not job.finished:
+        return f"event: status\ndata: {json.dumps(job.summary())}\n\n"
+    try:
+        body = json.loads(job.body)
+    except ValueError:
+        body = job.body.decode("utf-8", "replace")
+    data = json.dumps({**job.summary(), "status_code": job.status_code, "body": body})
+    return f"event: result\ndata: {data}\n\n"
+
+
+@app.get("/api/jobs/{job_id}/stream")
+async def stream_job(request: Request, job_id: str):
+    """Server-Sent Events: a `status` event per state change, then one `result` event.
+
+    The result carries Node's status code and JSON body. Needs the
+    Authorization header the job was submitted with.
+    """
+    authorization = request.headers.get("authorization", "")
+    try:
+        job = await job_queue.get(job_id, authorization)
+    except sqlite3.Error as exc:
+        print(f"Job store unavailable: {exc}")
+        return upstream_unavailable()
+    if job is None:
+        return job_not_found()
+
+    async def events():
+        current = job
+        started = time.monotonic()
+        yield "retry: 3000\n\n"
+        yield job_event(current)
+        while not current.finished:
+            left = job_queue.job_timeout - (time.monotonic() - started)
+            if left <= 0:
+                return
+            update = await job_queue.wait(
+                job_id, authorization, min(STATUS_HEARTBEAT, left), since=current.state
+            )
+            if update is None:
+                return
+            if update.state != current.state:
+                current = update
+                yield job_event(current)
+            else:
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/api/gateway/jobs")
+async def gateway_job_stats(request: Request):
+    """Queued, running and finished offloaded jobs in this worker"""
+    if not admin_authorized(request):
+        return admin_forbidden()
+    return job_queue.stats()
+
+
+@app.api_route("/api/uploads/{name:path}", methods=["GET", "HEAD"])
+async def serve_upload(request: Request, name: str):
+    """Uploaded images, served from disk with Range and immutable caching."""
+    if not SERVE_UPLOADS:
+        return await proxy_to_node(request, f"uploads/{name}")
+    if image_variants.wants_variant(request):
+        return await image_variants.serve(request, name)
+    return await upload_files.serve(request, name)
+
+
+async def fetch_result(url: str, headers):
+    async with admission.admit(url.split("?", 1)[0]):
+        response = await upstream.request("GET", url, headers=headers)
+    return UpstreamResult(
+        response.status_code,
+        downstream_response_headers(response, buffered=True),
+        response.content,
+    )
+
+
+async def coalesced_proxy(request: Request, path: str, url: str, headers):
+    """Share one upstream GET between identical concurrent requests."""
+    key = response_cache.key_for(f"/api/{path}", request.url.query)
+    result = await single_flight.do(key, lambda: fetch_result(url, headers))
+    return relay_buffered(result.status_code, result.headers, result.body)
+
+
+async def cached_proxy(request: Request, path: str, url: str, headers):
+    """Serve a public GET from the response cache, filling it on a miss."""
+    key = response_cache.key_for(f"/api/{path}", request.url.query)
+    entry = response_cache.get(key)
+    if entry is not None:
+        return response_cache.respond(entry, request, "HIT")
+
+    # Revalidation is done against our own entry, not passed to Node.
+    headers = [(name, value) for name, value in headers if name.lower() != "if-none-match"]
+    result, entry = await fill_cache(key, f"/api/{path}", url, headers)
+    if entry is None:
+        return relay_buffered(result.status_code, result.headers, result.body)
+    return response_cache.respond(entry, request, "MISS")
+
+
+async def fill_cache(key: str, path: str, url: str, headers):
+    """Fetch `url` once for all concurrent misses on `key` and store it; (result, entry or None)."""
+
+    async def fill():
+        result = await fetch_result(url, headers)
+        entry = response_cache.store(
+            key, response_cache.ttl_for(path), result.status_code, result.headers, result.body
+        )
+        return result, entry
+
+    return await single_flight.do(f"cache:{key}", fill)
+
+
+async def prewarm_route(path: str):
+    """Fill the response cache for one public route ahead of the first visitor."""
+    if response_cache.ttl_for(path) is None:
+        return False
+    _, entry = await fill_cache(response_cache.key_for(path, ""), path, path, [])
+    return entry is not None
+
+
 # Proxy all other requests to Node
 @app.api_route("/api/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"])
 async def proxy_to_node(request: Request, path: str):
@@ -126,37 +954,109 @@ async def proxy_to_node(request: Request, path: str):
         raise HTTPException(status_code=404, detail="Not found")
 
     try:
-        async with httpx.AsyncClient() as client:
-            url = f"http://localhost:{NODE_PORT}/api/{path}"
+        url = f"/api/{path}"
 
-            if request.query_params:
-                url += f"?{request.query_params}"
+        if request.url.query:
+            url += f"?{request.url.query}"
 
-            headers = dict(request.headers)
-            headers.pop("host", None)
+        headers = edge_auth.strip(upstream_request_headers(request))
+        if edge_auth.protects(f"/api/{path}"):
+            user_id = edge_auth.authenticate(request.headers.get("authorization"))
+            headers.append((TRUSTED_USER_HEADER, user_id))
 
-            body = await request.body()
+        if callback_queue.accepts(request.method, f"/api/{path}"):
+            with timed_phase("read"):
+                body = await request.body()
+            if await callback_queue.enqueue(request.method, url, headers, body):
+                return Response(
+                    content='{"received": true, "queued": true}', media_type="application/json"
+                )
 
-            response = await client.request(
-                method=request.method,
-                url=url,
-                headers=headers,
-                content=body,
-                timeout=30.0
-            )
+        if job_queue.wants_job(request.method, f"/api/{path}", request.headers.get("prefer")):
+            with timed_phase("read"):
+                body = await request.body()
+            accepted = await job_accepted(request, url, headers, body)
+            if accepted is not None:
+                return accepted
+
+        if not await upstream_ready():
+            return upstream_unavailable()
+
+        if response_cache.is_cacheable_request(request, f"/api/{path}"):
+            return await cached_proxy(request, path, url, headers)
+
+        if single_flight.is_coalescable_request(request, f"/api/{path}"):
+            return await coalesced_proxy(request, path, url, headers)
+
+        if STREAM_PROXY:
+            body_sent = asyncio.Event() if has_request_body(request) else None
 
-            return Response(
-                content=response.content,
-                status_code=response.status_code,
-                headers=dict(response.headers),
-                media_type=response.headers.get("content-type")
+            async def forward_stream():
+                route_class = await admission.acquire(f"/api/{path}")
+                try:
+                    worker, response = await upstream.dispatch(
+                        request.method,
+                        url,
+                        headers=headers,
+                        content=(
+                            relay_body(timed_stream(request.stream()), body_sent)
+                            if body_sent is not None else None
+                        ),
+                        stream=True,
+                    )
+                except BaseException:
+                    admission.release(route_class)
+                    raise
+                return route_class, worker, response
+
+            route_class, worker, response = await cancel_on_disconnect(
+                request, forward_stream(), body_sent=body_sent
             )
-    except httpx.ConnectError:
+            response_cache.invalidate_for_mutation(request.method, f"/api/{path}", response.status_code)
+
+            async def release():
+                # The slot is held until the body has been relayed to the client.
+                try:
+                    await worker.release(response)
+                finally:
+                    admission.release(route_class)
+
+            try:
+                return streaming_response(response, background=BackgroundTask(release))
+            except Exception:
+                await release()
+                raise
+
+        with timed_phase("read"):
+            body = await request.body()
+
+        async def forward():
+            async with admission.admit(f"/api/{path}"):
+                return await upstream.request(
+                    request.method,
+                    url,
+                    headers=headers,
+                    content=body,
+                )
+
+        response = await cancel_on_disconnect(request, forward())
+        response_cache.invalidate_for_mutation(request.method, f"/api/{path}", response.status_code)
+
+        return buffered_response(response)
+    except AuthRejected as exc:
         return Response(
-            content='{"error": "Backend service unavailable"}',
-            status_code=503,
-            media_type="application/json"
+            content=json.dumps({"error": exc.error}), status_code=401, media_type="application/json"
         )
+    except Shed as shed:
+        return shed_response(shed)
+    except CircuitOpen as exc:
+        return upstream_unavailable(exc.retry_after)
+    except (DeadlineExceeded, httpx.TimeoutException):
+        return upstream_timeout()
+    except ClientDisconnected:
+        return client_gone()
+    except httpx.ConnectError:
+        return upstream_unavailable()
     except Exception as e:
         return Response(
             content=f'{{"error": "{str(e)}"}}',
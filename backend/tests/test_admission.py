@@ -0,0 +1,188 @@
+import asyncio
+
+import pytest
+
+from gateway.admission import (
+    DEFAULT_CLASS_ROUTES,
+    DEFAULT_ROUTE_CLASSES,
+    AdmissionController,
+    Shed,
+)
+
+# name -> (priority, limit, queue, retry_after, reserved)
+CLASSES = {
+    "callbacks": (0, 4, 4, 1, True),
+    "payments": (1, 4, 4, 1, False),
+    "public": (3, 4, 4, 1, False),
+    "ai": (5, 1, 1, 10, False),
+}
+ROUTES = {
+    "/api/payments/capital-bank/notify": "callbacks",
+    "/api/payments": "payments",
+    "/api/themes/ai-generate": "ai",
+}
+NOTIFY = "/api/payments/capital-bank/notify"
+
+
+def controller(total_limit=4, reserved=2, queue_timeout=1.0):
+    return AdmissionController(
+        CLASSES, ROUTES, total_limit=total_limit, reserved=reserved, queue_timeout=queue_timeout
+    )
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.parametrize("path, name", [
+    ("/api/payments/capital-bank/notify", "callbacks"),
+    ("/api/payments/capital-bank/return", "callbacks"),
+    ("/api/payments/checkout", "payments"),
+    ("/api/payments/hourly-pricing", "public"),
+    ("/api/bookings/42", "booking"),
+    ("/api/subscriptions/plans", "public"),
+    ("/api/subscriptions/mine", "booking"),
+    ("/api/admin/customers", "admin"),
+    ("/api/themes/ai-generate", "ai"),
+    ("/api/gallery", "public"),
+    ("/api/paymentsx", "public"),
+])
+def test_classify_default_routes(path, name):
+    admission = AdmissionController(DEFAULT_ROUTE_CLASSES, DEFAULT_CLASS_ROUTES)
+    assert admission.classify(path).name == name
+
+
+def test_reserved_slice_is_kept_for_callbacks():
+    async def scenario():
+        admission = controller(total_limit=4, reserved=2)
+        await admission.acquire("/api/gallery")
+        await admission.acquire("/api/payments/checkout")
+        # The shared part (4 - 2) is used up: other classes queue...
+        waiting = asyncio.ensure_future(admission.acquire("/api/gallery"))
+        await settle()
+        assert not waiting.done()
+        # ...while callbacks still get the reserved slots, and only those.
+        await admission.acquire(NOTIFY)
+        await admission.acquire(NOTIFY)
+        assert admission.in_flight == 4
+        callback = asyncio.ensure_future(admission.acquire(NOTIFY))
+        await settle()
+        assert not callback.done()
+        waiting.cancel()
+        callback.cancel()
+        await asyncio.gather(waiting, callback, return_exceptions=True)
+
+    asyncio.run(scenario())
+
+
+def test_released_slots_go_to_higher_priority_first():
+    async def scenario():
+        admission = controller(total_limit=2, reserved=0)
+        first = await admission.acquire("/api/gallery")
+        second = await admission.acquire("/api/gallery")
+        order = []
+
+        async def wait_for(path):
+            route_class = await admission.acquire(path)
+            order.append(route_class.name)
+
+        # Queued lowest priority first; served highest priority first.
+        waiters = [asyncio.ensure_future(wait_for(path)) for path in (
+            "/api/gallery", "/api/payments/a", NOTIFY, "/api/payments/b",
+        )]
+        await settle()
+        assert order == []
+        admission.release(first)
+        await settle()
+        assert order == ["callbacks"]
+        admission.release(second)
+        await settle()
+        assert order == ["callbacks", "payments"]
+        for name in ("callbacks", "payments"):
+            admission.release(admission.classes[name])
+        await settle()
+        assert order == ["callbacks", "payments", "payments", "public"]
+        await asyncio.gather(*waiters)
+
+    asyncio.run(scenario())
+
+
+def test_class_limit_applies_below_the_global_limit():
+    async def scenario():
+        admission = controller(total_limit=8, reserved=0)
+        ai = await admission.acquire("/api/themes/ai-generate")
+        queued = asyncio.ensure_future(admission.acquire("/api/themes/ai-generate"))
+        await settle()
+        assert not queued.done()
+        # Other classes are not held up by the full ai class.
+        await admission.acquire("/api/gallery")
+        # The queue holds one; the next one is shed straight away.
+        with pytest.raises(Shed) as info:
+            await admission.acquire("/api/themes/ai-generate")
+        assert info.value.reason == "queue_full"
+        assert info.value.route_class.retry_after == 10
+        admission.release(ai)
+        assert (await queued).name == "ai"
+        assert admission.classes["ai"].stats()["shed_queue_full"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_queue_timeout_sheds_and_forgets_the_waiter():
+    async def scenario():
+        admission = controller(total_limit=1, reserved=0, queue_timeout=0.01)
+        held = await admission.acquire("/api/gallery")
+        with pytest.raises(Shed) as info:
+            await admission.acquire("/api/gallery")
+        assert info.value.reason == "timeout"
+        public = admission.classes["public"]
+        assert public.shed_timeout == 1
+        assert len(public.waiters) == 0
+        admission.release(held)
+        assert admission.in_flight == 0
+        assert public.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_does_not_take_a_slot():
+    async def scenario():
+        admission = controller(total_limit=1, reserved=0)
+        held = await admission.acquire("/api/gallery")
+        cancelled = asyncio.ensure_future(admission.acquire("/api/gallery"))
+        waiting = asyncio.ensure_future(admission.acquire("/api/gallery"))
+        await settle()
+        cancelled.cancel()
+        await asyncio.gather(cancelled, return_exceptions=True)
+        admission.release(held)
+        route_class = await waiting
+        assert admission.in_flight == 1
+        admission.release(route_class)
+        assert admission.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_admit_releases_on_error():
+    async def scenario():
+        admission = controller()
+        with pytest.raises(RuntimeError):
+            async with admission.admit("/api/payments/checkout"):
+                assert admission.in_flight == 1
+                raise RuntimeError("upstream failed")
+        assert admission.in_flight == 0
+        stats = admission.stats()["classes"]["payments"]
+        assert (stats["in_flight"], stats["admitted"]) == (0, 1)
+
+    asyncio.run(scenario())
+
+
+def test_disabled_controller_admits_everything():
+    async def scenario():
+        admission = AdmissionController(CLASSES, ROUTES, total_limit=1, enabled=False)
+        for _ in range(5):
+            await admission.acquire("/api/themes/ai-generate")
+        assert admission.in_flight == 5
+
+    asyncio.run(scenario())
@@ -0,0 +1,161 @@
+import base64
+import json
+import time
+
+import jwt
+import pytest
+
+from gateway.auth import DEFAULT_AUTH_ROUTES, TRUSTED_USER_HEADER, AuthRejected, EdgeAuth
+
+SECRET = "test-secret-" + "x" * 64
+
+
+def token_for(claims, secret=SECRET, algorithm="HS256"):
+    return jwt.encode(claims, secret, algorithm=algorithm)
+
+
+def bearer(claims, **kwargs):
+    return f"Bearer {token_for(claims, **kwargs)}"
+
+
+def unsigned(claims):
+    def part(data):
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b"=").decode()
+
+    return f"{part({'alg': 'none', 'typ': 'JWT'})}.{part(claims)}."
+
+
+@pytest.fixture
+def auth():
+    return EdgeAuth(SECRET, DEFAULT_AUTH_ROUTES, enabled=True)
+
+
+def rejection(auth, authorization):
+    with pytest.raises(AuthRejected) as info:
+        auth.authenticate(authorization)
+    return info.value.error
+
+
+@pytest.mark.parametrize("algorithm", ["HS256", "HS384", "HS512"])
+def test_accepts_hmac_algorithms(auth, algorithm):
+    assert auth.authenticate(bearer({"userId": "u1"}, algorithm=algorithm)) == "u1"
+
+
+def test_rejects_unsigned_and_forged_tokens(auth):
+    assert rejection(auth, f"Bearer {unsigned({'userId': 'u1'})}") == "Invalid token"
+    assert rejection(auth, bearer({"userId": "u1"}, secret="other-" + "y" * 64)) == "Invalid token"
+    assert rejection(auth, "Bearer not-a-jwt") == "Invalid token"
+
+
+@pytest.mark.parametrize("authorization", [None, "", "Token abc", "bearer abc", "Bearer"])
+def test_missing_token(auth, authorization):
+    # Node checks for the exact "Bearer " prefix before looking at the token.
+    assert rejection(auth, authorization) == "No token provided"
+
+
+def test_empty_token_is_invalid(auth):
+    # "Bearer " passes Node's prefix check and jwt.verify("") throws.
+    assert rejection(auth, "Bearer ") == "Invalid token"
+    assert rejection(auth, f"Bearer  {token_for({'userId': 'u1'})}") == "Invalid token"
+
+
+def test_uses_second_field_like_node(auth):
+    assert auth.authenticate(f"Bearer {token_for({'userId': 'u1'})} trailing") == "u1"
+
+
+def test_rejects_expired_and_not_yet_valid_tokens(auth):
+    now = int(time.time())
+    assert rejection(auth, bearer({"userId": "u1", "exp": now - 1})) == "Invalid token"
+    assert rejection(auth, bearer({"userId": "u1", "exp": now})) == "Invalid token"
+    assert rejection(auth, bearer({"userId": "u1", "nbf": now + 60})) == "Invalid token"
+    assert rejection(auth, bearer({"userId": "u1", "exp": "soon"})) == "Invalid token"
+    assert auth.authenticate(bearer({"userId": "u1", "exp": now + 60})) == "u1"
+
+
+@pytest.mark.parametrize("claims", [{}, {"userId": ""}, {"userId": None}, {"sub": "u1"}])
+def test_tokens_without_user_id(auth, claims):
+    assert rejection(auth, bearer(claims)) == "User not found"
+
+
+def test_non_string_user_id(auth):
+    assert auth.authenticate(bearer({"userId": 42})) == "42"
+
+
+def test_caches_verified_tokens(auth):
+    authorization = bearer({"userId": "u1"})
+    assert auth.authenticate(authorization) == "u1"
+    assert auth.authenticate(authorization) == "u1"
+    assert (auth.misses, auth.hits, auth.verified) == (1, 1, 2)
+
+
+def test_cached_token_expires_with_its_exp(auth, monkeypatch):
+    now = time.time()
+    exp = int(now) + 10
+    authorization = bearer({"userId": "u1", "exp": exp})
+    assert auth.authenticate(authorization) == "u1"
+    assert [entry[0] for entry in auth.entries.values()] == [exp]
+    # Past exp the cached claims are not used; the token is verified again.
+    monkeypatch.setattr(time, "time", lambda: exp + 1)
+    auth.authenticate(authorization)
+    assert (auth.misses, auth.hits) == (2, 0)
+
+
+def test_caches_rejections_for_rejection_ttl(monkeypatch):
+    auth = EdgeAuth(SECRET, DEFAULT_AUTH_ROUTES, enabled=True, rejection_ttl=60.0)
+    now = time.time()
+    authorization = bearer({"userId": "u1"}, secret="other-" + "y" * 64)
+    assert rejection(auth, authorization) == "Invalid token"
+    assert rejection(auth, authorization) == "Invalid token"
+    assert (auth.misses, auth.hits, auth.rejected) == (1, 1, 2)
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert rejection(auth, authorization) == "Invalid token"
+    assert auth.misses == 2
+
+
+def test_negative_cache_keeps_the_error(auth):
+    authorization = bearer({"sub": "u1"})
+    assert rejection(auth, authorization) == "User not found"
+    assert rejection(auth, authorization) == "User not found"
+    assert auth.hits == 1
+
+
+def test_cache_is_bounded():
+    auth = EdgeAuth(SECRET, DEFAULT_AUTH_ROUTES, enabled=True, max_entries=2)
+    first, second, third = (bearer({"userId": f"u{n}"}) for n in range(3))
+    for authorization in (first, second, first, third):
+        auth.authenticate(authorization)
+    assert len(auth.entries) == 2
+    auth.authenticate(first)  # most recently used, still cached
+    assert auth.hits == 2
+    auth.authenticate(second)  # least recently used, evicted
+    assert auth.misses == 4
+
+
+@pytest.mark.parametrize("path, protected", [
+    ("/api/admin", True),
+    ("/api/admin/customers/1", True),
+    ("/api/admin/cron", False),
+    ("/api/admin/cron/daily", False),
+    ("/api/administrator", False),
+    ("/api/bookings/mine", True),
+    ("/api/profile", True),
+    ("/api/gallery", False),
+    ("/api/auth/login", False),
+])
+def test_protects(auth, path, protected):
+    assert auth.protects(path) is protected
+
+
+def test_disabled_without_secret():
+    auth = EdgeAuth("", DEFAULT_AUTH_ROUTES, enabled=True)
+    assert not auth.enabled
+    assert not auth.protects("/api/admin")
+
+
+def test_strip_drops_client_supplied_identity():
+    headers = [
+        ("X-Authenticated-User-Id", "admin"),
+        (TRUSTED_USER_HEADER, "admin"),
+        ("authorization", "Bearer abc"),
+    ]
+    assert EdgeAuth.strip(headers) == [("authorization", "Bearer abc")]
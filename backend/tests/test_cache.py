@@ -0,0 +1,81 @@
+import asyncio
+import sqlite3
+import time
+
+from gateway.cache import DEFAULT_CACHE_TTLS, ResponseCache, SharedInvalidations
+
+BODY = b'[{"id": 1}]'
+
+
+def worker_cache(path):
+    shared = SharedInvalidations(str(path), sync_interval=0.01)
+    return ResponseCache(DEFAULT_CACHE_TTLS, shared=shared)
+
+
+def fill(cache, path):
+    key = cache.key_for(path, "")
+    cache.store(key, 300.0, 200, [(b"content-type", b"application/json")], BODY)
+    return key
+
+
+async def until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        await asyncio.sleep(0.01)
+
+
+def test_invalidations_reach_other_workers(tmp_path):
+    async def scenario():
+        first = worker_cache(tmp_path / "shared.sqlite3")
+        second = worker_cache(tmp_path / "shared.sqlite3")
+        tasks = [
+            asyncio.create_task(cache.shared.run(cache.invalidate_prefix))
+            for cache in (first, second)
+        ]
+        try:
+            await until(lambda: all(cache.shared._seen is not None for cache in (first, second)))
+            gallery = fill(second, "/api/gallery")
+            themes = fill(second, "/api/themes")
+            fill(first, "/api/gallery")
+            first.invalidate_for_mutation("POST", "/api/gallery", 201)
+            await until(lambda: second.get(gallery) is None)
+            assert second.get(themes) is not None
+            assert second.shared.received == 1
+            # A worker does not apply its own invalidations twice.
+            await asyncio.sleep(0.05)
+            assert first.shared.received == 0
+            assert first.invalidations == 1
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            first.shared.close()
+            second.shared.close()
+
+    asyncio.run(scenario())
+
+
+def test_lookups_do_not_wait_for_a_locked_store(tmp_path):
+    async def scenario():
+        path = tmp_path / "shared.sqlite3"
+        cache = worker_cache(path)
+        key = fill(cache, "/api/gallery")
+        task = asyncio.create_task(cache.shared.run(cache.invalidate_prefix))
+        await until(lambda: cache.shared._seen is not None)
+        locker = sqlite3.connect(str(path), isolation_level=None)
+        locker.execute("BEGIN EXCLUSIVE")
+        try:
+            started = time.perf_counter()
+            for _ in range(20):
+                assert cache.get(key) is not None
+                await asyncio.sleep(0.005)
+            assert time.perf_counter() - started < 1.0
+        finally:
+            locker.execute("ROLLBACK")
+            locker.close()
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            cache.shared.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,305 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from gateway.callbacks import CallbackQueue, DeliveryDeferred, delivered, order_key_for
+
+URL = "/api/payments/capital-bank/notify"
+HEADERS = [("content-type", "application/x-www-form-urlencoded")]
+OK = (200, b'{"received": true}')
+
+
+class FakeNode:
+    """Stands in for `deliver_callback`; answers are used up in order, then OK."""
+
+    def __init__(self, *answers, delay=0.0):
+        self.answers = list(answers)
+        self.delay = delay
+        self.bodies = []
+        self.started = asyncio.Event()
+
+    async def __call__(self, method, url, headers, body):
+        self.bodies.append(body)
+        self.started.set()
+        await asyncio.sleep(self.delay)
+        answer = self.answers.pop(0) if self.answers else OK
+        if isinstance(answer, BaseException):
+            raise answer
+        return answer
+
+
+def make_queue(path, send, **options):
+    options = dict(dict(base_delay=0.01, defer_delay=0.01, idle_interval=0.02), **options)
+    return CallbackQueue(str(path), send, enabled=True, **options)
+
+
+def notify(session, decision="ACCEPT"):
+    return f"req_reference_number={session}&decision={decision}".encode()
+
+
+def rows(path):
+    db = sqlite3.connect(str(path))
+    db.row_factory = sqlite3.Row
+    try:
+        return [dict(row) for row in db.execute("SELECT * FROM callbacks ORDER BY id")]
+    finally:
+        db.close()
+
+
+async def until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        await asyncio.sleep(0.01)
+
+
+def test_order_key_for():
+    assert order_key_for(URL, notify("S1")) == "S1"
+    assert order_key_for(URL + "?orderId=S2", b"decision=ACCEPT") == "S2"
+    assert order_key_for(URL, b"reference_number=S3&orderId=S4") == "S3"
+    assert order_key_for(URL, b"\xff\xfe") is None
+    assert order_key_for(URL, b"decision=ACCEPT") is None
+
+
+@pytest.mark.parametrize("status, body, expected", [
+    (200, b'{"received": true}', True),
+    (200, b"OK", True),
+    (204, b"", True),
+    (200, b'{"received": true, "error": true}', False),
+    (500, b'{"received": true}', False),
+    (401, b"", False),
+])
+def test_delivered(status, body, expected):
+    assert delivered(status, body) is expected
+
+
+def test_enqueue_deliver_and_ack(tmp_path):
+    async def scenario():
+        node = FakeNode()
+        queue = make_queue(tmp_path / "q.sqlite3", node)
+        await queue.start()
+        try:
+            assert queue.accepts("POST", URL)
+            assert not queue.accepts("GET", URL)
+            assert await queue.enqueue("POST", URL, HEADERS, notify("S1"))
+            # An exact repeat is acknowledged but stored once.
+            assert await queue.enqueue("POST", URL, HEADERS, notify("S1"))
+            await until(lambda: queue.delivered == 1)
+            await asyncio.sleep(0.05)
+            assert node.bodies == [notify("S1")]
+            stats = await queue.stats()
+            assert (stats["enqueued"], stats["duplicates"], stats["pending"]) == (1, 1, 0)
+        finally:
+            await queue.aclose()
+        [row] = rows(tmp_path / "q.sqlite3")
+        assert row["state"] == "delivered"
+        assert row["attempts"] == 1
+        assert row["last_status"] == 200
+        assert row["lease_owner"] is None
+        assert row["order_key"] == "S1"
+
+    asyncio.run(scenario())
+
+
+def test_enqueued_callbacks_survive_a_restart(tmp_path):
+    async def scenario():
+        stopped = make_queue(tmp_path / "q.sqlite3", FakeNode(), deliver=False)
+        await stopped.start()
+        assert await stopped.enqueue("POST", URL, HEADERS, notify("S1"))
+        await stopped.aclose()
+
+        node = FakeNode()
+        queue = make_queue(tmp_path / "q.sqlite3", node)
+        await queue.start()
+        try:
+            await until(lambda: queue.delivered == 1)
+        finally:
+            await queue.aclose()
+        assert node.bodies == [notify("S1")]
+
+    asyncio.run(scenario())
+
+
+def test_failed_attempts_are_retried_with_backoff(tmp_path):
+    async def scenario():
+        node = FakeNode((502, b"bad gateway"), (200, b'{"received": true, "error": true}'),
+                        ConnectionResetError("reset"))
+        queue = make_queue(tmp_path / "q.sqlite3", node, base_delay=0.05)
+        await queue.start()
+        try:
+            started = time.monotonic()
+            await queue.enqueue("POST", URL, HEADERS, notify("S1"))
+            await until(lambda: queue.delivered == 1)
+            # 0.05 + 0.1 + 0.2 seconds of backoff between the four attempts
+            assert time.monotonic() - started >= 0.35
+            assert (queue.attempts, queue.failures) == (4, 3)
+        finally:
+            await queue.aclose()
+        [row] = rows(tmp_path / "q.sqlite3")
+        assert (row["state"], row["attempts"], row["last_error"]) == ("delivered", 4, None)
+
+    asyncio.run(scenario())
+
+
+def test_unreachable_node_does_not_use_up_attempts(tmp_path):
+    async def scenario():
+        node = FakeNode(DeliveryDeferred(), DeliveryDeferred())
+        queue = make_queue(tmp_path / "q.sqlite3", node, max_attempts=1)
+        await queue.start()
+        try:
+            await queue.enqueue("POST", URL, HEADERS, notify("S1"))
+            await until(lambda: queue.delivered == 1)
+            assert (queue.deferred, queue.attempts) == (2, 1)
+        finally:
+            await queue.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_dead_letter_and_requeue(tmp_path):
+    async def scenario():
+        node = FakeNode((500, b"boom"), (500, b"boom"))
+        queue = make_queue(tmp_path / "q.sqlite3", node, max_attempts=2)
+        await queue.start()
+        try:
+            await queue.enqueue("POST", URL, HEADERS, notify("S1"))
+            await until(lambda: queue.dead_lettered == 1)
+            [dead] = await queue.dead_letters()
+            assert (dead["attempts"], dead["last_status"], dead["last_error"]) == (2, 500, "boom")
+            assert dead["body"] == notify("S1").decode()
+            assert not await queue.requeue(dead["id"] + 1)
+            assert await queue.requeue(dead["id"])
+            await until(lambda: queue.delivered == 1)
+            assert await queue.dead_letters() == []
+        finally:
+            await queue.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_callbacks_of_one_session_are_delivered_in_order(tmp_path):
+    async def scenario():
+        node = FakeNode((500, b"boom"))
+        queue = make_queue(tmp_path / "q.sqlite3", node, base_delay=0.1)
+        await queue.start()
+        try:
+            await queue.enqueue("POST", URL, HEADERS, notify("S1", "REVIEW"))
+            await queue.enqueue("POST", URL, HEADERS, notify("S1", "ACCEPT"))
+            await queue.enqueue("POST", URL, HEADERS, notify("S2"))
+            await until(lambda: queue.delivered == 3)
+        finally:
+            await queue.aclose()
+        # S2 goes ahead while S1 backs off, but S1's second callback waits for its first.
+        assert node.bodies == [
+            notify("S1", "REVIEW"), notify("S2"), notify("S1", "REVIEW"), notify("S1", "ACCEPT"),
+        ]
+
+    asyncio.run(scenario())
+
+
+def test_callback_is_redelivered_after_a_crash_mid_attempt(tmp_path):
+    async def scenario():
+        path = tmp_path / "q.sqlite3"
+        crashed = make_queue(path, FakeNode(), deliver=False, lease_seconds=0.3)
+        await crashed.start()
+        await crashed.enqueue("POST", URL, HEADERS, notify("S1"))
+        # Claimed, then the worker died before recording the attempt.
+        row, _ = await crashed._run_db(crashed._claim)
+        assert row is not None
+        leased_at = time.monotonic()
+
+        node = FakeNode()
+        queue = make_queue(path, node)
+        await queue.start()
+        try:
+            await until(lambda: queue.delivered == 1)
+            assert time.monotonic() - leased_at >= 0.25
+        finally:
+            await queue.aclose()
+            crashed._executor.shutdown(wait=True)
+        assert node.bodies == [notify("S1")]
+        [stored] = rows(path)
+        assert (stored["state"], stored["attempts"]) == ("delivered", 1)
+
+    asyncio.run(scenario())
+
+
+def test_clean_shutdown_releases_the_lease(tmp_path):
+    async def scenario():
+        path = tmp_path / "q.sqlite3"
+        stuck = FakeNode(delay=60.0)
+        first = make_queue(path, stuck, lease_seconds=60.0)
+        await first.start()
+        await first.enqueue("POST", URL, HEADERS, notify("S1"))
+        await asyncio.wait_for(stuck.started.wait(), 5.0)
+        await first.aclose()
+
+        node = FakeNode()
+        second = make_queue(path, node, lease_seconds=60.0)
+        await second.start()
+        try:
+            await until(lambda: second.delivered == 1, timeout=2.0)
+        finally:
+            await second.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_two_deliverers_never_send_a_callback_twice(tmp_path):
+    async def scenario():
+        path = tmp_path / "q.sqlite3"
+        node = FakeNode(delay=0.02)
+        queues = [make_queue(path, node, idle_interval=0.01) for _ in range(2)]
+        for queue in queues:
+            await queue.start()
+        try:
+            for number in range(20):
+                await queues[number % 2].enqueue("POST", URL, HEADERS, notify(f"S{number}"))
+            await until(lambda: sum(queue.delivered for queue in queues) == 20)
+            await asyncio.sleep(0.1)
+            # The lease keeps the session in line even with two deliverers.
+            await queues[0].enqueue("POST", URL, HEADERS, notify("S0", "REVIEW"))
+            await until(lambda: sum(queue.delivered for queue in queues) == 21)
+        finally:
+            for queue in queues:
+                await queue.aclose()
+        assert sorted(node.bodies) == sorted(
+            [notify(f"S{number}") for number in range(20)] + [notify("S0", "REVIEW")]
+        )
+        assert all(queue.delivered for queue in queues)
+        assert {row["state"] for row in rows(path)} == {"delivered"}
+
+    asyncio.run(scenario())
+
+
+def test_opens_queue_files_without_lease_columns(tmp_path):
+    path = tmp_path / "q.sqlite3"
+    db = sqlite3.connect(str(path))
+    db.execute(
+        "CREATE TABLE callbacks (id INTEGER PRIMARY KEY AUTOINCREMENT, dedupe_key TEXT NOT NULL"
+        " UNIQUE, order_key TEXT NOT NULL, method TEXT NOT NULL, url TEXT NOT NULL, headers TEXT"
+        " NOT NULL, body BLOB NOT NULL, state TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,"
+        " received_at REAL NOT NULL, next_attempt_at REAL NOT NULL, finished_at REAL,"
+        " last_status INTEGER, last_error TEXT)"
+    )
+    db.execute(
+        "INSERT INTO callbacks (dedupe_key, order_key, method, url, headers, body, state,"
+        " received_at, next_attempt_at) VALUES ('k', 'S1', 'POST', ?, '[]', ?, 'pending', 0, 0)",
+        (URL, notify("S1")),
+    )
+    db.commit()
+    db.close()
+
+    async def scenario():
+        node = FakeNode()
+        queue = make_queue(path, node)
+        await queue.start()
+        try:
+            await until(lambda: queue.delivered == 1)
+        finally:
+            await queue.aclose()
+        assert node.bodies == [notify("S1")]
+
+    asyncio.run(scenario())
@@ -0,0 +1,179 @@
+import asyncio
+import time
+
+import pytest
+
+from gateway import deadline
+from gateway.coalesce import SingleFlight
+from gateway.deadline import DeadlineExceeded, remaining
+
+
+async def with_deadline(seconds, call):
+    # Run as its own task, so the deadline stays in this caller's context.
+    if seconds is not None:
+        deadline._current.set(time.monotonic() + seconds)
+    return await call()
+
+
+def test_follower_is_not_bound_by_the_leaders_deadline():
+    async def scenario():
+        flight = SingleFlight()
+        seen = []
+
+        async def upstream():
+            seen.append(remaining())
+            await asyncio.sleep(0.2)
+            return "slots"
+
+        leader = asyncio.create_task(with_deadline(0.05, lambda: flight.do("k", upstream)))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(with_deadline(None, lambda: flight.do("k", upstream)))
+        with pytest.raises(DeadlineExceeded):
+            await leader
+        assert await follower == "slots"
+        # The shared call ran once, without the leader's deadline.
+        assert seen == [None]
+        assert (flight.leaders, flight.coalesced) == (1, 1)
+
+    asyncio.run(scenario())
+
+
+def test_each_caller_waits_up_to_its_own_deadline():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def upstream():
+            await asyncio.sleep(0.1)
+            return "slots"
+
+        leader = asyncio.create_task(with_deadline(1.0, lambda: flight.do("k", upstream)))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(with_deadline(0.02, lambda: flight.do("k", upstream)))
+        with pytest.raises(DeadlineExceeded):
+            await follower
+        assert await leader == "slots"
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_callers_share_one_call():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def upstream():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "slots"
+
+        results = await asyncio.gather(*(flight.do("k", upstream) for _ in range(5)))
+        assert results == ["slots"] * 5
+        assert len(calls) == 1
+        assert flight.stats()["requests"] == 5
+        assert (flight.leaders, flight.coalesced) == (1, 4)
+
+    asyncio.run(scenario())
+
+
+def test_different_keys_are_not_shared():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def upstream(value):
+            await asyncio.sleep(0.01)
+            return value
+
+        results = await asyncio.gather(
+            flight.do("a", lambda: upstream("a")), flight.do("b", lambda: upstream("b"))
+        )
+        assert results == ["a", "b"]
+        assert flight.leaders == 2
+
+    asyncio.run(scenario())
+
+
+def test_key_is_cleared_after_completion():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def upstream():
+            calls.append(1)
+            return len(calls)
+
+        assert await flight.do("k", upstream) == 1
+        assert flight.stats()["in_flight_keys"] == 0
+        assert await flight.do("k", upstream) == 2
+        assert flight.leaders == 2
+
+    asyncio.run(scenario())
+
+
+def test_exception_reaches_every_caller_and_clears_the_key():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise ConnectionError("node down")
+
+        results = await asyncio.gather(
+            *(flight.do("k", failing) for _ in range(3)), return_exceptions=True
+        )
+        assert [type(result) for result in results] == [ConnectionError] * 3
+        assert flight.calls == {}
+
+        async def recovered():
+            return "slots"
+
+        assert await flight.do("k", recovered) == "slots"
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("cancelled", ["leader", "follower"])
+def test_cancelled_caller_does_not_cancel_the_shared_call(cancelled):
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def upstream():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "slots"
+
+        leader = asyncio.create_task(flight.do("k", upstream))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("k", upstream))
+        await asyncio.sleep(0.01)
+        gone, waiting = (leader, follower) if cancelled == "leader" else (follower, leader)
+        gone.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await gone
+        assert await waiting == "slots"
+        assert len(calls) == 1
+        assert flight.calls == {}
+
+    asyncio.run(scenario())
+
+
+def test_abandoned_call_finishes_and_clears_the_key():
+    async def scenario():
+        flight = SingleFlight()
+        finished = asyncio.Event()
+
+        async def failing():
+            await asyncio.sleep(0.01)
+            finished.set()
+            raise ConnectionError("node down")
+
+        caller = asyncio.create_task(flight.do("k", failing))
+        await asyncio.sleep(0)
+        caller.cancel()
+        await asyncio.gather(caller, return_exceptions=True)
+        await finished.wait()
+        await asyncio.sleep(0)
+        # Nobody was left to see the exception; the key is free again.
+        assert flight.calls == {}
+
+    asyncio.run(scenario())
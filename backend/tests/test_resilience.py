@@ -0,0 +1,212 @@
+import pytest
+
+from gateway import resilience
+from gateway.resilience import CircuitBreaker, CircuitOpen, HedgePolicy, RetryBudget, RetryPolicy
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience, "time", clock)
+    return clock
+
+
+def breaker(**kwargs):
+    options = dict(window=10.0, min_requests=4, error_ratio=0.5, slow_ratio=0.5,
+                   open_seconds=5.0, half_open_probes=2)
+    options.update(kwargs)
+    return CircuitBreaker("node-1", **options)
+
+
+def call(breaker, failed=False, slow=False):
+    probe = breaker.allow()
+    breaker.record(probe, failed, slow)
+    return probe
+
+
+def trip(breaker):
+    for _ in range(breaker.min_requests):
+        call(breaker, failed=True)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_stays_closed_below_min_requests(clock):
+    circuit = breaker()
+    for _ in range(3):
+        assert call(circuit, failed=True) is False
+    assert circuit.state == CircuitBreaker.CLOSED
+
+
+def test_stays_closed_below_error_ratio(clock):
+    circuit = breaker()
+    for failed in (True, False, False, False, True, False, False):
+        call(circuit, failed=failed)
+    assert circuit.state == CircuitBreaker.CLOSED
+    assert circuit.stats()["window_failures"] == 2
+
+
+def test_opens_on_error_ratio(clock):
+    circuit = breaker()
+    for failed in (True, False, True, True):
+        call(circuit, failed=failed)
+    assert circuit.state == CircuitBreaker.OPEN
+    assert circuit.opened_total == 1
+    assert circuit.stats()["state_value"] == 2
+    assert circuit.stats()["window_calls"] == 0
+
+
+def test_opens_on_slow_ratio(clock):
+    circuit = breaker()
+    for _ in range(4):
+        call(circuit, slow=True)
+    assert circuit.state == CircuitBreaker.OPEN
+
+
+def test_old_calls_leave_the_window(clock):
+    circuit = breaker()
+    for _ in range(3):
+        call(circuit, failed=True)
+    clock.now += 11
+    for _ in range(3):
+        call(circuit)
+    assert circuit.state == CircuitBreaker.CLOSED
+    assert circuit.failures == 0
+    assert len(circuit.calls) == 3
+
+
+def test_open_rejects_until_open_seconds(clock):
+    circuit = breaker()
+    trip(circuit)
+    clock.now += 1.5
+    assert not circuit.available()
+    with pytest.raises(CircuitOpen) as info:
+        circuit.allow()
+    assert info.value.retry_after == 4
+    assert circuit.rejected_total == 1
+
+
+def test_calls_started_before_opening_are_ignored(clock):
+    circuit = breaker()
+    trip(circuit)
+    circuit.record(False, failed=False)
+    assert circuit.state == CircuitBreaker.OPEN
+    assert len(circuit.calls) == 0
+
+
+def test_half_open_limits_probes(clock):
+    circuit = breaker()
+    trip(circuit)
+    clock.now += 5
+    assert circuit.available()
+    assert circuit.allow() is True
+    assert circuit.state == CircuitBreaker.HALF_OPEN
+    assert circuit.allow() is True
+    with pytest.raises(CircuitOpen) as info:
+        circuit.allow()
+    assert info.value.retry_after == 1
+
+
+def test_half_open_closes_after_successful_probes(clock):
+    circuit = breaker()
+    trip(circuit)
+    clock.now += 5
+    assert call(circuit) is True
+    assert circuit.state == CircuitBreaker.HALF_OPEN
+    assert call(circuit) is True
+    assert circuit.state == CircuitBreaker.CLOSED
+    assert circuit.allow() is False
+
+
+@pytest.mark.parametrize("outcome", [{"failed": True}, {"slow": True}])
+def test_half_open_reopens_on_a_bad_probe(clock, outcome):
+    circuit = breaker()
+    trip(circuit)
+    clock.now += 5
+    call(circuit)
+    call(circuit, **outcome)
+    assert circuit.state == CircuitBreaker.OPEN
+    assert circuit.opened_total == 2
+    assert circuit.opened_at == clock.now
+    with pytest.raises(CircuitOpen):
+        circuit.allow()
+
+
+def test_cancelled_probe_frees_its_slot(clock):
+    circuit = breaker(half_open_probes=1)
+    trip(circuit)
+    clock.now += 5
+    probe = circuit.allow()
+    with pytest.raises(CircuitOpen):
+        circuit.allow()
+    circuit.cancelled(probe)
+    assert circuit.allow() is True
+
+
+def test_disabled_breaker_never_opens(clock):
+    circuit = breaker(enabled=False)
+    for _ in range(10):
+        assert call(circuit, failed=True) is False
+    assert circuit.state == CircuitBreaker.CLOSED
+    assert circuit.opened_total == 0
+
+
+def test_retry_budget_starts_full_and_refills_from_first_attempts():
+    budget = RetryBudget(0.25, capacity=2.0)
+    assert budget.withdraw() and budget.withdraw()
+    assert not budget.withdraw()
+    for _ in range(3):
+        budget.deposit()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
+    assert budget.tokens == 0.0
+
+
+def test_retry_budget_is_capped():
+    budget = RetryBudget(0.5, capacity=1.0)
+    for _ in range(10):
+        budget.deposit()
+    assert budget.tokens == 1.0
+
+
+def test_retry_policy_limits_attempts_and_budget():
+    policy = RetryPolicy(max_retries=2, budget_ratio=0.1)
+    policy.budget.tokens = 2.0
+    assert policy.should_retry(1)
+    assert policy.should_retry(2)
+    # Over max_retries: refused without touching the budget.
+    assert not policy.should_retry(3)
+    assert policy.exhausted == 0
+    assert not policy.should_retry(1)
+    assert policy.exhausted == 1
+    assert policy.stats()["retries"] == 2
+
+
+def test_retry_backoff_is_full_jitter_within_the_cap(monkeypatch):
+    policy = RetryPolicy(base_delay=0.05, max_delay=0.3)
+    monkeypatch.setattr(resilience.random, "uniform", lambda low, high: (low, high))
+    assert policy.backoff(1) == (0, 0.05)
+    assert policy.backoff(3) == (0, 0.2)
+    assert policy.backoff(10) == (0, 0.3)
+
+
+def test_hedge_delay_needs_history():
+    policy = HedgePolicy(enabled=True, min_samples=5, min_delay=0.01, max_delay=1.0)
+    for _ in range(4):
+        policy.record("/api/gallery", 0.1)
+    assert policy.delay_for("/api/gallery") is None
+    policy.record("/api/gallery", 0.1)
+    assert policy.delay_for("/api/gallery") == 0.1
+    assert policy.delay_for("/api/other") is None
+    assert HedgePolicy(enabled=False).delay_for("/api/gallery") is None
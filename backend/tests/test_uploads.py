@@ -0,0 +1,160 @@
+import os
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from gateway.uploads import UploadFiles, parse_range
+
+CONTENT = bytes(range(256)) * 4  # 1024 bytes
+
+
+@pytest.fixture
+def uploads(tmp_path):
+    directory = tmp_path / "uploads"
+    directory.mkdir()
+    (directory / "photo.webp").write_bytes(CONTENT)
+    (directory / "nested").mkdir()
+    (directory / "nested" / "thumb.webp").write_bytes(b"thumb")
+    (tmp_path / "secret.txt").write_bytes(b"secret")
+    return UploadFiles(str(directory))
+
+
+@pytest.fixture
+def client(uploads):
+    app = FastAPI()
+
+    # Same route shape as server.py's serve_upload.
+    @app.api_route("/api/uploads/{name:path}", methods=["GET", "HEAD"])
+    async def serve_upload(request: Request, name: str):
+        return await uploads.serve(request, name)
+
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("items=0-10", None),
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 1023)),
+    ("bytes=1000-5000", (1000, 1023)),
+    ("bytes=-100", (924, 1023)),
+    ("bytes=-5000", (0, 1023)),
+    ("bytes= 10 - 20 ", (10, 20)),
+    # Multipart ranges and malformed specs are ignored: the full file is served.
+    ("bytes=0-10,20-30", None),
+    ("bytes=10", None),
+    ("bytes=a-b", None),
+    ("bytes=-x", None),
+    # Well-formed but outside the file.
+    ("bytes=1024-", "unsatisfiable"),
+    ("bytes=2000-3000", "unsatisfiable"),
+    ("bytes=20-10", "unsatisfiable"),
+    ("bytes=-0", "unsatisfiable"),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, len(CONTENT)) == expected
+
+
+@pytest.mark.parametrize("name", [
+    "",
+    "../secret.txt",
+    "nested/../../secret.txt",
+    "/etc/passwd",
+    ".",
+    "nested/..",
+    "photo.webp\x00.png",
+    "..\\secret.txt",
+])
+def test_resolve_rejects_names_outside_the_directory(uploads, name):
+    assert uploads.resolve(name) is None
+
+
+def test_resolve_accepts_nested_names(uploads):
+    assert uploads.resolve("nested/thumb.webp") == os.path.join(
+        uploads.directory, "nested", "thumb.webp"
+    )
+    assert uploads.resolve("nested/../photo.webp") == os.path.join(uploads.directory, "photo.webp")
+
+
+def test_resolve_rejects_symlinks_that_escape(uploads, tmp_path):
+    os.symlink(tmp_path / "secret.txt", os.path.join(uploads.directory, "link.txt"))
+    os.symlink(tmp_path, os.path.join(uploads.directory, "parent"))
+    assert uploads.resolve("link.txt") is None
+    assert uploads.resolve("parent/secret.txt") is None
+
+
+def test_resolve_follows_symlinks_inside_the_directory(uploads):
+    os.symlink(
+        os.path.join(uploads.directory, "photo.webp"), os.path.join(uploads.directory, "alias.webp")
+    )
+    assert uploads.resolve("alias.webp") == os.path.join(uploads.directory, "photo.webp")
+
+
+@pytest.mark.parametrize("path", [
+    "/api/uploads/..%2fsecret.txt",
+    "/api/uploads/..%2Fsecret.txt",
+    "/api/uploads/nested%2f..%2f..%2fsecret.txt",
+    "/api/uploads/%2e%2e%2fsecret.txt",
+    "/api/uploads/nested",
+    "/api/uploads/missing.webp",
+])
+def test_serve_does_not_leave_the_directory(client, uploads, path):
+    response = client.get(path)
+    assert response.status_code == 404
+    assert b"secret" not in response.content
+    assert uploads.not_found >= 1
+
+
+def test_serve_full_file(client):
+    response = client.get("/api/uploads/photo.webp")
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["accept-ranges"] == "bytes"
+    assert "immutable" in response.headers["cache-control"]
+
+
+def test_serve_single_range(client):
+    response = client.get("/api/uploads/photo.webp", headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.content == CONTENT[10:20]
+    assert response.headers["content-range"] == "bytes 10-19/1024"
+    assert response.headers["content-length"] == "10"
+
+
+def test_serve_suffix_range(client):
+    response = client.get("/api/uploads/photo.webp", headers={"Range": "bytes=-24"})
+    assert response.status_code == 206
+    assert response.content == CONTENT[-24:]
+    assert response.headers["content-range"] == "bytes 1000-1023/1024"
+
+
+def test_serve_multiple_ranges_as_full_file(client):
+    response = client.get("/api/uploads/photo.webp", headers={"Range": "bytes=0-1,5-6"})
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+
+@pytest.mark.parametrize("header", ["bytes=1024-", "bytes=5-1", "bytes=-0"])
+def test_serve_unsatisfiable_range(client, header):
+    response = client.get("/api/uploads/photo.webp", headers={"Range": header})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */1024"
+
+
+def test_serve_ignores_range_when_if_range_does_not_match(client):
+    etag = client.get("/api/uploads/photo.webp").headers["etag"]
+    stale = client.get(
+        "/api/uploads/photo.webp", headers={"Range": "bytes=0-9", "If-Range": '"stale"'}
+    )
+    assert stale.status_code == 200
+    fresh = client.get("/api/uploads/photo.webp", headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert fresh.status_code == 206
+
+
+def test_serve_not_modified(client):
+    etag = client.get("/api/uploads/photo.webp").headers["etag"]
+    response = client.get("/api/uploads/photo.webp", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
@@ -0,0 +1,95 @@
+import os
+import types
+
+import anyio
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from gateway import variants as variants_module
+from gateway.uploads import UploadFiles
+from gateway.variants import ImageVariants, snap_quality, snap_width
+
+pytest.importorskip("PIL")
+
+ORIGINAL = b"original image bytes"
+VARIANT = b"variant"
+
+
+@pytest.fixture
+def variants(tmp_path):
+    uploads_dir = tmp_path / "uploads"
+    uploads_dir.mkdir()
+    (uploads_dir / "photo.webp").write_bytes(ORIGINAL)
+    image_variants = ImageVariants(UploadFiles(str(uploads_dir)), str(tmp_path / "variants"))
+    yield image_variants
+    image_variants.close()
+
+
+@pytest.fixture
+def client(variants):
+    app = FastAPI()
+
+    @app.get("/api/uploads/{name:path}")
+    async def serve_upload(request: Request, name: str):
+        return await variants.serve(request, name)
+
+    return TestClient(app)
+
+
+def cached_variant(variants, width=480, quality=75):
+    """Put a rendered variant of photo.webp in the disk cache, as a previous render would."""
+    source = os.path.join(variants.uploads.directory, "photo.webp")
+    destination = variants.variant_path(source, os.stat(source), width, quality)
+    os.makedirs(variants.cache_dir, exist_ok=True)
+    with open(destination, "wb") as file:
+        file.write(VARIANT)
+    return destination
+
+
+def test_snapping():
+    assert snap_width(1) == 160
+    assert snap_width(481) == 640
+    assert snap_width(10000) == 1920
+    assert snap_quality(5) == 30
+    assert snap_quality(72) == 70
+    assert snap_quality(100) == 90
+
+
+def test_serves_a_cached_variant(variants, client):
+    cached_variant(variants)
+    response = client.get("/api/uploads/photo.webp?w=400&q=74")
+    assert response.status_code == 200
+    assert response.content == VARIANT
+    assert response.headers["etag"].endswith('-w480-q75"')
+    assert variants.hits == 1
+
+
+def test_variant_deleted_from_disk_falls_back_to_the_original(variants, client):
+    destination = cached_variant(variants)
+    client.get("/api/uploads/photo.webp?w=480")  # loads the index
+    size = variants._bytes
+    os.unlink(destination)
+    response = client.get("/api/uploads/photo.webp?w=480")
+    assert response.status_code == 200
+    assert response.content == ORIGINAL
+    assert destination not in variants._index
+    assert variants._bytes == size - len(VARIANT)
+
+
+def test_variant_evicted_while_its_stat_is_pending(variants, client, monkeypatch):
+    destination = cached_variant(variants)
+
+    async def run_sync(function, *args):
+        result = await anyio.to_thread.run_sync(function, *args)
+        if args == (destination,):
+            # Another request's render evicts this variant meanwhile.
+            os.unlink(destination)
+            del variants._index[destination]
+        return result
+
+    to_thread = types.SimpleNamespace(run_sync=run_sync)
+    monkeypatch.setattr(variants_module, "anyio", types.SimpleNamespace(to_thread=to_thread))
+    response = client.get("/api/uploads/photo.webp?w=480")
+    assert response.status_code == 200
+    assert response.content == ORIGINAL
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""Cold-start benchmark: process start to the first proxied 200.
+
+Repeatedly starts `uvicorn server:app` with `NODE_COMMAND` pointing at
+`stub_upstream.py --scenario --startup-delay X`, so the gateway spawns and
+supervises the stub exactly as it would Node, and polls a proxied route
+until it answers 200. Each variant (`--variants`) is one gateway
+configuration; `fast` starts Node before FastAPI is imported
+(`GATEWAY_FAST_START=1`), `default` does not. Reported per variant:
+time to `/readyz` and time to the first proxied 200, as latency summaries
+that `results.py compare` understands.
+
+Usage:
+  python tests/performance/bench_cold_start.py --runs 10 --node-delay 1.5 --save
+  python tests/performance/bench_cold_start.py --variants fast --route /api/gallery
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from bench_scenarios import BACKEND_DIR, HERE, free_port
+from loadgen import LogHistogram
+from results import add_save_arguments, maybe_save
+
+VARIANTS = {
+    "default": {"GATEWAY_FAST_START": "0"},
+    "fast": {"GATEWAY_FAST_START": "1"},
+}
+
+
+def status_of(url):
+    try:
+        with urllib.request.urlopen(url, timeout=1.0) as response:
+            return response.status
+    except urllib.error.HTTPError as exc:
+        return exc.code
+    except OSError:
+        return None
+
+
+def cold_start(port, node_port, route, node_delay, extra_env, timeout):
+    """(seconds to /readyz 200, seconds to the first proxied 200) for one fresh gateway."""
+    node_command = (
+        f"{sys.executable} {os.path.join(HERE, 'stub_upstream.py')} --scenario "
+        f"--latency-scale 0 --startup-delay {node_delay}"
+    )
+    env = dict(os.environ, NODE_COMMAND=node_command, NODE_PORT=str(node_port), **extra_env)
+    env.pop("NODE_EXTERNAL", None)
+    base = f"http://127.0.0.1:{port}"
+    started = time.monotonic()
+    gateway = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1",
+        "--port", str(port), "--log-level", "warning",
+    ], cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL)
+    ready = first = None
+    try:
+        while first is None or ready is None:
+            if time.monotonic() - started > timeout:
+                raise SystemExit(f"gateway did not serve {route} within {timeout:.0f}s")
+            if gateway.poll() is not None:
+                raise SystemExit(f"gateway exited with code {gateway.returncode}")
+            if ready is None and status_of(f"{base}/readyz") == 200:
+                ready = time.monotonic() - started
+            if first is None and status_of(f"{base}{route}") == 200:
+                first = time.monotonic() - started
+            time.sleep(0.005)
+    finally:
+        gateway.terminate()
+        try:
+            gateway.wait(timeout=20)
+        except subprocess.TimeoutExpired:
+            gateway.kill()
+    return ready, first
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5, help="cold starts per variant")
+    parser.add_argument("--variants", default="default,fast",
+                        help=f"comma-separated, from {', '.join(VARIANTS)}")
+    parser.add_argument("--node-delay", type=float, default=1.0,
+                        help="seconds the stub waits before listening (Node boot time)")
+    parser.add_argument("--route", default="/api/payments/hourly-pricing")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--env", action="append", default=[],
+                        help="KEY=VALUE passed to the gateway (repeatable)")
+    add_save_arguments(parser)
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.variants.split(",") if name.strip()]
+    for name in names:
+        if name not in VARIANTS:
+            raise SystemExit(f"Unknown variant {name!r}")
+    extra_env = dict(item.split("=", 1) for item in args.env)
+
+    result = {
+        "runs": args.runs,
+        "node_delay_seconds": args.node_delay,
+        "route": args.route,
+        "gateway_env": extra_env,
+        "variants": {},
+    }
+    for name in names:
+        to_ready, to_first = LogHistogram(), LogHistogram()
+        for _ in range(args.runs):
+            ready, first = cold_start(
+                free_port(), free_port(), args.route, args.node_delay,
+                dict(extra_env, **VARIANTS[name]), args.timeout,
+            )
+            to_ready.record(int(ready * 1e6))
+            to_first.record(int(first * 1e6))
+        result["variants"][name] = {
+            "env": VARIANTS[name],
+            "readyz": {"requests": args.runs, "latency_seconds": to_ready.summary()},
+            "first_response": {"requests": args.runs, "latency_seconds": to_first.summary()},
+        }
+        summary = to_first.summary()
+        print(f"{name}: first 200 p50 {summary['p50'] * 1000:.0f} ms, "
+              f"p90 {summary['p90'] * 1000:.0f} ms", file=sys.stderr)
+
+    print(json.dumps(result, indent=2))
+    maybe_save(args, "cold_start", result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""Measure gateway response compression on payloads shaped like the real routes.
+
+Builds synthetic JSON bodies resembling `/api/admin/customers`,
+`/api/admin/bookings/hourly` and `/api/slots/available`, pushes them through
+the gateway's `CompressionMiddleware` (both as one body and as a chunked
+stream, the way proxied Node responses arrive) and reports bytes saved and
+CPU time per route and encoding.
+
+Usage:
+  python tests/performance/bench_compression.py --rows 500 --rounds 50
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+from statistics import mean
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(HERE, "..", "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+from gateway.compression import CompressionMiddleware, CompressionStats, brotli  # noqa: E402
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil((p / 100.0) * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def customers_payload(rows, rng):
+    names = ["Ahmad", "Lina", "Omar", "Sara", "Yousef", "Huda", "Khaled", "Rana"]
+    return {"customers": [{
+        "id": f"{rng.getrandbits(96):024x}",
+        "name": f"{rng.choice(names)} {rng.choice(names)}",
+        "email": f"customer{index}@example.com",
+        "phone": f"+9627{rng.randint(10000000, 99999999)}",
+        "children": [{"name": rng.choice(names), "birthday": f"20{rng.randint(15, 23)}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}"}],
+        "created_at": f"2025-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}T10:{rng.randint(10, 59)}:00.000Z",
+        "total_bookings": rng.randint(0, 40),
+    } for index in range(rows)]}
+
+
+def hourly_bookings_payload(rows, rng):
+    statuses = ["confirmed", "checked_in", "completed", "cancelled"]
+    return {"bookings": [{
+        "id": f"{rng.getrandbits(96):024x}",
+        "user_id": f"{rng.getrandbits(96):024x}",
+        "date": f"2025-10-{rng.randint(10, 28)}",
+        "start_time": f"{rng.randint(10, 21)}:00",
+        "duration_hours": rng.choice([1, 2, 3]),
+        "kids_count": rng.randint(1, 4),
+        "status": rng.choice(statuses),
+        "payment_method": rng.choice(["cash", "card", "cliq"]),
+        "amount": rng.choice([7, 10, 14, 20]),
+    } for _ in range(rows)]}
+
+
+def slots_payload(rows, rng):
+    return {"date": "2025-10-20", "slots": [{
+        "id": f"{rng.getrandbits(96):024x}",
+        "start_time": f"{10 + index % 12}:{(index * 15) % 60:02d}",
+        "end_time": f"{11 + index % 12}:{(index * 15) % 60:02d}",
+        "capacity": 30,
+        "booked": rng.randint(0, 30),
+        "available": True,
+    } for index in range(rows)]}
+
+
+ROUTES = {
+    "/api/admin/customers": customers_payload,
+    "/api/admin/bookings/hourly": hourly_bookings_payload,
+    "/api/slots/available": slots_payload,
+}
+
+
+def body_app(body, chunk_size):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"application/json; charset=utf-8"),
+        ]})
+        if not chunk_size:
+            await send({"type": "http.response.body", "body": body, "more_body": False})
+            return
+        for offset in range(0, len(body), chunk_size):
+            await send({
+                "type": "http.response.body",
+                "body": body[offset:offset + chunk_size],
+                "more_body": offset + chunk_size < len(body),
+            })
+    return app
+
+
+async def run_one(middleware, encoding):
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", encoding.encode())]}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await middleware(scope, receive, send)
+
+
+async def bench_route(body, encoding, chunk_size, rounds, args):
+    stats = CompressionStats()
+    middleware = CompressionMiddleware(
+        body_app(body, chunk_size), gzip_level=args.gzip_level,
+        brotli_quality=args.brotli_quality, stats=stats,
+    )
+    timings = []
+    for _ in range(rounds):
+        before = stats.cpu_seconds.get(encoding, 0.0)
+        await run_one(middleware, encoding)
+        timings.append(stats.cpu_seconds.get(encoding, 0.0) - before)
+    timings.sort()
+    bytes_in = stats.bytes_in.get(encoding, 0) // rounds
+    bytes_out = stats.bytes_out.get(encoding, 0) // rounds
+    return {
+        "bytes_in": bytes_in,
+        "bytes_out": bytes_out,
+        "bytes_saved_ratio": 1 - bytes_out / bytes_in if bytes_in else 0,
+        "cpu_ms": {
+            "avg": mean(timings) * 1000 if timings else 0,
+            "p50": percentile(timings, 50) * 1000,
+            "p99": percentile(timings, 99) * 1000,
+        },
+    }
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    encodings = ["gzip", "br"] if brotli is not None else ["gzip"]
+    results = {}
+    for route, build in ROUTES.items():
+        body = json.dumps(build(args.rows, rng)).encode()
+        results[route] = {"body_bytes": len(body)}
+        for encoding in encodings:
+            results[route][encoding] = {
+                "whole": await bench_route(body, encoding, 0, args.rounds, args),
+                "streamed": await bench_route(body, encoding, args.chunk_size, args.rounds, args),
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--chunk-size", type=int, default=16 * 1024,
+                        help="body chunk size for the streamed run")
+    parser.add_argument("--gzip-level", type=int, default=6)
+    parser.add_argument("--brotli-quality", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(json.dumps({
+        "rows": args.rows,
+        "gzip_level": args.gzip_level,
+        "brotli_quality": args.brotli_quality,
+        "brotli_available": brotli is not None,
+        "routes": asyncio.run(run(args)),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
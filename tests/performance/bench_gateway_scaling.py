@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""Scaling benchmark: gateway throughput with 1..N worker processes.
+
+For every worker count, starts `backend/cluster.py` (SO_REUSEPORT workers,
+`NODE_EXTERNAL=1`) in front of `stub_upstream.py --scenario` and drives it
+closed-loop with the scenario route mix from `bench_scenarios.py`. The load
+generator itself is single-threaded, so it is split over `--load-processes`
+processes whose histograms are merged; give it cores of its own, otherwise
+the client is what stops scaling. The stub's route latencies are scaled by
+`--latency-scale` (default 0), so the gateway's own CPU cost is what is
+measured. `--mode uvicorn` runs `uvicorn --workers` instead, for comparison.
+
+Usage:
+  python tests/performance/bench_gateway_scaling.py --workers 1,2,4 --requests 50000 --save
+  python tests/performance/bench_gateway_scaling.py --mode uvicorn --workers 1,4
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+
+from bench_scenarios import (
+    ADMIN_TOKEN,
+    BACKEND_DIR,
+    fetch_json,
+    free_port,
+    gateway_ready,
+    parse_mix,
+    request_mix,
+    scenario_routes,
+    start_gateway,
+    start_stub,
+    wait_for,
+)
+from loadgen import LogHistogram, Recorder, Target, install_fast_loop, run_closed_loop
+from results import add_save_arguments, maybe_save
+
+
+def start_cluster(port, node_port, extra_env, workers):
+    env = dict(os.environ, NODE_EXTERNAL="1", NODE_PORT=str(node_port),
+               GATEWAY_ADMIN_TOKEN=ADMIN_TOKEN, **extra_env)
+    return subprocess.Popen([
+        sys.executable, "cluster.py", "--workers", str(workers), "--host", "127.0.0.1",
+        "--port", str(port),
+    ], cwd=BACKEND_DIR, env=env, stdout=sys.stderr)
+
+
+def load_process(url, concurrency, total, timeout, mix, seed):
+    install_fast_loop()
+    routes = scenario_routes()
+    recorder, duration, _ = asyncio.run(run_closed_loop(
+        Target(url), concurrency, total, timeout=timeout,
+        requests=request_mix(parse_mix(mix, routes), routes, seed),
+    ))
+    return recorder, duration
+
+
+def merge(recorders):
+    merged = Recorder(window=0)
+    for recorder in recorders:
+        merged.histogram.merge(recorder.histogram)
+        merged.success += recorder.success
+        merged.failed += recorder.failed
+        for source, target in ((recorder.statuses, merged.statuses), (recorder.errors, merged.errors)):
+            for key, count in source.items():
+                target[key] = target.get(key, 0) + count
+        for label, stats in recorder.labels.items():
+            into = merged.labels.setdefault(
+                label, {"histogram": LogHistogram(), "statuses": {}, "failed": 0}
+            )
+            into["histogram"].merge(stats["histogram"])
+            into["failed"] += stats["failed"]
+            for key, count in stats["statuses"].items():
+                into["statuses"][key] = into["statuses"].get(key, 0) + count
+    return merged
+
+
+def drive(pool, url, args, total, seed):
+    per_process = max(1, total // args.load_processes)
+    concurrency = max(1, args.concurrency // args.load_processes)
+    outcomes = pool.starmap(load_process, [
+        (url, concurrency, per_process, args.timeout, args.mix, seed + index)
+        for index in range(args.load_processes)
+    ])
+    recorder = merge(recorder for recorder, _ in outcomes)
+    duration = max(duration for _, duration in outcomes)
+    return {
+        "requests": recorder.histogram.count,
+        "failed": recorder.failed,
+        "duration_seconds": duration,
+        "throughput_rps": recorder.histogram.count / duration if duration else 0,
+        "statuses": recorder.statuses,
+        "errors": recorder.errors,
+        "latency_seconds": recorder.histogram.summary(),
+        "routes": recorder.label_summaries(duration),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default=",".join(
+        str(count) for count in (1, 2, 4, 8) if count <= (os.cpu_count() or 1)
+    ) or "1", help="comma-separated worker counts")
+    parser.add_argument("--mode", choices=("cluster", "uvicorn"), default="cluster")
+    parser.add_argument("--requests", type=int, default=20000, help="measured requests per worker count")
+    parser.add_argument("--warmup", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=256)
+    parser.add_argument("--load-processes", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--mix", default="", help="route=weight,... (default: built-in weights)")
+    parser.add_argument("--latency-scale", type=float, default=0.0,
+                        help="multiply the stub's per-route latencies")
+    parser.add_argument("--env", action="append", default=[],
+                        help="KEY=VALUE passed to the gateway (repeatable)")
+    parser.add_argument("--seed", type=int, default=7)
+    add_save_arguments(parser)
+    args = parser.parse_args()
+
+    counts = [int(count) for count in args.workers.split(",") if count.strip()]
+    parse_mix(args.mix, scenario_routes())  # fail early on a bad --mix
+    extra_env = dict(item.split("=", 1) for item in args.env)
+    start = start_cluster if args.mode == "cluster" else start_gateway
+
+    stub_port = free_port()
+    stub = start_stub(stub_port, args.latency_scale)
+    result = {
+        "mode": args.mode,
+        "latency_scale": args.latency_scale,
+        "gateway_env": extra_env,
+        "cpu_count": os.cpu_count(),
+        "workers": {},
+    }
+    pool = multiprocessing.get_context("spawn").Pool(args.load_processes)
+    try:
+        wait_for(f"http://127.0.0.1:{stub_port}/healthz")
+        for count in counts:
+            port = free_port()
+            gateway = start(port, stub_port, extra_env, count)
+            try:
+                base = f"http://127.0.0.1:{port}"
+                wait_for(f"{base}/readyz", check=gateway_ready)
+                if args.warmup:
+                    drive(pool, f"{base}/", args, args.warmup, args.seed + 1000)
+                run = drive(pool, f"{base}/", args, args.requests, args.seed)
+                run["node_workers_ready"] = fetch_json(f"{base}/api/gateway/node")["workers_ready"]
+                result["workers"][str(count)] = run
+                print(f"{count} workers: {run['throughput_rps']:.0f} req/s, "
+                      f"p50 {run['latency_seconds']['p50'] * 1000:.2f} ms, "
+                      f"p99 {run['latency_seconds']['p99'] * 1000:.2f} ms", file=sys.stderr)
+            finally:
+                gateway.terminate()
+                try:
+                    gateway.wait(timeout=20)
+                except subprocess.TimeoutExpired:
+                    gateway.kill()
+    finally:
+        pool.close()
+        pool.join()
+        stub.terminate()
+        stub.wait(timeout=10)
+
+    base_rps = result["workers"].get(str(counts[0]), {}).get("throughput_rps")
+    if base_rps:
+        result["speedup"] = {
+            count: run["throughput_rps"] / base_rps for count, run in result["workers"].items()
+        }
+    print(json.dumps(result, indent=2))
+    maybe_save(args, "gateway_scaling", result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""Compare TCP and Unix domain socket transports for the gateway -> Node hop.
+
+Starts `stub_upstream.py` once on a loopback TCP port and once on a Unix
+socket, then drives each through the gateway's pooled `UpstreamClient`.
+
+Usage:
+  python tests/performance/bench_gateway_transport.py --requests 20000 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from statistics import mean
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(HERE, "..", "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+from gateway.upstream import UpstreamClient  # noqa: E402
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil((p / 100.0) * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_stub(args, payload_bytes):
+    cmd = [sys.executable, os.path.join(HERE, "stub_upstream.py"),
+           "--payload-bytes", str(payload_bytes)] + args
+    return subprocess.Popen(cmd)
+
+
+async def wait_ready(client, attempts=100):
+    for _ in range(attempts):
+        try:
+            response = await client.request("GET", "/healthz")
+            if response.status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.05)
+    raise RuntimeError(f"stub upstream at {client.uds or client.base_url} did not start")
+
+
+async def drive(client, requests, concurrency):
+    latencies = []
+    errors = 0
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index, errors
+        while next_index < requests:
+            next_index += 1
+            start = time.perf_counter()
+            try:
+                response = await client.request("GET", "/api/payments/hourly-pricing")
+                ok = response.status_code == 200
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            if not ok:
+                errors += 1
+
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall_time = time.perf_counter() - wall_start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "duration_seconds": wall_time,
+        "throughput_rps": len(latencies) / wall_time if wall_time else 0,
+        "latency_ms": {
+            "avg": mean(latencies) * 1000 if latencies else 0,
+            "p50": percentile(latencies, 50) * 1000,
+            "p95": percentile(latencies, 95) * 1000,
+            "p99": percentile(latencies, 99) * 1000,
+            "max": latencies[-1] * 1000 if latencies else 0,
+        },
+    }
+
+
+async def bench_transport(name, client, requests, concurrency, warmup):
+    await client.start()
+    try:
+        await wait_ready(client)
+        await drive(client, warmup, concurrency)
+        result = await drive(client, requests, concurrency)
+        result["connections_opened"] = client.connections_opened
+        return name, result
+    finally:
+        await client.aclose()
+
+
+async def run(args):
+    port = free_port()
+    uds_path = os.path.join(tempfile.mkdtemp(prefix="peekaboo-bench-"), "node.sock")
+    stubs = [
+        start_stub(["--port", str(port)], args.payload_bytes),
+        start_stub(["--uds", uds_path], args.payload_bytes),
+    ]
+    try:
+        results = {}
+        clients = [
+            ("tcp", UpstreamClient(f"http://127.0.0.1:{port}",
+                                   max_connections=args.concurrency,
+                                   max_keepalive_connections=args.concurrency)),
+            ("uds", UpstreamClient("http://localhost",
+                                   max_connections=args.concurrency,
+                                   max_keepalive_connections=args.concurrency,
+                                   uds=uds_path)),
+        ]
+        for name, client in clients:
+            name, result = await bench_transport(
+                name, client, args.requests, args.concurrency, args.warmup
+            )
+            results[name] = result
+        return {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "payload_bytes": args.payload_bytes,
+            "results": results,
+        }
+    finally:
+        for stub in stubs:
+            stub.terminate()
+            stub.wait()
+        if os.path.exists(uds_path):
+            os.unlink(uds_path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--warmup", type=int, default=1000)
+    parser.add_argument("--payload-bytes", type=int, default=512)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""Measure image variant sizes and render cost over backend/node-app/uploads.
+
+For every upload and every requested width, renders the variant the gateway
+would serve for `/api/uploads/<name>?w=<width>&q=<quality>` and reports bytes
+saved against the originals plus render time. Also times cached-variant
+serving through the gateway's `ImageVariants` against a warm disk cache.
+
+Usage:
+  python tests/performance/bench_image_variants.py --widths 320,480,960 --quality 75
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from statistics import mean
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(HERE, "..", "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+from gateway.uploads import UploadFiles  # noqa: E402
+from gateway.variants import (  # noqa: E402
+    IMAGE_FORMATS,
+    ImageVariants,
+    render_variant,
+    snap_quality,
+    snap_width,
+)
+
+UPLOADS_DIR = os.path.join(BACKEND_DIR, "node-app", "uploads")
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil((p / 100.0) * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def upload_files():
+    return sorted(
+        entry.path for entry in os.scandir(UPLOADS_DIR)
+        if entry.is_file() and os.path.splitext(entry.name)[1].lower() in IMAGE_FORMATS
+    )
+
+
+def bench_renders(files, widths, quality, cache_dir):
+    os.makedirs(cache_dir, exist_ok=True)
+    results = {}
+    original_bytes = sum(os.path.getsize(path) for path in files)
+    for width in widths:
+        timings = []
+        variant_bytes = 0
+        for path in files:
+            destination = os.path.join(cache_dir, f"w{width}-{os.path.basename(path)}")
+            started = time.perf_counter()
+            variant_bytes += render_variant(path, destination, width, quality)
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        results[str(width)] = {
+            "images": len(files),
+            "original_bytes": original_bytes,
+            "variant_bytes": variant_bytes,
+            "bytes_saved_ratio": 1 - variant_bytes / original_bytes if original_bytes else 0,
+            "render_ms": {
+                "avg": mean(timings) * 1000 if timings else 0,
+                "p50": percentile(timings, 50) * 1000,
+                "p95": percentile(timings, 95) * 1000,
+                "max": timings[-1] * 1000 if timings else 0,
+            },
+        }
+    return results
+
+
+class FakeRequest:
+    """Just enough of a Starlette request for ImageVariants.serve."""
+
+    def __init__(self, width, quality):
+        self.query_params = {"w": str(width), "q": str(quality)}
+        self.headers = {}
+
+
+async def bench_cached_serving(files, width, quality, cache_dir, rounds):
+    variants = ImageVariants(UploadFiles(UPLOADS_DIR), cache_dir=cache_dir, workers=2)
+    names = [os.path.basename(path) for path in files]
+    request = FakeRequest(width, quality)
+    try:
+        started = time.perf_counter()
+        for name in names:
+            await variants.serve(request, name)
+        cold_seconds = time.perf_counter() - started
+
+        timings = []
+        for _ in range(rounds):
+            for name in names:
+                started = time.perf_counter()
+                await variants.serve(request, name)
+                timings.append(time.perf_counter() - started)
+        timings.sort()
+        return {
+            "width": width,
+            "cold_fill_seconds": cold_seconds,
+            "warm_lookups": len(timings),
+            "warm_lookup_ms": {
+                "avg": mean(timings) * 1000 if timings else 0,
+                "p50": percentile(timings, 50) * 1000,
+                "p99": percentile(timings, 99) * 1000,
+            },
+            "stats": variants.stats(),
+        }
+    finally:
+        variants.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--widths", default="320,480,640,960")
+    parser.add_argument("--quality", type=int, default=75)
+    parser.add_argument("--gallery-width", type=int, default=480,
+                        help="width used for the cached-serving run")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    widths = sorted({snap_width(int(width)) for width in args.widths.split(",") if width.strip()})
+    quality = snap_quality(args.quality)
+    files = upload_files()
+
+    with tempfile.TemporaryDirectory(prefix="peekaboo-variants-") as cache_dir:
+        renders = bench_renders(files, widths, quality, os.path.join(cache_dir, "renders"))
+        serving = asyncio.run(bench_cached_serving(
+            files, snap_width(args.gallery_width), quality,
+            os.path.join(cache_dir, "gateway"), args.rounds,
+        ))
+
+    print(json.dumps({
+        "uploads_dir": os.path.normpath(UPLOADS_DIR),
+        "quality": quality,
+        "renders": renders,
+        "cached_serving": serving,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
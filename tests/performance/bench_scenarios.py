@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""Scenario benchmark: the gateway in front of a stub Node, driven by a weighted route mix.
+
+Starts `stub_upstream.py --scenario` (per-route latency and body sizes) and
+`backend/server.py` under uvicorn with `NODE_EXTERNAL=1` pointed at it, then
+sends an open-loop mix of the real route shapes: hourly pricing, available
+slots, checkout creation, payment status polling, uploads and gallery.
+The same mix is also sent straight to the stub, so the per-route gateway
+overhead can be read off as the difference. No network or MongoDB needed.
+
+Usage:
+  python tests/performance/bench_scenarios.py --rate 500 --duration 20 --save
+  python tests/performance/bench_scenarios.py --env GATEWAY_CACHE=0 --target gateway
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+from loadgen import Target, install_fast_loop, run_open_loop
+from results import add_save_arguments, maybe_save
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.normpath(os.path.join(HERE, "..", "..", "backend"))
+UPLOADS_DIR = os.path.join(BACKEND_DIR, "node-app", "uploads")
+
+CHECKOUT_BODY = json.dumps({"type": "hourly", "date": "2025-10-20", "hours": 2, "kids": 2}).encode()
+AUTH = {"Authorization": "Bearer bench-token"}
+# The gateways started here accept this for their /api/gateway/* stats endpoints.
+ADMIN_TOKEN = os.environ.get("GATEWAY_ADMIN_TOKEN") or "bench-admin-token"
+
+
+def upload_names():
+    names = sorted(name for name in os.listdir(UPLOADS_DIR) if not name.startswith("."))
+    return names or ["missing.webp"]
+
+
+def scenario_routes():
+    """name -> (default weight, request factory)."""
+    uploads = upload_names()
+    return {
+        "hourly-pricing": (20, lambda rng: ("GET", "/api/payments/hourly-pricing", None, b"")),
+        "slots-available": (25, lambda rng: (
+            "GET", f"/api/slots/available?date=2025-10-{rng.randint(20, 26)}", None, b"")),
+        "create-checkout": (5, lambda rng: (
+            "POST", "/api/payments/create-checkout",
+            dict(AUTH, **{"Content-Type": "application/json"}), CHECKOUT_BODY)),
+        "payment-status": (20, lambda rng: (
+            "GET", f"/api/payments/status/cs_bench_{rng.randint(1, 200)}", AUTH, b"")),
+        "uploads": (15, lambda rng: ("GET", f"/api/uploads/{rng.choice(uploads)}", None, b"")),
+        "gallery": (15, lambda rng: ("GET", "/api/gallery", None, b"")),
+    }
+
+
+def parse_mix(raw, routes):
+    weights = {name: weight for name, (weight, _) in routes.items()}
+    if raw:
+        weights = {}
+        for item in raw.split(","):
+            name, _, weight = item.partition("=")
+            if name.strip() not in routes:
+                raise SystemExit(f"unknown route {name!r}; choose from {', '.join(routes)}")
+            weights[name.strip()] = float(weight or 1)
+    return {name: weight for name, weight in weights.items() if weight > 0}
+
+
+def request_mix(weights, routes, seed):
+    rng = random.Random(seed)
+    names = list(weights)
+    cumulative = [sum(list(weights.values())[:index + 1]) for index in range(len(names))]
+
+    def next_request():
+        name = rng.choices(names, cum_weights=cumulative)[0]
+        return routes[name][1](rng) + (name,)
+
+    return next_request
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url, check=lambda body: True, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1.0) as response:
+                if response.status == 200 and check(response.read()):
+                    return True
+        except OSError:
+            pass
+        time.sleep(0.1)
+    raise SystemExit(f"{url} did not become ready within {timeout:.0f}s")
+
+
+def start_stub(port, latency_scale):
+    return subprocess.Popen([
+        sys.executable, os.path.join(HERE, "stub_upstream.py"),
+        "--port", str(port), "--scenario", "--latency-scale", str(latency_scale),
+    ], stdout=sys.stderr)
+
+
+def start_gateway(port, node_port, extra_env, workers=1):
+    env = dict(os.environ, NODE_EXTERNAL="1", NODE_PORT=str(node_port),
+               GATEWAY_ADMIN_TOKEN=ADMIN_TOKEN, **extra_env)
+    return subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1",
+        "--port", str(port), "--log-level", "warning", "--workers", str(workers),
+    ], cwd=BACKEND_DIR, env=env, stdout=sys.stderr)
+
+
+def gateway_ready(body):
+    return json.loads(body).get("ready") is True
+
+
+def fetch_json(url):
+    request = urllib.request.Request(url, headers={"X-Gateway-Admin-Token": ADMIN_TOKEN})
+    with urllib.request.urlopen(request, timeout=5.0) as response:
+        return json.loads(response.read())
+
+
+async def drive(url, args, weights, routes, seed):
+    target = Target(url)
+    if args.warmup:
+        await run_open_loop(target, args.rate, int(args.rate * args.warmup), args.connections,
+                            timeout=args.timeout, requests=request_mix(weights, routes, seed + 1))
+    recorder, duration, extra = await run_open_loop(
+        target, args.rate, int(args.rate * args.duration), args.connections,
+        timeout=args.timeout, window=args.window, requests=request_mix(weights, routes, seed),
+    )
+    return {
+        "requests": recorder.histogram.count,
+        "failed": recorder.failed,
+        "duration_seconds": duration,
+        "throughput_rps": recorder.histogram.count / duration if duration else 0,
+        "latency_seconds": recorder.histogram.summary(),
+        "routes": recorder.label_summaries(duration),
+        "windows": recorder.window_summaries(),
+        **extra,
+    }
+
+
+def overhead(gateway, direct):
+    result = {}
+    for name, stats in gateway["routes"].items():
+        baseline = direct["routes"].get(name)
+        if baseline is None:
+            continue
+        result[name] = {
+            f"{p}_ms": (stats["latency_seconds"][p] - baseline["latency_seconds"][p]) * 1000
+            for p in ("p50", "p99")
+        }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rate", type=float, default=300.0, help="requests per second")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds of unrecorded load first")
+    parser.add_argument("--connections", type=int, default=128)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--window", type=float, default=1.0)
+    parser.add_argument("--mix", default="", help="route=weight,... (default: built-in weights)")
+    parser.add_argument("--latency-scale", type=float, default=1.0,
+                        help="multiply the stub's per-route latencies")
+    parser.add_argument("--target", choices=("both", "gateway", "direct"), default="both")
+    parser.add_argument("--gateway-workers", type=int, default=1)
+    parser.add_argument("--env", action="append", default=[],
+                        help="KEY=VALUE passed to the gateway (repeatable)")
+    parser.add_argument("--seed", type=int, default=7)
+    add_save_arguments(parser)
+    args = parser.parse_args()
+
+    routes = scenario_routes()
+    weights = parse_mix(args.mix, routes)
+    extra_env = dict(item.split("=", 1) for item in args.env)
+    install_fast_loop()
+
+    stub_port, gateway_port = free_port(), free_port()
+    processes = [start_stub(stub_port, args.latency_scale)]
+    result = {
+        "rate": args.rate,
+        "duration": args.duration,
+        "mix": weights,
+        "latency_scale": args.latency_scale,
+        "gateway_env": extra_env,
+    }
+    try:
+        wait_for(f"http://127.0.0.1:{stub_port}/healthz")
+        if args.target in ("both", "direct"):
+            result["direct"] = asyncio.run(
+                drive(f"http://127.0.0.1:{stub_port}/", args, weights, routes, args.seed)
+            )
+        if args.target in ("both", "gateway"):
+            processes.append(start_gateway(gateway_port, stub_port, extra_env, args.gateway_workers))
+            base = f"http://127.0.0.1:{gateway_port}"
+            wait_for(f"{base}/readyz", check=gateway_ready)
+            result["gateway"] = asyncio.run(drive(f"{base}/", args, weights, routes, args.seed))
+            result["gateway"]["stats"] = {
+                "cache": fetch_json(f"{base}/api/gateway/cache"),
+                "coalesce": fetch_json(f"{base}/api/gateway/coalesce"),
+            }
+        if "direct" in result and "gateway" in result:
+            result["gateway_overhead"] = overhead(result["gateway"], result["direct"])
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    print(json.dumps(result, indent=2))
+    maybe_save(args, "scenarios", result)
+
+
+if __name__ == "__main__":
+    main()
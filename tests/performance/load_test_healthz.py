@@ -1,75 +1,84 @@
 #!/usr/bin/env python3
-"""Simple concurrent load test for the Node health endpoint.
+"""Load test for the health endpoint (or any GET URL).
+
+Runs on a single asyncio event loop over keep-alive connections (see
+`loadgen.py`). Without `--rate` it is closed-loop: `--concurrency`
+requests are kept outstanding. With `--rate` it is open-loop: requests
+are sent at that arrival rate whether or not earlier ones have returned,
+and latency is measured from each request's intended send time, so a
+server that stalls shows up as latency instead of as a slower client.
+Latencies go into an HDR-style histogram and are reported overall and per
+`--window` seconds.
 
 Usage:
   python tests/performance/load_test_healthz.py --url http://127.0.0.1:8080/healthz --concurrency 1000 --requests 10000
+  python tests/performance/load_test_healthz.py --url http://127.0.0.1:8001/api/health --rate 2000 --duration 30
 """
 
 import argparse
-import concurrent.futures
+import asyncio
 import json
-import time
-import urllib.request
-from statistics import mean
-
-
-def percentile(sorted_values, p):
-    if not sorted_values:
-        return 0.0
-    index = int((p / 100.0) * len(sorted_values)) - 1
-    index = max(0, min(index, len(sorted_values) - 1))
-    return sorted_values[index]
 
+from loadgen import Target, install_fast_loop, run_closed_loop, run_open_loop
+from results import add_save_arguments, maybe_save
 
-def run_test(url: str, concurrency: int, requests: int, timeout: float):
-    def request_once(_):
-        start = time.perf_counter()
-        try:
-            with urllib.request.urlopen(url, timeout=timeout) as response:
-                ok = response.getcode() == 200
-        except Exception:
-            ok = False
-        return time.perf_counter() - start, ok
 
-    wall_start = time.perf_counter()
-    results = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
-        for result in executor.map(request_once, range(requests), chunksize=20):
-            results.append(result)
-
-    wall_time = time.perf_counter() - wall_start
-    latencies = sorted(lat for lat, _ in results)
-    success_count = sum(1 for _, ok in results if ok)
+def run_test(url: str, concurrency: int, requests: int, timeout: float, rate: float = 0.0,
+             window: float = 1.0, uds: str = None):
+    target = Target(url, uds=uds)
+    if rate:
+        recorder, wall_time, extra = asyncio.run(
+            run_open_loop(target, rate, requests, concurrency, timeout=timeout, window=window)
+        )
+    else:
+        recorder, wall_time, extra = asyncio.run(
+            run_closed_loop(target, concurrency, requests, timeout=timeout, window=window)
+        )
 
     return {
         "url": url,
+        "mode": "open-loop" if rate else "closed-loop",
+        "target_rate_rps": rate or None,
         "concurrency": concurrency,
         "requests": requests,
-        "success": success_count,
-        "failed": requests - success_count,
-        "success_rate": success_count / requests if requests else 0,
+        "success": recorder.success,
+        "failed": recorder.failed,
+        "success_rate": recorder.success / requests if requests else 0,
         "duration_seconds": wall_time,
         "throughput_rps": requests / wall_time if wall_time else 0,
-        "latency_seconds": {
-            "avg": mean(latencies) if latencies else 0,
-            "p50": percentile(latencies, 50),
-            "p95": percentile(latencies, 95),
-            "p99": percentile(latencies, 99),
-            "max": max(latencies) if latencies else 0,
-        },
+        "latency_seconds": recorder.histogram.summary(),
+        "statuses": recorder.statuses,
+        "errors": recorder.errors,
+        "windows": recorder.window_summaries(),
+        **extra,
     }
 
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--url", default="http://127.0.0.1:8080/healthz")
-    parser.add_argument("--concurrency", type=int, default=1000)
+    parser.add_argument("--uds", default=None, help="connect over this Unix socket instead of TCP")
+    parser.add_argument("--concurrency", type=int, default=1000,
+                        help="outstanding requests (closed-loop) or connection limit (open-loop)")
     parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--rate", type=float, default=0.0,
+                        help="target arrival rate in requests/second; enables open-loop mode")
+    parser.add_argument("--duration", type=float, default=0.0,
+                        help="with --rate, run for this many seconds instead of --requests")
+    parser.add_argument("--window", type=float, default=1.0, help="seconds per reporting window")
     parser.add_argument("--timeout", type=float, default=10.0)
+    add_save_arguments(parser)
     args = parser.parse_args()
 
-    result = run_test(args.url, args.concurrency, args.requests, args.timeout)
+    requests = args.requests
+    if args.rate and args.duration:
+        requests = int(args.rate * args.duration)
+
+    install_fast_loop()
+    result = run_test(args.url, args.concurrency, requests, args.timeout,
+                      rate=args.rate, window=args.window, uds=args.uds)
     print(json.dumps(result, indent=2))
+    maybe_save(args, "healthz", result)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,370 @@
+"""Single-threaded asyncio HTTP/1.1 load generator shared by the benchmarks.
+
+- `LogHistogram` is an HDR-style histogram: values in microseconds go into
+  log-linear buckets (256 sub-buckets per power of two, under 1% relative
+  error), so p99.9 is as accurate as p50 and histograms merge cheaply.
+- `Connection` is a minimal keep-alive HTTP/1.1 client over TCP or a Unix
+  socket, with none of the per-request overhead of urllib or httpx.
+- `run_open_loop` sends at a fixed arrival rate and measures latency from
+  each request's *intended* send time, so a stalled server cannot slow the
+  generator down and hide its own queueing (coordinated omission).
+  `run_closed_loop` keeps N requests outstanding.
+"""
+
+import asyncio
+import math
+import time
+from urllib.parse import urlsplit
+
+SUB_BUCKET_BITS = 8
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+HALF_SUB_BUCKETS = SUB_BUCKETS >> 1
+
+
+class LogHistogram:
+    """Log-linear histogram of non-negative integer values (microseconds)."""
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    @staticmethod
+    def index_for(value):
+        if value < SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - SUB_BUCKET_BITS
+        return SUB_BUCKETS + (shift - 1) * HALF_SUB_BUCKETS + (value >> shift) - HALF_SUB_BUCKETS
+
+    @staticmethod
+    def highest_equivalent(index):
+        """Largest value that lands in bucket `index`."""
+        if index < SUB_BUCKETS:
+            return index
+        shift = (index - SUB_BUCKETS) // HALF_SUB_BUCKETS + 1
+        top = (index - SUB_BUCKETS) % HALF_SUB_BUCKETS + HALF_SUB_BUCKETS
+        return ((top + 1) << shift) - 1
+
+    def record(self, value):
+        value = max(0, int(value))
+        index = self.index_for(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def value_at(self, p):
+        """Nearest-rank percentile, reported as the bucket's highest equivalent value."""
+        if not self.count:
+            return 0
+        rank = max(1, math.ceil((p / 100.0) * self.count))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self.highest_equivalent(index), self.max)
+        return self.max
+
+    def summary(self, scale=1e-6):
+        """Latency summary in seconds (values are recorded in microseconds)."""
+        return {
+            "count": self.count,
+            "avg": self.total / self.count * scale if self.count else 0,
+            "min": (self.min or 0) * scale,
+            "p50": self.value_at(50) * scale,
+            "p90": self.value_at(90) * scale,
+            "p95": self.value_at(95) * scale,
+            "p99": self.value_at(99) * scale,
+            "p99.9": self.value_at(99.9) * scale,
+            "max": self.max * scale,
+        }
+
+
+class Target:
+    """Where to send requests: host/port from a URL, or a Unix socket."""
+
+    def __init__(self, url, uds=None):
+        parts = urlsplit(url)
+        if parts.scheme != "http":
+            raise ValueError("only plain http:// targets are supported")
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 80
+        self.uds = uds
+        self.path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        self.host_header = parts.netloc or self.host
+
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection."""
+
+    def __init__(self, target):
+        self.target = target
+        self.reader = None
+        self.writer = None
+        self._requests = {}
+
+    async def open(self):
+        if self.target.uds:
+            self.reader, self.writer = await asyncio.open_unix_connection(self.target.uds)
+        else:
+            self.reader, self.writer = await asyncio.open_connection(self.target.host, self.target.port)
+
+    @property
+    def is_open(self):
+        return self.writer is not None and not self.writer.is_closing()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def encode(self, method, path, headers=None, body=b""):
+        key = (method, path, tuple(sorted((headers or {}).items())), len(body))
+        head = self._requests.get(key)
+        if head is None:
+            lines = [f"{method} {path} HTTP/1.1", f"Host: {self.target.host_header}"]
+            lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+            if body or method in ("POST", "PUT", "PATCH"):
+                lines.append(f"Content-Length: {len(body)}")
+            head = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+            self._requests[key] = head
+        return head + body
+
+    async def request(self, method="GET", path=None, headers=None, body=b""):
+        """(status, response headers, body length); reopens the connection if needed."""
+        if not self.is_open:
+            await self.open()
+        self.writer.write(self.encode(method, path or self.target.path, headers, body))
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        status = int(lines[0].split(" ", 2)[1])
+        response_headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                response_headers[name.strip().lower()] = value.strip()
+
+        length = 0
+        if response_headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size = int((await self.reader.readline()).split(b";", 1)[0], 16)
+                if size == 0:
+                    await self.reader.readuntil(b"\r\n")
+                    break
+                await self.reader.readexactly(size + 2)
+                length += size
+        elif method != "HEAD" and status not in (204, 304) and "content-length" in response_headers:
+            length = int(response_headers["content-length"])
+            if length:
+                await self.reader.readexactly(length)
+        elif method != "HEAD" and status not in (204, 304):
+            # No framing: the body runs until the server closes.
+            length = len(await self.reader.read())
+            self.close()
+
+        if response_headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, response_headers, length
+
+
+class Recorder:
+    """Overall, per-window and per-label latency histograms plus error counts."""
+
+    def __init__(self, window):
+        self.window = window
+        self.histogram = LogHistogram()
+        self.windows = {}
+        self.labels = {}
+        self.success = 0
+        self.failed = 0
+        self.statuses = {}
+        self.errors = {}
+
+    def _record_label(self, label, micros, status, error):
+        stats = self.labels.get(label)
+        if stats is None:
+            stats = self.labels[label] = {"histogram": LogHistogram(), "statuses": {}, "failed": 0}
+        stats["histogram"].record(micros)
+        key = error if error is not None else str(status)
+        stats["statuses"][key] = stats["statuses"].get(key, 0) + 1
+        if error is not None or not 200 <= status < 400:
+            stats["failed"] += 1
+
+    def record(self, offset, latency, status=None, error=None, label=None):
+        micros = latency * 1e6
+        self.histogram.record(micros)
+        if label is not None:
+            self._record_label(label, micros, status, error)
+        index = int(offset // self.window) if self.window else 0
+        window = self.windows.get(index)
+        if window is None:
+            window = self.windows[index] = {"histogram": LogHistogram(), "failed": 0}
+        window["histogram"].record(micros)
+        if error is not None:
+            self.failed += 1
+            window["failed"] += 1
+            self.errors[error] = self.errors.get(error, 0) + 1
+            return
+        self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+        if 200 <= status < 400:
+            self.success += 1
+        else:
+            self.failed += 1
+            window["failed"] += 1
+
+    def window_summaries(self):
+        summaries = []
+        for index in sorted(self.windows):
+            window = self.windows[index]
+            latency = window["histogram"].summary()
+            summaries.append({
+                "start_seconds": index * self.window,
+                "requests": latency["count"],
+                "failed": window["failed"],
+                "rps": latency["count"] / self.window if self.window else 0,
+                "p50": latency["p50"],
+                "p99": latency["p99"],
+                "p99.9": latency["p99.9"],
+                "max": latency["max"],
+            })
+        return summaries
+
+    def label_summaries(self, duration):
+        return {
+            label: {
+                "requests": stats["histogram"].count,
+                "failed": stats["failed"],
+                "throughput_rps": stats["histogram"].count / duration if duration else 0,
+                "statuses": stats["statuses"],
+                "latency_seconds": stats["histogram"].summary(),
+            }
+            for label, stats in sorted(self.labels.items())
+        }
+
+
+class ConnectionPool:
+    """Up to `size` keep-alive connections; callers wait when all are busy."""
+
+    def __init__(self, target, size):
+        self.target = target
+        self.idle = asyncio.Queue()
+        self.size = size
+        self.opened = 0
+
+    async def acquire(self):
+        if self.idle.empty() and self.opened < self.size:
+            self.opened += 1
+            return Connection(self.target)
+        return await self.idle.get()
+
+    def release(self, connection):
+        self.idle.put_nowait(connection)
+
+    def close(self):
+        while not self.idle.empty():
+            self.idle.get_nowait().close()
+
+
+DEFAULT_REQUEST = ("GET", None, None, b"", None)
+
+
+def _next_request(requests):
+    """(method, path, headers, body) and an optional label from the `requests` callable."""
+    spec = requests() if requests is not None else DEFAULT_REQUEST
+    return spec[:4], spec[4] if len(spec) > 4 else None
+
+
+async def _send(pool, recorder, scheduled, started_at, timeout, requests):
+    connection = await pool.acquire()
+    label = None
+    try:
+        spec, label = _next_request(requests)
+        status, _, _ = await asyncio.wait_for(connection.request(*spec), timeout)
+        recorder.record(scheduled - started_at, time.perf_counter() - scheduled,
+                        status=status, label=label)
+    except Exception as exc:
+        connection.close()
+        recorder.record(scheduled - started_at, time.perf_counter() - scheduled,
+                        error=type(exc).__name__, label=label)
+    finally:
+        pool.release(connection)
+
+
+async def run_open_loop(target, rate, total, connections, timeout=10.0, window=1.0, requests=None):
+    """Send `total` requests at `rate` per second, latency measured from the intended send time.
+
+    `requests`, if given, is called for every request and returns
+    (method, path, headers, body[, label]); otherwise the target URL is
+    fetched. Labelled requests are also summarized per label.
+    """
+    pool = ConnectionPool(target, connections)
+    recorder = Recorder(window)
+    interval = 1.0 / rate
+    tasks = set()
+    max_lag = 0.0
+    started_at = time.perf_counter()
+    sent = 0
+    while sent < total:
+        now = time.perf_counter()
+        while sent < total and started_at + sent * interval <= now:
+            scheduled = started_at + sent * interval
+            max_lag = max(max_lag, now - scheduled)
+            task = asyncio.ensure_future(_send(pool, recorder, scheduled, started_at, timeout, requests))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            sent += 1
+        if sent < total:
+            await asyncio.sleep(max(0.0, started_at + sent * interval - time.perf_counter()))
+    if tasks:
+        await asyncio.gather(*tasks)
+    duration = time.perf_counter() - started_at
+    pool.close()
+    return recorder, duration, {"connections_opened": pool.opened, "max_schedule_lag_seconds": max_lag}
+
+
+async def run_closed_loop(target, concurrency, total, timeout=10.0, window=1.0, requests=None):
+    """Keep `concurrency` requests outstanding until `total` have been sent."""
+    recorder = Recorder(window)
+    remaining = [total]
+    started_at = time.perf_counter()
+
+    async def worker():
+        connection = Connection(target)
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            spec, label = _next_request(requests)
+            sent_at = time.perf_counter()
+            try:
+                status, _, _ = await asyncio.wait_for(connection.request(*spec), timeout)
+                recorder.record(sent_at - started_at, time.perf_counter() - sent_at,
+                                status=status, label=label)
+            except Exception as exc:
+                connection.close()
+                recorder.record(sent_at - started_at, time.perf_counter() - sent_at,
+                                error=type(exc).__name__, label=label)
+        connection.close()
+
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, total))))
+    return recorder, time.perf_counter() - started_at, {"connections_opened": min(concurrency, total)}
+
+
+def install_fast_loop():
+    """Use uvloop when it is installed; the stdlib loop otherwise."""
+    try:
+        import uvloop
+    except ImportError:
+        return False
+    uvloop.install()
+    return True
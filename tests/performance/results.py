@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""Stored benchmark results and a regression gate.
+
+Benchmarks run with `--save` write a versioned result file under
+`tests/performance/results/<benchmark>/`. The file records the git commit,
+the benchmark configuration and an environment fingerprint next to the
+numbers. `compare` diffs two runs for every latency table in them (overall,
+per route, gateway vs direct) and every percentile. It exits with status 1
+when any of them regressed by more than the noise-aware threshold.
+
+A change is only a regression when it clears all of these:
+- the relative threshold (`--threshold`, default 10%);
+- an absolute floor (`--min-delta-ms`, default 0.5 ms), so sub-millisecond
+  jitter on fast routes is ignored;
+- a sampling allowance that grows as fewer samples fall beyond the
+  percentile, so p99.9 over a few thousand requests gets more slack than p50.
+
+Usage:
+  python tests/performance/bench_scenarios.py --save
+  python tests/performance/results.py baseline scenarios            # latest run becomes the baseline
+  python tests/performance/results.py compare scenarios             # latest run vs baseline
+  python tests/performance/results.py compare old.json new.json --threshold 5
+  python tests/performance/results.py list scenarios
+"""
+
+import argparse
+import datetime
+import glob
+import hashlib
+import json
+import math
+import os
+import platform
+import shutil
+import subprocess
+import sys
+from importlib import metadata
+
+SCHEMA_VERSION = 1
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.normpath(os.path.join(HERE, "..", ".."))
+RESULTS_DIR = os.path.join(HERE, "results")
+PERCENTILES = ("p50", "p90", "p99", "p99.9")
+TRACKED_PACKAGES = ("fastapi", "starlette", "uvicorn", "httpx", "httpcore", "uvloop", "brotli")
+
+
+def _git(*args):
+    try:
+        return subprocess.run(
+            ["git", *args], cwd=REPO_DIR, capture_output=True, text=True, timeout=30, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def git_fingerprint():
+    status = _git("status", "--porcelain", "--untracked-files=no")
+    return {
+        "commit": _git("rev-parse", "HEAD"),
+        "branch": _git("rev-parse", "--abbrev-ref", "HEAD"),
+        "dirty": bool(status) if status is not None else None,
+    }
+
+
+def _cpu_model():
+    try:
+        with open("/proc/cpuinfo") as handle:
+            for line in handle:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or None
+
+
+def environment_fingerprint():
+    packages = {}
+    for name in TRACKED_PACKAGES:
+        try:
+            packages[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            continue
+    environment = {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_model": _cpu_model(),
+        "cpu_count": os.cpu_count(),
+        "packages": packages,
+    }
+    environment["fingerprint"] = fingerprint(environment)
+    # Recorded for context only: load differs run to run and is not fingerprinted.
+    environment["loadavg"] = os.getloadavg() if hasattr(os, "getloadavg") else None
+    return environment
+
+
+def fingerprint(value):
+    return hashlib.sha1(json.dumps(value, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def save_result(benchmark, config, result, directory=RESULTS_DIR):
+    """Write a result file and return its path."""
+    git = git_fingerprint()
+    created = datetime.datetime.now(datetime.timezone.utc)
+    document = {
+        "schema_version": SCHEMA_VERSION,
+        "benchmark": benchmark,
+        "created_at": created.isoformat(),
+        "git": git,
+        "config": config,
+        "config_fingerprint": fingerprint(config),
+        "environment": environment_fingerprint(),
+        "result": result,
+    }
+    target_dir = os.path.join(directory, benchmark)
+    os.makedirs(target_dir, exist_ok=True)
+    name = f"{created.strftime('%Y%m%dT%H%M%SZ')}-{(git['commit'] or 'nogit')[:10]}.json"
+    path = os.path.join(target_dir, name)
+    with open(path, "w") as handle:
+        json.dump(document, handle, indent=2)
+    return path
+
+
+def add_save_arguments(parser):
+    parser.add_argument("--save", action="store_true", help="store the result under tests/performance/results")
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+
+
+def maybe_save(args, benchmark, result):
+    """`--save` support for the benchmark scripts; reports the path on stderr."""
+    if not args.save:
+        return None
+    config = {key: value for key, value in vars(args).items() if key not in ("save", "results_dir")}
+    path = save_result(benchmark, config, result, args.results_dir)
+    print(f"saved {os.path.relpath(path)}", file=sys.stderr)
+    return path
+
+
+def load(path):
+    with open(path) as handle:
+        document = json.load(handle)
+    if document.get("schema_version") != SCHEMA_VERSION:
+        raise SystemExit(f"{path}: unsupported schema_version {document.get('schema_version')}")
+    return document
+
+
+def runs(benchmark, directory=RESULTS_DIR):
+    return sorted(
+        path for path in glob.glob(os.path.join(directory, benchmark, "*.json"))
+        if os.path.basename(path) != "baseline.json"
+    )
+
+
+def resolve(spec, directory=RESULTS_DIR, latest=False):
+    """A file path, or a benchmark name meaning its baseline (or latest run)."""
+    if os.path.isfile(spec):
+        return spec
+    if latest:
+        found = runs(spec, directory)
+        if not found:
+            raise SystemExit(f"no saved runs for {spec!r} in {directory}")
+        return found[-1]
+    path = os.path.join(directory, spec, "baseline.json")
+    if not os.path.isfile(path):
+        raise SystemExit(f"no baseline for {spec!r}; create one with `results.py baseline {spec}`")
+    return path
+
+
+def latency_tables(value, prefix=""):
+    """Every dict with a `latency_seconds` summary, keyed by its path in the result."""
+    tables = {}
+    if isinstance(value, dict):
+        if isinstance(value.get("latency_seconds"), dict):
+            tables[prefix or "all"] = value
+        for key, child in value.items():
+            if key in ("latency_seconds", "windows"):
+                continue
+            tables.update(latency_tables(child, f"{prefix}/{key}" if prefix else key))
+    return tables
+
+
+def allowed_change(baseline_ms, percentile, samples, threshold, min_delta_ms):
+    """Largest increase in ms that still counts as noise."""
+    tail = max(1.0, samples * (1 - float(percentile[1:]) / 100.0))
+    relative = threshold + 1.0 / math.sqrt(tail)
+    return max(min_delta_ms, baseline_ms * relative)
+
+
+def failure_rate(table):
+    requests = table.get("requests") or table.get("latency_seconds", {}).get("count") or 0
+    return (table.get("failed") or 0) / requests if requests else 0.0
+
+
+def compare(baseline, current, threshold=0.10, min_delta_ms=0.5, max_failure_increase=0.001):
+    base_tables = latency_tables(baseline["result"])
+    current_tables = latency_tables(current["result"])
+    rows = []
+    for name in sorted(set(base_tables) & set(current_tables)):
+        base, now = base_tables[name], current_tables[name]
+        samples = min(base["latency_seconds"].get("count") or 0, now["latency_seconds"].get("count") or 0)
+        for percentile in PERCENTILES:
+            if percentile not in base["latency_seconds"] or percentile not in now["latency_seconds"]:
+                continue
+            before = base["latency_seconds"][percentile] * 1000
+            after = now["latency_seconds"][percentile] * 1000
+            allowed = allowed_change(before, percentile, samples, threshold, min_delta_ms)
+            delta = after - before
+            rows.append({
+                "table": name,
+                "metric": percentile,
+                "baseline_ms": before,
+                "current_ms": after,
+                "delta_ms": delta,
+                "allowed_ms": allowed,
+                "status": "regressed" if delta > allowed else "improved" if -delta > allowed else "ok",
+            })
+        before, after = failure_rate(base), failure_rate(now)
+        rows.append({
+            "table": name,
+            "metric": "failure_rate",
+            "baseline": before,
+            "current": after,
+            "status": "regressed" if after - before > max_failure_increase else "ok",
+        })
+    return {
+        "baseline": {"commit": baseline["git"]["commit"], "created_at": baseline["created_at"]},
+        "current": {"commit": current["git"]["commit"], "created_at": current["created_at"]},
+        "config_matches": baseline["config_fingerprint"] == current["config_fingerprint"],
+        "environment_matches": (
+            baseline["environment"]["fingerprint"] == current["environment"]["fingerprint"]
+        ),
+        "missing_tables": sorted(set(base_tables) - set(current_tables)),
+        "regressions": sum(1 for row in rows if row["status"] == "regressed"),
+        "rows": rows,
+    }
+
+
+def print_report(report):
+    for label in ("baseline", "current"):
+        info = report[label]
+        print(f"{label:>9}: {info['commit'] or '?'} ({info['created_at']})")
+    if not report["config_matches"]:
+        print("warning: benchmark configuration differs between the runs")
+    if not report["environment_matches"]:
+        print("warning: environment fingerprint differs (machine, Python or packages)")
+    for name in report["missing_tables"]:
+        print(f"warning: {name} is missing from the current run")
+    print(f"{'table':<40} {'metric':<12} {'baseline':>10} {'current':>10} {'delta':>9} {'allowed':>9}  status")
+    for row in report["rows"]:
+        if row["metric"] == "failure_rate":
+            print(f"{row['table']:<40} {row['metric']:<12} {row['baseline']:>10.4f} "
+                  f"{row['current']:>10.4f} {'':>9} {'':>9}  {row['status']}")
+            continue
+        print(f"{row['table']:<40} {row['metric']:<12} {row['baseline_ms']:>8.2f}ms {row['current_ms']:>8.2f}ms "
+              f"{row['delta_ms']:>+7.2f}ms {row['allowed_ms']:>7.2f}ms  {row['status']}")
+    print(f"{report['regressions']} regression(s)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    compare_parser = commands.add_parser("compare", help="diff a run against a baseline")
+    compare_parser.add_argument("baseline", help="result file, or benchmark name for its baseline")
+    compare_parser.add_argument("current", nargs="?", help="result file (default: latest run)")
+    compare_parser.add_argument("--threshold", type=float, default=10.0, help="relative threshold in percent")
+    compare_parser.add_argument("--min-delta-ms", type=float, default=0.5)
+    compare_parser.add_argument("--max-failure-increase", type=float, default=0.001,
+                                help="allowed increase in failure rate (fraction)")
+    compare_parser.add_argument("--json", action="store_true", help="print the report as JSON")
+
+    baseline_parser = commands.add_parser("baseline", help="make a run the baseline")
+    baseline_parser.add_argument("benchmark")
+    baseline_parser.add_argument("run", nargs="?", help="result file (default: latest run)")
+
+    list_parser = commands.add_parser("list", help="list saved runs")
+    list_parser.add_argument("benchmark")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for path in runs(args.benchmark, args.results_dir):
+            document = load(path)
+            print(f"{os.path.basename(path)}  {document['git']['commit'] or '?'}"
+                  f"{' (dirty)' if document['git']['dirty'] else ''}  config={document['config_fingerprint']}")
+        return
+
+    if args.command == "baseline":
+        source = args.run or resolve(args.benchmark, args.results_dir, latest=True)
+        load(source)
+        destination = os.path.join(args.results_dir, args.benchmark, "baseline.json")
+        shutil.copyfile(source, destination)
+        print(f"{os.path.relpath(source)} -> {os.path.relpath(destination)}")
+        return
+
+    baseline = load(resolve(args.baseline, args.results_dir))
+    if args.current:
+        current_path = resolve(args.current, args.results_dir, latest=True)
+    else:
+        current_path = resolve(baseline["benchmark"], args.results_dir, latest=True)
+    report = compare(
+        baseline, load(current_path), threshold=args.threshold / 100.0,
+        min_delta_ms=args.min_delta_ms, max_failure_increase=args.max_failure_increase,
+    )
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    sys.exit(1 if report["regressions"] else 0)
+
+
+if __name__ == "__main__":
+    main()
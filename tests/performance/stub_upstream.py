@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""Minimal asyncio HTTP/1.1 server standing in for the Node API in benchmarks.
+
+Answers `/healthz` with `ok` and every other path with a JSON body of a fixed
+size, optionally after a delay. Connections are kept alive.
+
+With `--scenario` the real route shapes get their own latency and body size
+(`SCENARIO_ROUTES`, or a JSON file of the same shape via `--routes`), so
+benchmarks see a plausible mix of fast cached reads, Mongo-bound listings
+and slow payment-provider calls.
+
+Usage:
+  python tests/performance/stub_upstream.py --port 8002
+  python tests/performance/stub_upstream.py --uds /tmp/peekaboo-node.sock
+  python tests/performance/stub_upstream.py --port 8002 --scenario
+  # the gateway supervises the stub as Node (it runs NODE_COMMAND in backend/node-app)
+  NODE_COMMAND="python $PWD/tests/performance/stub_upstream.py --scenario --startup-delay 1.5" \
+      sh -c 'cd backend && uvicorn server:app'
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+
+# Path prefix -> response shape; the longest matching prefix wins.
+SCENARIO_ROUTES = {
+    "/api/payments/hourly-pricing": {"latency": 0.004, "bytes": 900},
+    "/api/slots/available": {"latency": 0.015, "bytes": 6 * 1024},
+    "/api/payments/create-checkout": {"latency": 0.120, "bytes": 400},
+    "/api/payments/status/": {"latency": 0.008, "bytes": 300},
+    "/api/gallery": {"latency": 0.020, "bytes": 4 * 1024},
+    "/api/themes": {"latency": 0.012, "bytes": 3 * 1024},
+    "/api/uploads/": {"latency": 0.001, "bytes": 60 * 1024, "content_type": "image/webp"},
+}
+
+
+class StubUpstream:
+    def __init__(self, payload_bytes=512, latency=0.0, routes=None):
+        self.payload_bytes = payload_bytes
+        self.latency = latency
+        self.routes = sorted((routes or {}).items(), key=lambda item: len(item[0]), reverse=True)
+        self.requests = 0
+        self._bodies = {}
+
+    def route_for(self, path):
+        for prefix, shape in self.routes:
+            if path.startswith(prefix):
+                return prefix, shape
+        return None, {}
+
+    def latency_for(self, target):
+        return self.route_for(target.split("?", 1)[0])[1].get("latency", self.latency)
+
+    def body_for(self, method, target):
+        path = target.split("?", 1)[0]
+        if path == "/healthz":
+            return b"ok", "text/plain"
+        prefix, shape = self.route_for(path)
+        size = shape.get("bytes", self.payload_bytes)
+        content_type = shape.get("content_type", "application/json")
+        if prefix is not None and content_type != "application/json":
+            key = (prefix, size)
+            if key not in self._bodies:
+                self._bodies[key] = os.urandom(size)
+            return self._bodies[key], content_type
+        body = json.dumps({"method": method, "path": target, "data": ""}).encode()
+        padding = max(0, size - len(body))
+        body = json.dumps({"method": method, "path": target, "data": "x" * padding}).encode()
+        return body, content_type
+
+    async def read_body(self, reader, headers):
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";", 1)[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    return b"".join(chunks)
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+        length = int(headers.get("content-length", "0") or 0)
+        return await reader.readexactly(length) if length else b""
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode("latin-1").split("\r\n")
+                method, target, _ = lines[0].split(" ", 2)
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        key, value = line.split(":", 1)
+                        headers[key.strip().lower()] = value.strip()
+                await self.read_body(reader, headers)
+
+                self.requests += 1
+                latency = self.latency_for(target)
+                if latency:
+                    await asyncio.sleep(latency)
+
+                body, content_type = self.body_for(method, target)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\n"
+                    b"content-type: " + content_type.encode() + b"\r\n"
+                    b"content-length: " + str(len(body)).encode() + b"\r\n"
+                    b"connection: keep-alive\r\n\r\n" + body
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=0, uds=None):
+        if uds:
+            if os.path.exists(uds):
+                os.unlink(uds)
+            return await asyncio.start_unix_server(self.handle, path=uds)
+        return await asyncio.start_server(self.handle, host=host, port=port)
+
+
+async def serve(port, uds, payload_bytes, latency, routes=None):
+    stub = StubUpstream(payload_bytes=payload_bytes, latency=latency, routes=routes)
+    server = await stub.start(port=port, uds=uds)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    # PORT / SOCKET_PATH are what the gateway's Node supervisor sets (NODE_COMMAND).
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8002)))
+    parser.add_argument("--uds", default=os.environ.get("SOCKET_PATH") or None)
+    parser.add_argument("--payload-bytes", type=int, default=512)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per request")
+    parser.add_argument("--scenario", action="store_true",
+                        help="per-route latency and body size from SCENARIO_ROUTES")
+    parser.add_argument("--routes", default=None,
+                        help="JSON file mapping path prefixes to {latency, bytes, content_type}")
+    parser.add_argument("--latency-scale", type=float, default=1.0,
+                        help="multiply every route latency by this factor")
+    parser.add_argument("--startup-delay", type=float, default=0.0,
+                        help="seconds to wait before listening, like Node connecting to Mongo")
+    args = parser.parse_args()
+
+    routes = None
+    if args.routes:
+        with open(args.routes) as handle:
+            routes = json.load(handle)
+    elif args.scenario:
+        routes = SCENARIO_ROUTES
+    if routes and args.latency_scale != 1.0:
+        routes = {
+            prefix: dict(shape, latency=shape.get("latency", args.latency) * args.latency_scale)
+            for prefix, shape in routes.items()
+        }
+
+    if args.startup_delay > 0:
+        time.sleep(args.startup_delay)
+    asyncio.run(serve(args.port, args.uds, args.payload_bytes, args.latency, routes))
+
+
+if __name__ == "__main__":
+    main()